@@ -1,4 +1,4 @@
-from distutils.core import setup
+from setuptools import setup
 
 # read the contents of your README file
 from pathlib import Path
@@ -19,6 +19,7 @@ setup(
     url="https://github.com/DiamondLightSource/python-swmrtools",
     keywords=["HDF5", "Iterator", "Diamond"],
     install_requires=["numpy", "h5py"],
+    entry_points={"console_scripts": ["swmr-tools=swmr_tools.cli:main"]},
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Intended Audience :: Developers",
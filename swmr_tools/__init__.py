@@ -1,21 +1,69 @@
-from .keyfollower import KeyFollower, RowKeyFollower
-from .datasource import DataSource
-from .chunksource import ChunkSource
-from . import utils
-from . import chunk_utils
-import importlib.metadata
+import importlib
+
+# names are imported from their submodules on first access (PEP 562), so
+# importing the package does not load h5py, blosc or unused submodules
+_LAZY = {
+    "KeyFollower": ".keyfollower",
+    "RowKeyFollower": ".keyfollower",
+    "DataSource": ".datasource",
+    "ChunkSource": ".chunksource",
+    "FrameTransform": ".transforms",
+    "FrameAccumulator": ".accumulators",
+    "ChunkRemapper": ".remapper",
+    "LiveNXdata": ".nexus",
+    "OutputWriter": ".writer",
+    "SyntheticWriter": ".simulator",
+    "Pipeline": ".pipeline",
+    "MappedChunkReader": ".mmapreader",
+    "RawChunkReader": ".rawreader",
+    "utils": None,
+    "chunk_utils": None,
+}
 
 __all__ = [
     "KeyFollower",
     "RowKeyFollower",
     "DataSource",
     "ChunkSource",
+    "FrameTransform",
+    "FrameAccumulator",
+    "ChunkRemapper",
+    "LiveNXdata",
+    "OutputWriter",
+    "SyntheticWriter",
+    "Pipeline",
+    "MappedChunkReader",
+    "RawChunkReader",
     "utils",
     "chunk_utils",
 ]
 
-try:
-    # __package__ allows for the case where __name__ is "__main__"
-    __version__ = importlib.metadata.version(__package__ or __name__)
-except importlib.metadata.PackageNotFoundError:
-    __version__ = "0.0.0"
+
+def __getattr__(name):
+    if name == "__version__":
+        value = _version()
+    elif name in _LAZY:
+        module = _LAZY[name]
+        if module is None:
+            value = importlib.import_module("." + name, __name__)
+        else:
+            value = getattr(importlib.import_module(module, __name__), name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | {"__version__"})
+
+
+def _version():
+    import importlib.metadata
+
+    try:
+        # __package__ allows for the case where __name__ is "__main__"
+        return importlib.metadata.version(__package__ or __name__)
+    except importlib.metadata.PackageNotFoundError:
+        return "0.0.0"
@@ -0,0 +1,204 @@
+import numpy as np
+import threading
+
+
+class FrameAccumulator:
+    """Online accumulation of the sum, mean, variance, maximum and minimum of
+    every frame in a scan.
+
+    Frames can be added one at a time (from a DataSource) or as batches (the
+    stacked frames of a ChunkSource chunk). The running statistics are kept in
+    pre-allocated arrays and updated in place, and a copy can be taken with
+    snapshot at any point while the scan is still being written.
+
+    Parameters
+    ----------
+
+    frame_rank: int (optional)
+        Number of trailing dimensions of the data that form a frame. Any
+        leading dimensions are treated as a batch of frames. If not set, each
+        update is a single frame.
+
+    dtype: numpy dtype (optional)
+        Data type used to accumulate the sum, mean and variance. Defaults to
+        float64.
+
+    variance: bool (optional)
+        Track the variance (Welford/Chan update). Defaults to True, disable to
+        save one pass over each batch.
+
+    Examples
+    --------
+
+    >>> acc = FrameAccumulator(frame_rank=2)
+    >>> for chunk in ChunkSource({"data": f["data"]}):
+    >>>     acc.update(chunk["data"])
+    >>>     print(acc.snapshot()["mean"])
+
+    """
+
+    def __init__(self, frame_rank=None, dtype=np.float64, variance=True):
+        self.frame_rank = frame_rank
+        self.dtype = np.dtype(dtype)
+        self.track_variance = variance
+        self.count = 0
+        self._lock = threading.Lock()
+        self._sum = None
+        self._max = None
+        self._min = None
+        self._mean = None
+        self._m2 = None
+        self._delta = None
+
+    def update(self, data):
+        """
+        Add a frame, or a batch of frames, to the running statistics
+
+            Parameters:
+                data (numpy array): frame or stack of frames to accumulate
+
+        """
+        data = np.asarray(data)
+        frame_rank = data.ndim if self.frame_rank is None else self.frame_rank
+        frame_shape = data.shape[data.ndim - frame_rank :]
+        batch = data.reshape((-1,) + frame_shape)
+
+        if batch.shape[0] == 0:
+            return
+
+        with self._lock:
+            if self._sum is None:
+                self._allocate(frame_shape, data.dtype)
+            elif frame_shape != self._sum.shape:
+                raise RuntimeError(
+                    f"Frame shape {frame_shape} does not match {self._sum.shape}"
+                )
+
+            if batch.shape[0] == 1:
+                self._update_frame(batch[0])
+            else:
+                self._update_batch(batch)
+
+    def _allocate(self, frame_shape, dtype):
+        self._sum = np.zeros(frame_shape, dtype=self.dtype)
+        self._max = np.full(frame_shape, _lowest(dtype), dtype=dtype)
+        self._min = np.full(frame_shape, _highest(dtype), dtype=dtype)
+
+        if self.track_variance:
+            # mean and variance need a floating point type even if summing integers
+            vtype = self.dtype if self.dtype.kind in "fc" else np.float64
+            self._mean = np.zeros(frame_shape, dtype=vtype)
+            self._m2 = np.zeros(frame_shape, dtype=vtype)
+            self._delta = np.zeros(frame_shape, dtype=vtype)
+
+    def _update_frame(self, frame):
+        self.count += 1
+        np.add(self._sum, frame, out=self._sum, casting="unsafe")
+        np.maximum(self._max, frame, out=self._max, casting="unsafe")
+        np.minimum(self._min, frame, out=self._min, casting="unsafe")
+
+        if not self.track_variance:
+            return
+
+        # Welford: m2 += (x - old_mean) * (x - new_mean)
+        np.subtract(frame, self._mean, out=self._delta, casting="unsafe")
+        self._mean += self._delta / self.count
+        self._delta *= frame - self._mean
+        self._m2 += self._delta
+
+    def _update_batch(self, batch):
+        n = batch.shape[0]
+        batch_sum = batch.sum(axis=0, dtype=self.dtype)
+
+        self._sum += batch_sum
+        np.maximum(self._max, batch.max(axis=0), out=self._max)
+        np.minimum(self._min, batch.min(axis=0), out=self._min)
+
+        total = self.count + n
+
+        if self.track_variance:
+            # Chan et al. pairwise combination of the batch statistics
+            batch_mean = batch_sum / n
+            batch_m2 = ((batch - batch_mean) ** 2).sum(axis=0, dtype=self._m2.dtype)
+            np.subtract(batch_mean, self._mean, out=self._delta, casting="unsafe")
+            self._mean += self._delta * (n / total)
+            self._delta **= 2
+            self._delta *= self.count * n / total
+            self._m2 += batch_m2
+            self._m2 += self._delta
+
+        self.count = total
+
+    def snapshot(self, ddof=0):
+        """
+        Returns a copy of the current statistics
+
+            Parameters:
+                ddof (int): delta degrees of freedom used for the variance
+
+            Returns:
+                stats (dict): count, sum, mean, max, min and (if tracked) variance
+
+        """
+        with self._lock:
+            out = {"count": self.count}
+
+            if self.count == 0:
+                return out
+
+            out["sum"] = self._sum.copy()
+            out["mean"] = self._sum / self.count
+            out["max"] = self._max.copy()
+            out["min"] = self._min.copy()
+
+            if self.track_variance:
+                d = max(self.count - ddof, 1)
+                out["variance"] = self._m2 / d
+
+            return out
+
+    def reset(self):
+        """Discard all accumulated frames"""
+        with self._lock:
+            self.count = 0
+            self._sum = None
+            self._max = None
+            self._min = None
+            self._mean = None
+            self._m2 = None
+            self._delta = None
+
+
+def accumulate(source, name, frame_rank=None, dtype=np.float64, variance=True):
+    """
+    Accumulate statistics of one dataset over every item from a DataSource or ChunkSource
+
+        Parameters:
+            source (iterator): DataSource or ChunkSource to consume
+            name (str): name of the dataset in each item of the source
+            frame_rank (int): number of trailing dimensions forming a frame
+            dtype (numpy dtype): accumulation data type
+            variance (boolean): whether to track the variance
+
+        Returns:
+            accumulator (FrameAccumulator): accumulator holding the statistics of the scan
+
+    """
+    acc = FrameAccumulator(frame_rank=frame_rank, dtype=dtype, variance=variance)
+
+    for item in source:
+        acc.update(item[name])
+
+    return acc
+
+
+def _lowest(dtype):
+    if np.issubdtype(dtype, np.integer):
+        return np.iinfo(dtype).min
+    return -np.inf
+
+
+def _highest(dtype):
+    if np.issubdtype(dtype, np.integer):
+        return np.iinfo(dtype).max
+    return np.inf
@@ -0,0 +1,503 @@
+"""Benchmarks of the followers, readers and writers in swmr_tools.
+
+Run with python -m swmr_tools.benchmark, which writes the results as JSON and
+optionally compares them with a stored baseline, exiting with status 1 if
+any benchmark regressed by more than the tolerance.
+"""
+
+from .chunksource import ChunkSource
+from .chunk_utils import ChunkWriter, get_slice_structure, write_data
+from .datasource import DataSource
+from .keyfollower import KeyFollower
+from .simulator import SyntheticWriter, synthetic_frame
+from . import utils
+import argparse
+import h5py
+import json
+import math
+import numpy as np
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# metrics where a larger value is better, all others are times
+_HIGHER_IS_BETTER = ("throughput", "bytes_per_second", "frames_per_second")
+_NOT_COMPARED = ("items",)
+
+_SIZES = {
+    "quick": {"points": 200, "keys": 2000, "frame": (64, 64), "rate": 400},
+    "full": {"points": 2000, "keys": 100000, "frame": (256, 256), "rate": 1000},
+}
+
+
+def run_benchmarks(workdir=None, names=None, size="quick", live=True):
+    """
+    Run the benchmarks and return their results
+
+        Parameters:
+            workdir (str): directory for the benchmark files, a temporary directory if not set
+            names (list): names (or name prefixes) of benchmarks to run, all if not set
+            size (str): "quick" or "full" problem sizes
+            live (boolean): include the benchmarks that follow a live writer process
+
+        Returns:
+            results (dict): "meta" describing the environment and "results" of benchmark
+            name to metrics (throughput in items per second, latencies in seconds)
+
+    """
+    if size not in _SIZES:
+        raise RuntimeError(f"{size} not in {tuple(_SIZES)}")
+
+    if workdir is None:
+        with tempfile.TemporaryDirectory() as tmp:
+            return run_benchmarks(tmp, names, size, live)
+
+    sizes = _SIZES[size]
+    results = {}
+
+    for name, (func, is_live) in BENCHMARKS.items():
+        if names is not None and not any(name.startswith(n) for n in names):
+            continue
+        if is_live and not live:
+            continue
+
+        logger.info("Running benchmark " + name)
+        path = os.path.join(workdir, name + ".h5")
+        results[name] = func(path, sizes)
+
+    return {"meta": _environment(size), "results": results}
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Compare benchmark results with a baseline
+
+        Parameters:
+            results (dict): results from run_benchmarks
+            baseline (dict): earlier results from run_benchmarks
+            tolerance (float): allowed fractional change before a metric counts as a regression
+
+        Returns:
+            regressions (list): dicts of benchmark, metric, baseline, current and ratio for every regression
+
+    """
+    if baseline["meta"].get("size") != results["meta"].get("size"):
+        raise RuntimeError("Baseline was run with a different problem size")
+
+    regressions = []
+    current = results["results"]
+
+    for name, metrics in baseline["results"].items():
+        if name not in current:
+            continue
+
+        for metric, base in metrics.items():
+            value = current[name].get(metric)
+            if metric in _NOT_COMPARED or value is None or not base:
+                continue
+
+            ratio = value / base
+            if metric in _HIGHER_IS_BETTER:
+                regressed = ratio < 1 - tolerance
+            else:
+                regressed = ratio > 1 + tolerance
+
+            if regressed:
+                regressions.append(
+                    {
+                        "benchmark": name,
+                        "metric": metric,
+                        "baseline": base,
+                        "current": value,
+                        "ratio": ratio,
+                    }
+                )
+
+    return regressions
+
+
+def _environment(size):
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "size": size,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "h5py": h5py.version.version,
+        "hdf5": h5py.version.hdf5_version,
+    }
+
+
+def _metrics(latencies, items, seconds, nbytes=None):
+    out = {
+        "items": items,
+        "seconds": seconds,
+        "throughput": items / seconds if seconds > 0 else 0.0,
+    }
+
+    if latencies:
+        lat = np.asarray(latencies)
+        out["latency_mean"] = float(lat.mean())
+        out["latency_p95"] = float(np.percentile(lat, 95))
+        out["latency_max"] = float(lat.max())
+
+    if nbytes is not None:
+        out["bytes_per_second"] = nbytes / seconds if seconds > 0 else 0.0
+
+    return out
+
+
+def _time_iteration(iterator, nbytes=None):
+    # latency is the time spent waiting for each item
+    latencies = []
+    count = 0
+    start = time.perf_counter()
+    last = start
+
+    for item in iterator:
+        now = time.perf_counter()
+        latencies.append(now - last)
+        count += 1
+        last = now
+
+    # up to the last item, the wait for the end of the scan is not included
+    total = last - start
+    return _metrics(
+        latencies, count, total, nbytes=None if nbytes is None else nbytes(count)
+    )
+
+
+def _write_static(path, sizes, frames_per_chunk=1, codec="blosc-lz4"):
+    # a complete scan, with every key and the finished flag set
+    writer = SyntheticWriter(
+        path,
+        (sizes["points"],),
+        sizes["frame"],
+        rate=None,
+        frames_per_chunk=frames_per_chunk,
+        codec=codec,
+    )
+    writer.run()
+    return writer
+
+
+def _frame_bytes(sizes):
+    return math.prod(sizes["frame"]) * 2
+
+
+def bench_keyfollower(n_keys):
+    def bench(path, sizes):
+        n = sizes["keys"]
+        with h5py.File(path, "w") as fh:
+            for k in range(n_keys):
+                fh.create_dataset(f"key{k}", data=np.ones(n, dtype=np.int32))
+            fh.create_dataset("finished", data=np.ones(1))
+
+        with h5py.File(path, "r", libver="latest", swmr=True) as fh:
+            keys = [fh[f"key{k}"] for k in range(n_keys)]
+
+            # a poll reads and merges every key dataset
+            kf = KeyFollower(keys, timeout=1, finished_dataset=fh["finished"])
+            polls = []
+            for _ in range(20):
+                start = time.perf_counter()
+                kf.current_max = -1
+                kf.refresh()
+                polls.append(time.perf_counter() - start)
+
+            kf = KeyFollower(keys, timeout=1, finished_dataset=fh["finished"])
+            out = _time_iteration(kf)
+
+        out["poll_mean"] = float(np.mean(polls))
+        return out
+
+    return bench
+
+
+def bench_datasource(direct, codec="blosc-lz4", mmap=False):
+    def bench(path, sizes):
+        _write_static(path, sizes, codec=codec)
+
+        with h5py.File(path, "r", libver="latest", swmr=True) as fh:
+            df = DataSource(
+                [fh["key"]],
+                {"data": fh["data"]},
+                timeout=1,
+                finished_dataset=fh["finished"],
+                use_direct_chunk=direct,
+                use_mmap=mmap,
+            )
+            return _time_iteration(df, lambda n: n * _frame_bytes(sizes))
+
+    return bench
+
+
+def bench_chunksource(
+    path, sizes, codec="blosc-lz4", mmap=False, pread=False, workers=0
+):
+    fpc = 16
+    _write_static(path, sizes, frames_per_chunk=fpc, codec=codec)
+
+    with h5py.File(path, "r", libver="latest", swmr=True) as fh:
+        cs = ChunkSource(
+            {"data": fh["data"]},
+            timeout=1,
+            finished_dataset=fh["finished"],
+            read_ahead=workers,
+            max_workers=workers or None,
+            use_mmap=mmap,
+            use_pread=pread,
+        )
+        out = _time_iteration(cs, lambda n: n * fpc * _frame_bytes(sizes))
+
+    out["frames_per_second"] = out["throughput"] * fpc
+    return out
+
+
+def bench_chunksource_uncompressed(mmap):
+    def bench(path, sizes):
+        return bench_chunksource(path, sizes, codec=None, mmap=mmap)
+
+    return bench
+
+
+def bench_chunksource_threaded(pread):
+    # read ahead on 4 threads, through h5py or with os.pread
+    def bench(path, sizes):
+        return bench_chunksource(path, sizes, pread=pread, workers=4)
+
+    return bench
+
+
+def bench_slice_structure(path, sizes):
+    n = 7
+    scan_shape = [sizes["points"] // 20, 20]
+    npoints = math.prod(scan_shape)
+
+    start = time.perf_counter()
+    structures = [
+        get_slice_structure(i, n, scan_shape, True) for i in range(0, npoints, n)
+    ]
+    seconds = time.perf_counter() - start
+    return _metrics([], len(structures), seconds)
+
+
+def bench_write_data(path, sizes):
+    n = 7
+    scan_shape = [sizes["points"] // 20, 20]
+    npoints = math.prod(scan_shape)
+    frame = (16, 16)
+    stack = np.arange(npoints * 256, dtype=np.float32).reshape((npoints,) + frame)
+    structures = [
+        get_slice_structure(i, n, scan_shape, True) for i in range(0, npoints, n)
+    ]
+
+    with h5py.File(path, "w") as fh:
+        output = fh.create_dataset(
+            "data",
+            shape=tuple(scan_shape) + frame,
+            dtype=np.float32,
+            chunks=(1, 20) + frame,
+        )
+
+        start = time.perf_counter()
+        last = None
+        for i, ss in zip(range(0, npoints, n), structures):
+            data = stack[i : i + n]
+            write_data(ss, data, last, output)
+            last = data
+        seconds = time.perf_counter() - start
+
+        writer = ChunkWriter()
+        start = time.perf_counter()
+        last = None
+        for i, ss in zip(range(0, npoints, n), structures):
+            data = stack[i : i + n]
+            writer.write(ss, data, last, output)
+            last = data
+        writer_seconds = time.perf_counter() - start
+
+    out = _metrics([], len(structures), seconds, nbytes=stack.nbytes)
+    out["chunk_writer_seconds"] = writer_seconds
+    return out
+
+
+def bench_append_data(path, sizes):
+    n = sizes["keys"] // 10
+
+    with h5py.File(path, "w") as fh:
+        ds = utils.create_dataset(np.zeros(1), (None,), fh, "append")
+        start = time.perf_counter()
+        for i in range(n):
+            utils.append_data(np.array([i]), (slice(i, i + 1),), ds)
+        seconds = time.perf_counter() - start
+
+        ds = utils.create_dataset(np.zeros(1), (None,), fh, "appender")
+        start = time.perf_counter()
+        with utils.DataAppender(ds) as appender:
+            for i in range(n):
+                appender.append(np.array([i]), (slice(i, i + 1),))
+        appender_seconds = time.perf_counter() - start
+
+    out = _metrics([], n, seconds)
+    out["appender_seconds"] = appender_seconds
+    return out
+
+
+def _import_seconds(statement, repeats=5):
+    # best of several fresh interpreters, less the interpreter start up
+    def run(code):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        return time.perf_counter() - start
+
+    return min(run(statement) for _ in range(repeats)) - min(
+        run("pass") for _ in range(repeats)
+    )
+
+
+def bench_import_time(path, sizes):
+    out = {
+        "package_seconds": _import_seconds("import swmr_tools"),
+        "keyfollower_seconds": _import_seconds("from swmr_tools import KeyFollower"),
+        "chunksource_seconds": _import_seconds("from swmr_tools import ChunkSource"),
+    }
+    out["seconds"] = out["package_seconds"]
+    return out
+
+
+def _follow_live(path, sizes, frames_per_chunk, read):
+    # frame i is due at start + (i + 1) / rate, latency is how long after that it was read
+    rate = sizes["rate"]
+    start_time = time.time() + 0.5
+    writer = SyntheticWriter(
+        path,
+        (sizes["points"],),
+        sizes["frame"],
+        rate=rate,
+        frames_per_chunk=frames_per_chunk,
+        codec="blosc-lz4",
+        start_time=start_time,
+    )
+    p = writer.start()
+
+    try:
+        ready = utils.check_files_readable({path: ["/data", "/key", "/finished"]})
+        if not ready[path]["readable"]:
+            raise RuntimeError("Live writer file could not be read")
+
+        base = synthetic_frame(0, sizes["frame"])[0, 0]
+        latencies = []
+
+        with h5py.File(path, "r", libver="latest", swmr=True) as fh:
+            for frame in read(fh):
+                index = int(frame[0, 0]) - int(base)
+                due = start_time + (index + 1) / rate
+                latencies.append(max(time.time() - due, 0.0))
+
+        seconds = time.time() - start_time
+    finally:
+        p.join()
+
+    return _metrics(latencies, len(latencies), seconds)
+
+
+def bench_live_datasource(path, sizes):
+    def read(fh):
+        df = DataSource(
+            [fh["key"]],
+            {"data": fh["data"]},
+            timeout=2,
+            finished_dataset=fh["finished"],
+            use_direct_chunk=True,
+        )
+        for d in df:
+            yield d["data"][0]
+
+    return _follow_live(path, sizes, 1, read)
+
+
+def bench_live_chunksource(path, sizes):
+    def read(fh):
+        cs = ChunkSource(
+            {"data": fh["data"]}, timeout=2, finished_dataset=fh["finished"]
+        )
+        for c in cs:
+            # the last frame of a chunk is the newest
+            yield c["data"][-1]
+
+    return _follow_live(path, sizes, 4, read)
+
+
+# name to (benchmark function, follows a live writer)
+BENCHMARKS = {
+    "keyfollower_1key": (bench_keyfollower(1), False),
+    "keyfollower_8keys": (bench_keyfollower(8), False),
+    "datasource_h5py": (bench_datasource(False), False),
+    "datasource_direct": (bench_datasource(True), False),
+    "uncompressed_datasource": (bench_datasource(False, None), False),
+    "mmap_datasource": (bench_datasource(False, None, mmap=True), False),
+    "chunksource": (bench_chunksource, False),
+    "uncompressed_chunksource": (bench_chunksource_uncompressed(False), False),
+    "mmap_chunksource": (bench_chunksource_uncompressed(True), False),
+    "threaded_chunksource": (bench_chunksource_threaded(False), False),
+    "pread_chunksource": (bench_chunksource_threaded(True), False),
+    "slice_structure": (bench_slice_structure, False),
+    "write_data": (bench_write_data, False),
+    "append_data": (bench_append_data, False),
+    "import_time": (bench_import_time, False),
+    "live_datasource": (bench_live_datasource, True),
+    "live_chunksource": (bench_live_chunksource, True),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark swmr_tools")
+    parser.add_argument("-o", "--output", help="file to write the JSON results to")
+    parser.add_argument("-b", "--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--size", choices=list(_SIZES), default="quick")
+    parser.add_argument(
+        "--no-live", action="store_true", help="skip live writer benchmarks"
+    )
+    parser.add_argument("--workdir", help="directory for benchmark files")
+    parser.add_argument("names", nargs="*", help="benchmarks to run (name prefixes)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        args.workdir, args.names or None, size=args.size, live=not args.no_live
+    )
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.tolerance)
+    for r in regressions:
+        print(
+            f"REGRESSION {r['benchmark']} {r['metric']}: "
+            f"{r['baseline']:.4g} -> {r['current']:.4g} ({r['ratio']:.2f}x)",
+            file=sys.stderr,
+        )
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,8 @@
 import numpy as np
 from . import utils
+import collections
 import math
+import zlib
 
 
 class SliceInOut:
@@ -73,54 +75,165 @@ def _build_collection(
 
 
 def write_data(slice_structure, data, last_data, output):
-    for s in slice_structure:
-        spos = s.position
+    ChunkWriter(direct=False).write(slice_structure, data, last_data, output)
 
-        output_slice = [slice(0, None)] * len(output.shape)
 
-        for i in range(len(spos)):
-            output_slice[i] = slice(spos[i], spos[i] + 1)
+class ChunkWriter:
+    """Writes slice structures from get_slice_structure into an output
+    dataset, keeping its intermediate buffers between calls.
 
-        if s.type == "current":
-            si = s.current.input
-            so = s.current.output
+    Combined pieces (the end of the last chunk and the start of the current
+    one) are assembled in a buffer that is reused for every piece of the same
+    shape, and only zeroed when the two parts do not fill it. When a piece
+    covers exactly one chunk of an HDF5 output dataset that is uncompressed,
+    blosc or deflate compressed, the piece is compressed here and written with
+    write_direct_chunk, bypassing the HDF5 filter pipeline and hyperslab
+    selection. Any other piece is written through h5py slicing.
 
-            input_slice = [slice(0, None)] * len(data.shape)
-            input_slice[0] = si
-            flush_data = data[tuple(input_slice)]
-        elif s.type == "last":
-            si = s.last.input
-            so = s.last.output
-            input_slice = [slice(0, None)] * len(last_data.shape)
-            input_slice[0] = si
+    Parameters
+    ----------
 
-            flush_data = last_data[tuple(input_slice)]
-        else:
-            # Combined
-            inter_shape = list(data.shape)
-            inter_shape[0] = s.intermediate.size
-            intermediate = np.zeros(inter_shape, dtype=data.dtype)
+    direct: bool (optional)
+        Write chunk aligned pieces with write_direct_chunk. Defaults to True.
+
+    Examples
+    --------
 
-            ls = s.last.input
-            li = s.last.output
-            last_slice = [slice(0, None)] * len(last_data.shape)
-            last_slice[0] = ls
-            intermediate[li] = last_data[tuple(last_slice)]
+    >>> writer = ChunkWriter()
+    >>> for chunk in ChunkSource({"data": f["data"]}):
+    >>>     ss = get_slice_structure(chunk.index, n, scan_shape)
+    >>>     writer.write(ss, chunk["data"], last, out)
+    >>>     last = chunk["data"]
 
-            cs = s.current.input
-            ci = s.current.output
-            input_slice = [slice(0, None)] * len(data.shape)
-            input_slice[0] = cs
-            intermediate[ci] = data[tuple(input_slice)]
+    """
+
+    def __init__(self, direct=True):
+        self.direct = direct
+        self.direct_writes = 0
+        self._buffers = {}
+        self._encoders = {}
 
-            so = s.intermediate.slice
+    def write(self, slice_structure, data, last_data, output):
+        """
+        Write every piece of a slice structure to the output
 
-            flush_data = intermediate
+            Parameters:
+                slice_structure (list): ChunkSliceCollections from get_slice_structure
+                data (numpy array): the current chunk
+                last_data (numpy array): the previous chunk
+                output (h5py dataset or numpy array): dataset to write into
 
+        """
         rank = len(data.shape)
-        output_slice[-1 * rank] = so
 
-        output[tuple(output_slice)] = flush_data
+        for s in slice_structure:
+            output_slice = [slice(0, None)] * len(output.shape)
+
+            for i, p in enumerate(s.position):
+                output_slice[i] = slice(p, p + 1)
+
+            if s.type == "current":
+                flush_data = data[s.current.input]
+                so = s.current.output
+            elif s.type == "last":
+                flush_data = last_data[s.last.input]
+                so = s.last.output
+            else:
+                flush_data = self._combine(s, data, last_data)
+                so = s.intermediate.slice
+
+            output_slice[-1 * rank] = so
+            output_slice = tuple(output_slice)
+
+            if self.direct and self._write_direct(output, output_slice, flush_data):
+                continue
+
+            output[output_slice] = flush_data
+
+    def _combine(self, s, data, last_data):
+        size = s.intermediate.size
+        shape = (size,) + data.shape[1:]
+        key = (shape, data.dtype)
+        intermediate = self._buffers.get(key)
+
+        if intermediate is None:
+            intermediate = np.zeros(shape, dtype=data.dtype)
+            self._buffers[key] = intermediate
+        else:
+            li, ci = s.last.output, s.current.output
+            filled = len(range(*li.indices(size))) + len(range(*ci.indices(size)))
+            if filled < size:
+                intermediate.fill(0)
+
+        intermediate[s.last.output] = last_data[s.last.input]
+        intermediate[s.current.output] = data[s.current.input]
+        return intermediate
+
+    def _write_direct(self, output, output_slice, flush_data):
+        chunks = getattr(output, "chunks", None)
+        if chunks is None:
+            return False
+
+        offset = []
+        for sl, c, n in zip(output_slice, chunks, output.shape):
+            start, stop, step = sl.indices(n)
+            if step != 1 or start % c != 0 or stop - start != c:
+                return False
+            offset.append(start)
+
+        encoder = self._get_encoder(output)
+        if encoder is None:
+            return False
+
+        data = np.ascontiguousarray(flush_data, dtype=output.dtype)
+        output.id.write_direct_chunk(tuple(offset), encoder(data))
+        self.direct_writes += 1
+        return True
+
+    def _get_encoder(self, output):
+        key = output.id
+        if key not in self._encoders:
+            self._encoders[key] = _get_encoder(output)
+        return self._encoders[key]
+
+
+_BLOSC_COMPRESSORS = ("blosclz", "lz4", "lz4hc", "snappy", "zlib", "zstd")
+_FILTER_DEFLATE = 1
+_FILTER_BLOSC = 32001
+
+
+def _get_encoder(dataset):
+    # inverse of the chunksource decoders, None if the filters are not supported
+    prop_dcid = dataset.id.get_create_plist()
+    nfilters = prop_dcid.get_nfilters()
+
+    if nfilters == 0:
+        return lambda data: data.tobytes()
+
+    if nfilters != 1:
+        return None
+
+    filter_id, _, cd_values, _ = prop_dcid.get_filter(0)
+
+    if filter_id == _FILTER_DEFLATE:
+        level = cd_values[0] if cd_values else 4
+        return lambda data: zlib.compress(data.tobytes(), level)
+
+    blosc = utils._import_optional("blosc")
+
+    if filter_id == _FILTER_BLOSC and blosc is not None:
+        # cd_values: version, version, typesize, chunksize, clevel, shuffle, compressor
+        # missing trailing values take the filter defaults
+        cd = list(cd_values) + [2, 2, 0, 0, 5, 1, 0][len(cd_values) :]
+        clevel, shuffle, code = cd[4], cd[5], cd[6]
+        if code >= len(_BLOSC_COMPRESSORS):
+            return None
+        cname = _BLOSC_COMPRESSORS[code]
+        return lambda data: blosc.compress(
+            data.tobytes(), data.dtype.itemsize, clevel, shuffle, cname
+        )
+
+    return None
 
 
 def _raster_routine(index, poff, spos, n_points_chunk, scan_shape):
@@ -520,6 +633,9 @@ def get_slice_structure(index, n_points_chunk, scan_shape, snake):
 
         Returns:
             slice_structure (list): List containing mappings of current and last chunk into dataset of shape scan_shape
+    If compile_slice_plan was called for the scan geometry, chunk aligned indices are
+    looked up in its SlicePlan, otherwise the structure is computed directly.
+
     Examples
     --------
 
@@ -528,6 +644,15 @@ def get_slice_structure(index, n_points_chunk, scan_shape, snake):
 
     """
 
+    if index % n_points_chunk == 0 and _plans:
+        plan = _plans.get(_plan_key(n_points_chunk, scan_shape, snake))
+        if plan is not None and index < math.prod(scan_shape):
+            return plan.get(index // n_points_chunk)
+
+    return _compute_slice_structure(index, n_points_chunk, scan_shape, snake)
+
+
+def _compute_slice_structure(index, n_points_chunk, scan_shape, snake):
     # Get position of the point in the scan grid that the chunk corresponds to
     # and, if snake, whether that row is running backwards
     is_snake_row = False
@@ -554,3 +679,165 @@ def get_slice_structure(index, n_points_chunk, scan_shape, snake):
     else:
         # run the raster routine
         return _raster_routine(index, poff, spos, n_points_chunk, scan_shape)
+
+
+# encodes None in the integer slice tables of a SlicePlan
+_NONE = np.iinfo(np.int64).min
+
+# chunks compiled together when a SlicePlan is first used for one of them
+_PLAN_BLOCK = 256
+
+# compiled plans kept for reuse, oldest dropped first
+_MAX_PLANS = 16
+_plans = collections.OrderedDict()
+
+
+class SlicePlan:
+    """Slice structures for the chunks of a scan, stored in flat arrays.
+
+    The tables are compiled a block of _PLAN_BLOCK chunks at a time, when a
+    chunk of the block is first looked up, so creating a plan costs nothing
+    and only the parts of the scan that are used are held in memory. Row r
+    of the tables of a block describes one ChunkSliceCollection, the rows
+    for chunk k of the block are offsets[k] to offsets[k + 1]. types holds
+    the index of the collection type in ChunkSliceCollection.types, positions
+    the scan position and slices the (start, stop, step) of the current input
+    and output, last input and output and intermediate slice, followed by the
+    intermediate size, with None stored as _NONE.
+    """
+
+    def __init__(self, n_points_chunk, scan_shape, snake):
+        self.n_points_chunk = n_points_chunk
+        self.scan_shape = tuple(scan_shape)
+        self.snake = snake
+        self.n_chunks = -(-math.prod(scan_shape) // n_points_chunk)
+        self._blocks = {}
+
+    def __len__(self):
+        return self.n_chunks
+
+    def get(self, chunk_index):
+        """Returns the slice structure (list of ChunkSliceCollection) for chunk_index"""
+        if not 0 <= chunk_index < self.n_chunks:
+            raise IndexError(f"Chunk {chunk_index} out of range")
+
+        b, k = divmod(chunk_index, _PLAN_BLOCK)
+        block = self._blocks.get(b)
+        if block is None:
+            block = self._compile_block(b)
+            # replaced whole, so other threads never see a block half built
+            self._blocks[b] = block
+
+        offsets, types, positions, slices = block
+        start, stop = offsets[k], offsets[k + 1]
+        return [
+            _collection_from_row(t, p, row)
+            for t, p, row in zip(
+                types[start:stop].tolist(),
+                positions[start:stop].tolist(),
+                slices[start:stop].tolist(),
+            )
+        ]
+
+    def _compile_block(self, b):
+        first = b * _PLAN_BLOCK
+        last = min(first + _PLAN_BLOCK, self.n_chunks)
+
+        offsets = [0]
+        types = []
+        positions = []
+        slices = []
+
+        for k in range(first, last):
+            ss = _compute_slice_structure(
+                k * self.n_points_chunk,
+                self.n_points_chunk,
+                self.scan_shape,
+                self.snake,
+            )
+            for cc in ss:
+                types.append(ChunkSliceCollection.types.index(cc.type))
+                positions.append([int(p) for p in cc.position])
+                slices.append(_encode_collection(cc))
+            offsets.append(len(types))
+
+        return (
+            offsets,
+            np.array(types, dtype=np.int8),
+            np.array(positions, dtype=np.int64).reshape(-1, len(self.scan_shape)),
+            np.array(slices, dtype=np.int64).reshape(-1, 16),
+        )
+
+
+def compile_slice_plan(n_points_chunk, scan_shape, snake):
+    """
+    Returns the SlicePlan for the chunks of a scan, and lets get_slice_structure
+    use it. Plans are kept for reuse (up to 16), so scans with the same
+    geometry share one plan. Worth it when the slice structures of a scan
+    are looked up more than once, for instance when several scans of the
+    same shape are remapped.
+
+        Parameters:
+            n_points_chunk (int): number of points in a chunk
+            scan_shape (array): Shape of scan to map chunks into
+            snake (boolean): Whether the scan is snake or raster pattern
+
+        Returns:
+            plan (SlicePlan): slice structures for the scan, compiled as they are used
+
+    """
+    key = _plan_key(n_points_chunk, scan_shape, snake)
+    plan = _plans.get(key)
+
+    if plan is None:
+        plan = SlicePlan(*key)
+        _plans[key] = plan
+        while len(_plans) > _MAX_PLANS:
+            _plans.popitem(last=False)
+
+    return plan
+
+
+def _plan_key(n_points_chunk, scan_shape, snake):
+    return int(n_points_chunk), tuple(int(s) for s in scan_shape), bool(snake)
+
+
+def _encode_slice(s):
+    if s is None:
+        return [_NONE] * 3
+    return [_NONE if v is None else int(v) for v in (s.start, s.stop, s.step)]
+
+
+def _decode_slice(values):
+    return slice(*[None if v == _NONE else v for v in values])
+
+
+def _encode_collection(cc):
+    out = []
+    for inout in (cc.current, cc.last):
+        if inout is None:
+            out += [_NONE] * 6
+        else:
+            out += _encode_slice(inout.input) + _encode_slice(inout.output)
+
+    if cc.intermediate is None:
+        out += [_NONE] * 4
+    else:
+        out += _encode_slice(cc.intermediate.slice) + [int(cc.intermediate.size)]
+
+    return out
+
+
+def _collection_from_row(type_index, position, row):
+    cc = ChunkSliceCollection(ChunkSliceCollection.types[type_index], tuple(position))
+    cc.current = _decode_inout(row[0:6])
+    cc.last = _decode_inout(row[6:12])
+    if row[12] != _NONE or row[15] != _NONE:
+        cc.intermediate = SliceSize(_decode_slice(row[12:15]), row[15])
+    return cc
+
+
+def _decode_inout(values):
+    if all(v == _NONE for v in values):
+        return None
+    return SliceInOut(_decode_slice(values[0:3]), _decode_slice(values[3:6]))
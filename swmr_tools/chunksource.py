@@ -1,7 +1,12 @@
 from .datasource import SliceDict
-import blosc
+from .mmapreader import MappedChunkReader
+from .rawreader import RawChunkReader
+from concurrent.futures import ThreadPoolExecutor
+import h5py
 import numpy as np
 import time
+import weakref
+import zlib
 from . import utils
 
 import logging
@@ -10,12 +15,145 @@ logger = logging.getLogger(__name__)
 
 
 class ChunkSource:
-    def __init__(self, datasets, timeout=10, finished_dataset=None):
-        self._check_datasets(datasets.values())
+    """Iterator returning whole chunks of datasets, read with direct chunk
+    reads, as they are written to the file.
+
+    The datasets are walked chunk by chunk over their N-dimensional chunk
+    grid, so stacks chunked along the first dimension, tiled images and
+    datasets chunked along several scan dimensions are all supported.
+
+    Parameters
+    ----------
+
+    datasets: dict
+        A dictionary of names to datasets to read chunks from. The datasets
+        must have the same chunk grid, and the same chunk size along the first
+        dimension and along every other dimension that is split into more than
+        one chunk. Chunks may be uncompressed, or blosc or deflate compressed.
+
+    timeout: int (optional)
+        The maximum time allowed for a chunk to be written before iteration
+        is halted. If a value is not set this will default to 10 seconds.
+
+    finished_dataset: dataset (optional)
+        A scalar hdf5 dataset which is zero when the file is being
+        written to and non-zero when the file is complete. Used to stop
+        the iterator without waiting for the timeout.
+
+    transforms: dict (optional)
+        A dictionary of dataset name to FrameTransform, reducing the frames of
+        each chunk (crop, bin, data type) straight from the decompressed buffer.
+        Each chunk of a transformed dataset must hold whole frames.
+
+    scan_rank: int (optional)
+        Number of leading scan dimensions of the datasets, the transforms act
+        on the remaining frame dimensions. If not set the frame rank is taken
+        from the crop or bin of each transform, or else all but the first
+        dimension are frame dimensions.
+
+    read_ahead: int (optional)
+        Number of chunks after the current one to read and decompress in
+        worker threads, if they are already written, while the current chunk
+        is being processed. Defaults to 0 (no read-ahead).
+
+    max_workers: int (optional)
+        Number of worker threads used for read-ahead and for decompressing the
+        datasets of one chunk concurrently. If neither this nor read_ahead is
+        set chunks are read on the calling thread.
+
+    order: str (optional)
+        "scan" (default) walks the chunk grid in row-major order, each chunk
+        returned as soon as it is written. "storage" waits until all the chunks
+        sharing a position along the first dimension are written and returns
+        them in the order they are stored in the file.
+
+    start: int (optional)
+        Chunk index to start iterating from. Defaults to 0.
+
+    shard_id: int (optional)
+        Which shard of the chunks to return, from 0 to num_shards - 1, so one
+        scan can be processed by num_shards independent processes or nodes.
+        Results written at each item's slice_metadata can be combined with
+        utils.merge_shards.
+
+    num_shards: int (optional)
+        Number of shards the chunks are split into. Defaults to 1 (no sharding).
+
+    shard_assignment: str (optional)
+        "round_robin" (default) deals units out to the shards in turn, "block"
+        gives each shard a contiguous range of units and needs datasets of
+        fixed size.
+
+    shard_unit: int (optional)
+        Number of consecutive chunks (in iteration order) assigned to a shard
+        together. Defaults to 1.
+
+    use_mmap: bool (optional)
+        Return the chunks of uncompressed datasets as views onto a memory map
+        of the file (see MappedChunkReader), without copying them through
+        HDF5. Chunks that cannot be mapped are read with direct chunk reads.
+
+    use_pread: bool (optional)
+        Read the stored bytes of chunks with os.pread (see RawChunkReader)
+        rather than through h5py, so the read-ahead and max_workers threads
+        read and decompress chunks in parallel instead of one at a time.
+        Chunk locations are checked again after each refresh, and a chunk
+        that cannot be read or decoded this way is read with h5py.
+
+    Each item has index set to the start of the chunk along the first
+    dimension, and slice_metadata set to a tuple of slices, one for every
+    dimension of the highest rank dataset, locating the chunk in it. If that
+    dataset is transformed the frame dimensions of slice_metadata and maxshape
+    are those of the transformed frames.
+
+    Chunks can also be read out of order with cs[chunk_index], and seek moves
+    the iterator, both without reading the chunks before.
+
+    Examples
+    --------
+
+    >>> with h5py.File("/path/to/file.h5", "r", libver="latest", swmr=True) as f:
+    >>>     cs = ChunkSource({"data": f["data"]}, timeout=5)
+    >>>     for chunk in cs:
+    >>>         print(chunk.slice_metadata, chunk["data"].shape)
+
+    """
+
+    orders = ("scan", "storage")
+
+    def __init__(
+        self,
+        datasets,
+        timeout=10,
+        finished_dataset=None,
+        transforms=None,
+        read_ahead=0,
+        max_workers=None,
+        order="scan",
+        start=0,
+        shard_id=0,
+        num_shards=1,
+        shard_assignment="round_robin",
+        shard_unit=1,
+        use_mmap=False,
+        use_pread=False,
+        scan_rank=None,
+    ):
+        if order not in ChunkSource.orders:
+            raise RuntimeError(f"{order} not in {ChunkSource.orders}")
+
         self._datasets = datasets
+        self._transforms = {} if transforms is None else transforms
+        self.read_ahead = read_ahead
+        self.max_workers = max_workers
+        self.order = order
+        self._executor = None
+        self._pending = {}
+        self._row_orders = {}
         self.finished_dataset = finished_dataset
         self.timeout = timeout
         self.finished_set = False
+        self.timed_out = False
         self.max_size = None
         for ds in self._datasets.values():
             ms = ds.maxshape[0]
@@ -24,87 +162,369 @@ class ChunkSource:
                 self.max_size = ms
 
         self.chunk_size = list(self._datasets.values())[0].chunks[0]
-
         self.current_index = 0
 
-    def _check_datasets(self, datasets):
-        for d in datasets:
-            s = d.shape
-            c = d.chunks
-            # ignore first dimension
-            for i in range(1, len(s)):
-                if s[i] != c[i]:
-                    raise RuntimeError(f"Chunk {c} and shape {s} not compatible")
-
-    def _read_datasets(self, current_index, datasets, output):
-        for n, d in datasets.items():
-            s = list(d.chunks)
-            s[0] = -1
-
-            coffset = [0] * len(d.shape)
-
-            flat_index = current_index * self.chunk_size
-            coffset[0] = flat_index
-
-            prop_dcid = d.id.get_create_plist()
-            use_blosc = False
-            if prop_dcid.get_nfilters() == 1 and prop_dcid.get_filter(0)[0] == 32001:
-                use_blosc = True
-            elif prop_dcid.get_nfilters() == 0:
-                pass
-            else:
-                raise RuntimeError(
-                    "Dataset filters not supported for direct chunk read"
+        self._plans = [
+            _ReadPlan(
+                n,
+                d,
+                self.max_size,
+                self._transforms.get(n),
+                scan_rank,
+                use_mmap,
+                use_pread,
+                _weak_method(self._is_ahead),
+            )
+            for n, d in datasets.items()
+        ]
+
+        self.grid_shape = self._check_datasets(self._plans)
+        self._reference = max(self._plans, key=lambda p: len(p.chunks))
+        self._tiles_per_row = int(np.prod(self.grid_shape[1:]))
+        self._snapshot = _ChunkIndexSnapshot(self._plans, self.grid_shape)
+
+        self.shard_id = shard_id
+        self.num_shards = num_shards
+        self.shard_assignment = shard_assignment
+        self.shard_unit = shard_unit
+        self._setup_shard()
+
+        if start != 0:
+            start = self._normalise_index(start)
+
+        first = self._next_in_shard(start)
+        if self._n_chunks is not None and first >= self._n_chunks:
+            # no chunks left in this shard (there may be more shards than
+            # chunks), iteration only waits for the end of the scan
+            self.current_index = self._n_chunks
+        else:
+            self.seek(first)
+
+    def _is_ahead(self, offset):
+        # chunks in rows already passed are only read again by random access,
+        # so their locations are not cached
+        row = offset[0] // self.chunk_size
+        return row >= self.current_index // self._tiles_per_row
+
+    def _check_datasets(self, plans):
+        rank = max(len(p.grid) for p in plans)
+        grid = None
+
+        for p in plans:
+            g = p.grid + [1] * (rank - len(p.grid))
+            if grid is None:
+                grid = g
+                first = p
+                continue
+
+            if g != grid:
+                raise RuntimeError(f"Chunk grid {g} of {p.name} does not match {grid}")
+
+            for i in range(len(p.grid)):
+                if (i == 0 or p.grid[i] != 1) and p.chunks[i] != first.chunks[i]:
+                    raise RuntimeError(
+                        f"Chunk {p.chunks} of {p.name} not compatible with {first.chunks}"
+                    )
+
+        return tuple(grid)
+
+    def _grid_coords(self, index):
+        row, tile = divmod(index, self._tiles_per_row)
+
+        if self.order == "storage":
+            tile = self._row_order(row)[tile]
+
+        return _unravel_chunk(row * self._tiles_per_row + tile, self.grid_shape)
+
+    def _row_order(self, row):
+        """Returns the tiles of a row sorted by file offset, or None if the row
+        is not completely written"""
+        if row in self._row_orders:
+            return self._row_orders[row]
+
+        first = row * self._tiles_per_row
+        tiles = [
+            _unravel_chunk(first + t, self.grid_shape)
+            for t in range(self._tiles_per_row)
+        ]
+
+        if not self._snapshot.covers(first, first + self._tiles_per_row):
+            # not in the snapshot (random access), check the row directly
+            if not all(self._is_written(c) for c in tiles):
+                return None
+
+        offsets = []
+        for coords in tiles:
+            offset = self._reference.chunk_coords(coords)
+            info = self._reference.dsid.get_chunk_info_by_coord(offset)
+            offsets.append(info.byte_offset)
+
+        order = [int(i) for i in np.argsort(offsets, kind="stable")]
+        self._row_orders[row] = order
+        return order
+
+    def _read_datasets(self, current_index, plans, output):
+        if current_index in self._pending:
+            futures = self._pending.pop(current_index)
+        elif self._use_workers():
+            futures = self._submit(self._grid_coords(current_index), plans)
+        else:
+            coords = self._grid_coords(current_index)
+            for plan in plans:
+                output[plan.name] = self._read_dataset(coords, plan)
+            return
+
+        for n, f in futures.items():
+            output[n] = f.result()
+
+    def _use_workers(self):
+        return self.read_ahead > 0 or self.max_workers is not None
+
+    def _submit(self, coords, plans):
+        if self._executor is None:
+            # let the decompression run in parallel with the other workers
+            blosc = utils._import_optional("blosc")
+            if blosc is not None:
+                blosc.set_releasegil(True)
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        return {
+            p.name: self._executor.submit(self._read_dataset, coords, p) for p in plans
+        }
+
+    def _schedule_read_ahead(self):
+        index = self.current_index
+        for _ in range(self.read_ahead):
+            # uses the snapshot from the last poll, no extra refresh here
+            if not self._check_index(index, update=False):
+                break
+
+            if index not in self._pending:
+                self._pending[index] = self._submit(
+                    self._grid_coords(index), self._plans
                 )
 
-            # since we have checked the index and shape this should always work...
-            chunk = d.id.read_direct_chunk(coffset)
+            index = self._next_in_shard(index + 1)
+
+    def _setup_shard(self):
+        if not 0 <= self.shard_id < self.num_shards:
+            raise RuntimeError(
+                f"Shard id {self.shard_id} not in range of {self.num_shards} shards"
+            )
 
-            ds = self._chunk2numpy(chunk[1], d.dtype, s, use_blosc)
+        self._n_chunks = None
+        if self.grid_shape[0] is not None:
+            self._n_chunks = self.grid_shape[0] * self._tiles_per_row
 
-            if self.max_size < (current_index * self.chunk_size + self.chunk_size):
-                s[0] = self.max_size - current_index * self.chunk_size
-                if ds.shape != s:
-                    slices = [slice(0, None)] * len(ds.shape)
-                    slices[0] = slice(0, s[0])
-                    ds = ds[tuple(slices)]
+        n_units = None
+        if self._n_chunks is not None:
+            n_units = -(-self._n_chunks // self.shard_unit)
 
-            output[n] = ds
+        # raises if the assignment is unknown, or is "block" without a size
+        utils.get_shard(0, self.num_shards, self.shard_assignment, n_units)
 
-    def _chunk2numpy(self, blob, dtype, shape, use_blosc):
-        if use_blosc:
-            blob = blosc.decompress(blob)
-        npa = np.frombuffer(blob, dtype=dtype, count=-1)
-        return npa.reshape(shape)
+        if self.shard_assignment == "block":
+            per = -(-n_units // self.num_shards) * self.shard_unit
+            self._shard_range = (
+                min(self.shard_id * per, self._n_chunks),
+                min((self.shard_id + 1) * per, self._n_chunks),
+            )
 
-    def _check_index(self, datasets, current_index):
-        for n, d in datasets.items():
-            s = list(d.chunks)
-            s[0] = -1
+    def _next_in_shard(self, index):
+        # the first chunk index from index on that belongs to this shard
+        if self.num_shards == 1:
+            return index
 
-            coffset = [0] * len(d.shape)
+        if self.shard_assignment == "block":
+            start, stop = self._shard_range
+            if index < start:
+                return start
+            if index >= stop:
+                # the block is done, wait past the last chunk for the scan to end
+                return self._n_chunks
+            return index
 
-            flat_index = current_index * self.chunk_size
-            coffset[0] = flat_index
+        unit = index // self.shard_unit
+        skip = (self.shard_id - unit) % self.num_shards
+        return (unit + skip) * self.shard_unit if skip else index
 
-            si = d.id.get_chunk_info_by_coord(tuple(coffset))
+    def _count_in_shard(self, start, stop):
+        count = 0
+        index = self._next_in_shard(start)
+        while index < stop:
+            count += 1
+            index = self._next_in_shard(index + 1)
 
-            # if offset is None chunk is not written
-            if si.byte_offset is None:
+        return count
+
+    def close(self):
+        """Stop the read-ahead worker threads and discard any chunks read ahead"""
+        for futures in self._pending.values():
+            for f in futures.values():
+                f.cancel()
+
+        self._pending = {}
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+        for plan in self._plans:
+            plan.close()
+
+    def _read_dataset(self, coords, plan):
+        offset = plan.chunk_coords(coords)
+        ds = None
+        if plan.mapped is not None:
+            ds = plan.mapped.read_chunk(offset, consume=True)
+
+        if ds is None:
+            ds = plan.read(offset)
+
+        ds = plan.trim(ds, coords)
+
+        if plan.transform is not None:
+            ds = plan.transform.apply(ds, plan.frame_rank)
+
+        return ds
+
+    def _check_index(self, current_index, update=True):
+        if update and current_index >= self._available():
+            # probe forward from the frontier using the current metadata
+            self._snapshot.update()
+
+        return self._snapshot.base <= current_index < self._available()
+
+    def _is_written(self, coords):
+        for plan in self._plans:
+            offset = plan.chunk_coords(coords)
+
+            if any(s <= o for s, o in zip(plan.dataset.shape, offset)):
                 return False
 
-            # if shape is less than (or equal) to current index
-            # chunk is flushed (offset not None), but metadata not updated
-            if d.shape[0] <= flat_index:
+            if not plan.is_complete(offset, plan.dataset.shape[0], self.finished_set):
+                return False
+
+            if plan.dsid.get_chunk_info_by_coord(offset).byte_offset is None:
                 return False
 
         return True
 
+    def _normalise_index(self, chunk_index):
+        if chunk_index < 0:
+            if self.grid_shape[0] is None:
+                raise IndexError("Negative chunk index with unlimited first dimension")
+            chunk_index += self.grid_shape[0] * self._tiles_per_row
+
+        if chunk_index < 0 or (
+            self.grid_shape[0] is not None
+            and chunk_index >= self.grid_shape[0] * self._tiles_per_row
+        ):
+            raise IndexError(f"Chunk index {chunk_index} out of range")
+
+        return chunk_index
+
+    def seek(self, chunk_index):
+        """
+        Move the iterator so the next chunk returned is chunk_index, discarding
+        any chunks already read ahead
+
+            Parameters:
+                chunk_index (int): index of the chunk in iteration order, may be negative if the size is fixed
+
+        """
+        if chunk_index == self.current_index:
+            return
+
+        chunk_index = self._normalise_index(chunk_index)
+
+        for futures in self._pending.values():
+            for f in futures.values():
+                f.cancel()
+
+        self._pending = {}
+        self.current_index = chunk_index
+
+        if not self._snapshot.covers(chunk_index, chunk_index + 1):
+            # restart the snapshot at the row containing chunk_index
+            row_start = chunk_index - chunk_index % self._tiles_per_row
+            self._snapshot.reset(row_start)
+
+    def __getitem__(self, chunk_index):
+        """Read the chunk at chunk_index (in iteration order) without moving the iterator"""
+        chunk_index = self._normalise_index(chunk_index)
+
+        if self.order == "storage":
+            written = self._row_order(chunk_index // self._tiles_per_row) is not None
+        else:
+            written = self._snapshot.covers(
+                chunk_index, chunk_index + 1
+            ) or self._is_written(_unravel_chunk(chunk_index, self.grid_shape))
+
+        if not written:
+            raise IndexError(f"Chunk {chunk_index} is not written")
+
+        return self._build_output(chunk_index)
+
+    def _available(self):
+        available = self._snapshot.available
+
+        if self.order == "storage":
+            # only whole rows can be ordered
+            available -= available % self._tiles_per_row
+
+        return available
+
+    def available_chunks(self, refresh=True):
+        """
+        Returns the number of chunks that are written and not yet returned
+
+            Parameters:
+                refresh (boolean): refresh the datasets and chunk index snapshot first
+
+        """
+        if refresh:
+            self._refresh()
+
+        return self._count_in_shard(self.current_index, self._available())
+
+    def next_batch(self, max_chunks=None):
+        """
+        Returns a list of every chunk that is available now, waiting (as
+        iteration does) for at least one. Returns an empty list once
+        iteration would stop.
+
+            Parameters:
+                max_chunks (int): maximum number of chunks to return
+
+        """
+        try:
+            batch = [next(self)]
+        except StopIteration:
+            return []
+
+        while max_chunks is None or len(batch) < max_chunks:
+            if not self._check_index(self.current_index, update=False):
+                break
+            batch.append(self._generate_output())
+
+        return batch
+
+    def _refresh(self):
+        for ds in self._datasets.values():
+            utils.refresh_dataset(ds)
+
+        for plan in self._plans:
+            plan.refresh()
+
+        # one snapshot update per poll, shared by all datasets
+        self._snapshot.update()
+
     def __iter__(self):
         return self
 
     def __next__(self):
-        if self._check_index(self._datasets, self.current_index):
+        if self._check_index(self.current_index):
             return self._generate_output()
 
         start_time = time.time()
@@ -112,31 +532,44 @@ class ChunkSource:
             time.sleep(self.timeout / 20.0)
             self._check_finished_dataset()
 
-            for ds in self._datasets.values():
-                utils.refresh_dataset(ds)
+            self._refresh()
 
-            if self._check_index(self._datasets, self.current_index):
+            if self._check_index(self.current_index, update=False):
                 return self._generate_output()
 
             if self.finished_set:
+                self.close()
                 raise StopIteration
 
+        self.timed_out = True
+        self.close()
         raise StopIteration
 
+    def is_scan_finished(self):
+        return self.finished_set
+
+    def has_timed_out(self):
+        return self.timed_out
+
     def _generate_output(self):
-        output = SliceDict()
-        output.index = self.current_index * self.chunk_size
-        output.slice_metadata = [
-            slice(
-                self.current_index * self.chunk_size,
-                self.current_index + 1 * self.chunk_size,
-            )
-        ]
-        output.maxshape = [self.max_size]
+        output = self._build_output(self.current_index)
 
-        self._read_datasets(self.current_index, self._datasets, output)
+        self.current_index = self._next_in_shard(self.current_index + 1)
 
-        self.current_index += 1
+        if self.read_ahead > 0:
+            self._schedule_read_ahead()
+
+        return output
+
+    def _build_output(self, chunk_index):
+        coords = self._grid_coords(chunk_index)
+
+        output = SliceDict()
+        output.index = coords[0] * self.chunk_size
+        output.slice_metadata = self._reference.slices(coords)
+        output.maxshape = list(self._reference.output_extents)
+
+        self._read_datasets(chunk_index, self._plans, output)
 
         return output
 
@@ -157,6 +590,299 @@ class ChunkSource:
         # this is important due to race conditions between the final
         # keys being readable and the finished flag being set
         self.finished_set = not self.finished_dataset[0] == 0
+        self._snapshot.finished = self.finished_set
 
         if self.finished_set:
             logger.debug("Finish flag set after finished dataset check")
+
+
+class _ChunkIndexSnapshot:
+    """Number of chunks, in row-major grid order, written in every dataset.
+
+    Updated once per poll by probing forward from the last known frontier of
+    each dataset, so the cost is proportional to the number of new chunks.
+    When the number of allocated chunks of a dataset equals the number of
+    chunks covering its shape the probe is skipped entirely."""
+
+    def __init__(self, plans, grid_shape):
+        self._plans = plans
+        self._grid_shape = grid_shape
+        self._tiles_per_row = int(np.prod(grid_shape[1:]))
+        self.base = 0
+        self.frontiers = [0] * len(plans)
+        self.available = 0
+        # once the scan is finished a partly written last chunk is available
+        self.finished = False
+
+    def reset(self, base):
+        """Start the snapshot again from chunk index base"""
+        self.base = base
+        self.frontiers = [base] * len(self._plans)
+        self.available = base
+
+    def covers(self, start, stop):
+        """True if chunks start to stop are known to be written"""
+        return self.base <= start and stop <= self.available
+
+    def update(self):
+        for i, plan in enumerate(self._plans):
+            self.frontiers[i] = self._advance(plan, self.frontiers[i])
+
+        self.available = min(self.frontiers)
+        return self.available
+
+    def _advance(self, plan, index):
+        shape = plan.dataset.shape
+
+        # bulk check: every chunk covering the shape is allocated
+        if all(s == e for s, e in zip(shape[1:], plan.extents[1:])):
+            rows = -(-shape[0] // plan.chunks[0])
+            covered = plan.complete_rows(shape[0], self.finished) * self._tiles_per_row
+            if (
+                covered > index
+                and plan.dsid.get_num_chunks() == rows * self._tiles_per_row
+            ):
+                return covered
+
+        n_chunks = self._grid_shape[0]
+        if n_chunks is not None:
+            n_chunks *= self._tiles_per_row
+
+        while n_chunks is None or index < n_chunks:
+            offset = plan.chunk_coords(_unravel_chunk(index, self._grid_shape))
+
+            # if shape is less than (or equal) to the chunk offset
+            # chunk may be flushed, but metadata not updated
+            if any(s <= o for s, o in zip(shape, offset)):
+                break
+
+            # the dataset may grow into the rest of the chunk
+            if not plan.is_complete(offset, shape[0], self.finished):
+                break
+
+            # if offset is None chunk is not written
+            if plan.dsid.get_chunk_info_by_coord(offset).byte_offset is None:
+                break
+
+            index += 1
+
+        return index
+
+
+class _ReadPlan:
+    """Everything needed to read and decode the chunks of one dataset,
+    resolved once so the per-chunk path only does the read and the decode"""
+
+    def __init__(
+        self,
+        name,
+        dataset,
+        max_size,
+        transform=None,
+        scan_rank=None,
+        use_mmap=False,
+        use_pread=False,
+        keep=None,
+    ):
+        self.name = name
+        self.dataset = dataset
+        self.dsid = dataset.id
+        self.dtype = dataset.dtype
+        self.chunks = tuple(dataset.chunks)
+        self.chunk_shape = (-1,) + self.chunks[1:]
+        self.transform = transform
+        self.decoder = _get_decoder(dataset)
+
+        self.mapped = None
+        if use_mmap and self.decoder is None:
+            reader = MappedChunkReader(dataset, keep)
+            self.mapped = reader if reader.available else None
+
+        self.raw = None
+        if use_pread:
+            reader = RawChunkReader(dataset, keep)
+            self.raw = reader if reader.available else None
+
+        # extent of each dimension, the first may be unlimited (None)
+        self.extents = [max_size] + [
+            s if m is None else m
+            for s, m in zip(dataset.shape[1:], dataset.maxshape[1:])
+        ]
+
+        self.grid = [
+            None if e is None else -(-e // c) for e, c in zip(self.extents, self.chunks)
+        ]
+
+        # (index, size) of the partial last chunk in each dimension
+        self.edges = [
+            None if e is None or e % c == 0 else (e // c, e % c)
+            for e, c in zip(self.extents, self.chunks)
+        ]
+        self._has_edges = any(e is not None for e in self.edges)
+
+        self.frame_rank = 0
+        self.output_extents = self.extents
+        if transform is not None:
+            self._setup_transform(scan_rank)
+
+    def _setup_transform(self, scan_rank):
+        rank = len(self.chunks)
+        frame_rank = self.transform.frame_rank
+
+        if scan_rank is not None:
+            if frame_rank is not None and frame_rank != rank - scan_rank:
+                raise RuntimeError(
+                    f"Transform of {self.name} has frame rank {frame_rank}, "
+                    f"not {rank - scan_rank} for scan rank {scan_rank}"
+                )
+            frame_rank = rank - scan_rank
+        elif frame_rank is None:
+            frame_rank = rank - 1
+
+        lead = rank - frame_rank
+        if not 0 < frame_rank < rank:
+            raise RuntimeError(f"Frame rank {frame_rank} not valid for {self.name}")
+
+        # transforms work on whole frames, in frame coordinates
+        if any(g != 1 for g in self.grid[lead:]):
+            raise RuntimeError(
+                f"Transform of {self.name} needs whole frames in each chunk, not {self.chunks}"
+            )
+
+        self.frame_rank = frame_rank
+        self.output_extents = self.extents[:lead] + list(
+            self.transform.output_shape(self.extents[lead:])
+        )
+
+    def chunk_coords(self, grid_coords):
+        return tuple(g * c for g, c in zip(grid_coords, self.chunks))
+
+    def is_complete(self, offset, rows, finished=False):
+        """True if the first dimension (rows long) covers the chunk at offset,
+        or can grow no further into it"""
+        stop = offset[0] + self.chunks[0]
+        if self.extents[0] is not None:
+            stop = min(stop, self.extents[0])
+
+        return rows >= stop or (finished and rows > offset[0])
+
+    def complete_rows(self, rows, finished=False):
+        """Number of chunks along the first dimension covered by rows"""
+        n = rows // self.chunks[0]
+        if rows % self.chunks[0] and (finished or rows == self.extents[0]):
+            n += 1
+
+        return n
+
+    def slices(self, grid_coords):
+        rows = self.dataset.shape[0]
+        out = []
+        for i, (g, c, e) in enumerate(zip(grid_coords, self.chunks, self.extents)):
+            stop = g * c + c
+            if e is not None:
+                stop = min(stop, e)
+            if i == 0:
+                # a last chunk returned when the scan finished is partly written
+                stop = max(min(stop, rows), g * c)
+            out.append(slice(g * c, stop))
+
+        if self.frame_rank:
+            # whole transformed frames
+            lead = len(out) - self.frame_rank
+            out[lead:] = [slice(0, e) for e in self.output_extents[lead:]]
+
+        return tuple(out)
+
+    def read(self, offset):
+        if self.raw is not None:
+            raw = self.raw.read_chunk(offset, consume=True)
+            if raw is not None:
+                try:
+                    return self.decode(*raw)
+                except Exception as e:
+                    # rewritten elsewhere since it was located
+                    logger.debug(f"Raw read of {self.name} chunk {offset} failed {e}")
+                    self.raw.forget(offset)
+
+        # since we have checked the index and shape this should always work...
+        filter_mask, blob = self.dsid.read_direct_chunk(offset)
+        return self.decode(filter_mask, blob)
+
+    def refresh(self):
+        # the dataset was refreshed, chunks may have moved
+        for reader in (self.mapped, self.raw):
+            if reader is not None:
+                reader.refresh()
+
+    def close(self):
+        for reader in (self.mapped, self.raw):
+            if reader is not None:
+                reader.close()
+
+    def decode(self, filter_mask, blob):
+        # filter mask is set if the (optional) filter was skipped
+        if self.decoder is not None and not filter_mask & 1:
+            blob = self.decoder(blob)
+
+        return np.frombuffer(blob, dtype=self.dtype).reshape(self.chunk_shape)
+
+    def trim(self, ds, grid_coords):
+        rows = self.dataset.shape[0] - grid_coords[0] * self.chunks[0]
+        if rows < ds.shape[0]:
+            # the rows of the chunk not written when the scan finished
+            ds = ds[:rows]
+
+        if not self._has_edges:
+            return ds
+
+        slices = [slice(None)] * ds.ndim
+        trimmed = False
+        for i, (g, edge) in enumerate(zip(grid_coords, self.edges)):
+            if edge is not None and g == edge[0]:
+                slices[i] = slice(0, edge[1])
+                trimmed = True
+
+        return ds[tuple(slices)] if trimmed else ds
+
+
+def _get_decoder(dataset):
+    prop_dcid = dataset.id.get_create_plist()
+    nfilters = prop_dcid.get_nfilters()
+
+    if nfilters == 0:
+        return None
+
+    if nfilters == 1:
+        filter_id = prop_dcid.get_filter(0)[0]
+        if filter_id == 32001:
+            blosc = utils._import_optional("blosc")
+            if blosc is None:
+                raise RuntimeError("blosc is needed to read blosc compressed chunks")
+            return blosc.decompress
+        if filter_id == h5py.h5z.FILTER_DEFLATE:
+            return zlib.decompress
+
+    raise RuntimeError("Dataset filters not supported for direct chunk read")
+
+
+def _weak_method(method):
+    # the readers keep the callback, a bound method would keep the
+    # ChunkSource, and its datasets, alive until the garbage collector runs
+    ref = weakref.WeakMethod(method)
+
+    def call(*args):
+        bound = ref()
+        return True if bound is None else bound(*args)
+
+    return call
+
+
+def _unravel_chunk(index, grid_shape):
+    # row-major, the first dimension may be unbounded
+    coords = []
+    for n in reversed(grid_shape[1:]):
+        index, c = divmod(index, n)
+        coords.append(c)
+
+    coords.append(index)
+    return tuple(reversed(coords))
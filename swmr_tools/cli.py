@@ -0,0 +1,301 @@
+"""Command line tool, swmr-tools, for checking live scans.
+
+swmr-tools follow FILE --keys /entry/key [--finished /entry/finished]
+swmr-tools tail FILE --keys /entry/key --data /entry/data [--stats]
+swmr-tools check FILE [FILE ...] --datasets /entry/data
+swmr-tools bench FILE --data /entry/data [--keys /entry/key]
+"""
+
+from . import utils
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv=None):
+    """
+    Run the swmr-tools command line tool
+
+        Parameters:
+            argv (list): arguments, sys.argv[1:] if not set
+
+        Returns:
+            status (int): exit status, 0 on success
+
+    """
+    parser = _parser()
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        # output piped to a command such as head that exited, stop quietly
+        sys.stdout = open(os.devnull, "w")
+        return 0
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog="swmr-tools", description="Follow, check and benchmark HDF5 SWMR scans"
+    )
+    parser.add_argument("-v", "--verbose", action="store_true")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser(
+        "follow", help="print the key frontier, rate and ETA of a live file"
+    )
+    p.add_argument("file")
+    p.add_argument("--keys", nargs="+", required=True, help="key dataset paths")
+    p.add_argument("--finished", help="finished flag dataset path")
+    p.add_argument("--timeout", type=float, default=10)
+    p.add_argument(
+        "--interval", type=float, default=1.0, help="seconds between reports"
+    )
+    p.set_defaults(func=follow)
+
+    p = sub.add_parser("tail", help="stream frames or frame statistics from datasets")
+    p.add_argument("file")
+    p.add_argument("--keys", nargs="+", required=True, help="key dataset paths")
+    p.add_argument("--data", nargs="+", required=True, help="frame dataset paths")
+    p.add_argument("--finished", help="finished flag dataset path")
+    p.add_argument("--timeout", type=float, default=10)
+    p.add_argument("--stats", action="store_true", help="print statistics not frames")
+    p.add_argument("--every", type=int, default=1, help="print every n-th frame")
+    p.add_argument("--direct", action="store_true", help="use direct chunk reads")
+    p.set_defaults(func=tail)
+
+    p = sub.add_parser("check", help="check files and their linked files are readable")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--datasets", nargs="+", required=True, help="dataset paths")
+    p.add_argument("--timeout", type=float, default=10)
+    p.add_argument("--no-links", action="store_true", help="do not check link targets")
+    p.set_defaults(func=check)
+
+    p = sub.add_parser("bench", help="measure read throughput of a file")
+    p.add_argument("file")
+    p.add_argument("--data", required=True, help="frame dataset path")
+    p.add_argument(
+        "--keys", nargs="+", help="key dataset paths, needed for h5py and direct"
+    )
+    p.add_argument("--finished", help="finished flag dataset path")
+    p.add_argument("--timeout", type=float, default=1)
+    p.add_argument(
+        "--modes",
+        nargs="+",
+        choices=["h5py", "direct", "chunk"],
+        default=["h5py", "direct", "chunk"],
+    )
+    p.add_argument("--json", action="store_true", help="print the results as JSON")
+    p.set_defaults(func=bench)
+
+    return parser
+
+
+def _open(path):
+    # registers the compression filters with HDF5 if hdf5plugin is installed
+    utils._import_optional("hdf5plugin")
+    import h5py
+
+    return h5py.File(path, "r", libver="latest", swmr=True)
+
+
+def _finished(fh, args):
+    return fh[args.finished] if args.finished else None
+
+
+def _format_eta(seconds):
+    if seconds is None:
+        return "?"
+    return time.strftime("%H:%M:%S", time.gmtime(seconds))
+
+
+def follow(args):
+    from .keyfollower import KeyFollower
+
+    with _open(args.file) as fh:
+        keys = [fh[k] for k in args.keys]
+        kf = KeyFollower(
+            keys, timeout=args.timeout, finished_dataset=_finished(fh, args)
+        )
+        kf.check_datasets()
+
+        total = None
+        if all(s is not None for s in kf.maxshape):
+            total = math.prod(kf.maxshape)
+
+        start = last_time = time.monotonic()
+        last_count = count = 0
+        rate = 0.0
+
+        def report():
+            eta = None
+            if total is not None and rate > 0:
+                eta = (total - count) / rate
+            of = "" if total is None else f"/{total}"
+            print(
+                f"frontier {count}{of} rate {rate:.1f}/s eta {_format_eta(eta)}",
+                flush=True,
+            )
+
+        for index in kf:
+            count = index + 1
+            now = time.monotonic()
+            if now - last_time >= args.interval:
+                rate = (count - last_count) / (now - last_time)
+                last_time, last_count = now, count
+                report()
+
+        elapsed = time.monotonic() - start
+        rate = count / elapsed if elapsed > 0 else 0.0
+        report()
+
+        state = "finished" if kf.finished_set else "timed out"
+        print(f"{state} after {count} points in {elapsed:.1f}s", flush=True)
+
+    return 0
+
+
+def tail(args):
+    from .datasource import DataSource
+    import numpy as np
+
+    with _open(args.file) as fh:
+        df = DataSource(
+            [fh[k] for k in args.keys],
+            {d: fh[d] for d in args.data},
+            timeout=args.timeout,
+            finished_dataset=_finished(fh, args),
+            use_direct_chunk=args.direct,
+        )
+
+        for count, frames in enumerate(df):
+            if count % args.every != 0:
+                continue
+
+            pos = tuple(int(s.start) for s in frames.slice_metadata)
+            for name, frame in frames.items():
+                if args.stats:
+                    print(
+                        f"{frames.index} {pos} {name} min {frame.min()} max {frame.max()} "
+                        f"mean {frame.mean():.6g} sum {frame.sum()}",
+                        flush=True,
+                    )
+                else:
+                    text = np.array2string(np.squeeze(frame), threshold=20, edgeitems=2)
+                    print(f"{frames.index} {pos} {name}\n{text}", flush=True)
+
+    return 0
+
+
+def check(args):
+    files = {f: args.datasets for f in args.files}
+    results = utils.check_files_readable(
+        files, timeout=args.timeout, follow_links=not args.no_links
+    )
+
+    for path, r in results.items():
+        state = "ready" if r["readable"] else "NOT READY"
+        line = f"{path}: {state} after {r['elapsed']:.2f}s ({r['attempts']} attempts)"
+        if not r["readable"] and r["error"]:
+            line += f" {r['error']}"
+        print(line)
+
+    return 0 if all(r["readable"] for r in results.values()) else 1
+
+
+def bench(args):
+    from .benchmark import _time_iteration
+
+    if {"h5py", "direct"} & set(args.modes) and not args.keys:
+        print("--keys is needed for the h5py and direct modes", file=sys.stderr)
+        return 2
+
+    results = {}
+
+    for mode in args.modes:
+        # a fresh handle for each mode so no mode benefits from another's cache
+        with _open(args.file) as fh:
+            data = fh[args.data]
+            scan_rank = _scan_rank(fh, data, args)
+            frame_bytes = math.prod(data.shape[scan_rank:]) * data.dtype.itemsize
+            source = _bench_source(mode, fh, data, args)
+
+            if mode == "direct" and not source.frame_readers["data"].use_direct_chunk:
+                # FrameReader would read with h5py, timing the h5py mode again
+                results[mode] = {
+                    "unavailable": "needs blosc compressed frames, one per chunk"
+                }
+                continue
+
+            # the bytes read are counted, chunks at the edge of a scan are partial
+            read = [0]
+
+            def items(source=source, read=read):
+                for item in source:
+                    read[0] += item["data"].nbytes
+                    yield item
+
+            out = _time_iteration(items(), lambda n, read=read: read[0])
+            out["frames"] = read[0] // frame_bytes
+            seconds = out["seconds"]
+            out["frames_per_second"] = out["frames"] / seconds if seconds > 0 else 0.0
+            results[mode] = out
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    for mode, r in results.items():
+        if "unavailable" in r:
+            print(f"{mode}: unavailable, {r['unavailable']}")
+            continue
+
+        print(
+            f"{mode}: {r['items']} items {r['frames']} frames "
+            f"{r['frames_per_second']:.1f} frames/s "
+            f"{r['bytes_per_second'] / 2**20:.1f} MB/s"
+        )
+
+    return 0
+
+
+def _scan_rank(fh, data, args):
+    if not args.keys:
+        # without keys, assume a stack of images
+        return data.ndim - 2
+
+    from .keyfollower import KeyFollower
+
+    kf = KeyFollower([fh[k] for k in args.keys])
+    kf.check_datasets()
+    return kf.scan_rank
+
+
+def _bench_source(mode, fh, data, args):
+    if mode == "chunk":
+        from .chunksource import ChunkSource
+
+        return ChunkSource(
+            {"data": data}, timeout=args.timeout, finished_dataset=_finished(fh, args)
+        )
+
+    from .datasource import DataSource
+
+    return DataSource(
+        [fh[k] for k in args.keys],
+        {"data": data},
+        timeout=args.timeout,
+        finished_dataset=_finished(fh, args),
+        use_direct_chunk=mode == "direct",
+    )
@@ -1,14 +1,18 @@
 from .keyfollower import KeyFollower
+from .mmapreader import MappedChunkReader
 import logging
 import numpy as np
-from .utils import get_position, create_dataset, append_data, refresh_dataset
-import sys
-from time import sleep
-
-try:
-    import blosc
-except ImportError:
-    pass
+from .utils import (
+    get_position,
+    create_dataset,
+    append_data,
+    refresh_dataset,
+    count_shard_units,
+    get_shard,
+    get_shard_units,
+    _import_optional,
+)
+from time import sleep, monotonic
 
 logger = logging.getLogger(__name__)
 
@@ -50,6 +54,43 @@ class DataSource:
         direct chunk read is required but not possible through a VDS stack of frames. Only
         for stacks of frames.
 
+    refresh_interval: float (optional)
+        Maximum age in seconds of a dataset's cached metadata before it is refreshed.
+        Datasets are always refreshed when the key maximum moves past their cached
+        shape. The default of 0 refreshes every dataset each time the key maximum
+        grows. Only use a non-zero value when the writer extends the dataset shape
+        as frames are written, otherwise frames inside a pre-allocated shape may be
+        read before the refresh that makes them visible.
+
+    transforms: dict (optional)
+        A dictionary of dataset path to FrameTransform, reducing frames of that
+        dataset (crop, bin, data type) as they are read.
+
+    shard_id: int (optional)
+        Which shard of the scan to return, from 0 to num_shards - 1. Every
+        shard follows the same keys but only reads and returns its own frames,
+        so one scan can be processed by num_shards independent processes or
+        nodes. Results written at each item's slice_metadata can be combined
+        with utils.merge_shards.
+
+    num_shards: int (optional)
+        Number of shards the scan is split into. Defaults to 1 (no sharding).
+
+    shard_assignment: str (optional)
+        "round_robin" (default) deals units out to the shards in turn, "block"
+        gives each shard a contiguous range of units and needs a scan of known
+        size.
+
+    shard_unit: int (optional)
+        Number of consecutive frames assigned to a shard together. If not set
+        frames are assigned a whole chunk (of the first dataset) at a time, so
+        no two shards read the same chunk.
+
+    use_mmap: bool (optional)
+        Read frames of uncompressed datasets, whose chunks hold whole frames,
+        as views onto a memory map of the file (see MappedChunkReader) rather
+        than copying them through h5py. The frames returned are read-only.
+
 
     Examples
     --------
@@ -71,31 +112,87 @@ class DataSource:
         finished_dataset=None,
         use_direct_chunk=False,
         interleaved_datasets=None,
+        refresh_interval=0,
+        transforms=None,
+        shard_id=0,
+        num_shards=1,
+        shard_assignment="round_robin",
+        shard_unit=None,
+        use_mmap=False,
     ):
         self._datasets = datasets
         self._interleaved_datasets = interleaved_datasets
+        self._transforms = {} if transforms is None else transforms
         self.max_index = -1
         self.frame_readers = {}
         self.interleaved_frame_readers = {}
+        self.refresh_scheduler = RefreshScheduler(refresh_interval)
         self.kf = KeyFollower(key_datasets, timeout, finished_dataset)
         self.kf.check_datasets()
 
         if datasets is None and interleaved_datasets is None:
             raise RuntimeError("No data specified to follow!")
 
-        self._add_datasets_to_cache(use_direct_chunk)
-        self._add_interleaved_datasets_to_cache(use_direct_chunk)
+        self._add_datasets_to_cache(use_direct_chunk, use_mmap)
+        self._add_interleaved_datasets_to_cache(use_direct_chunk, use_mmap)
+
+        self.shard_id = shard_id
+        self.num_shards = num_shards
+        self.shard_assignment = shard_assignment
+        self._setup_shard(shard_unit)
+
+    def _setup_shard(self, shard_unit):
+        if not 0 <= self.shard_id < self.num_shards:
+            raise RuntimeError(
+                f"Shard id {self.shard_id} not in range of {self.num_shards} shards"
+            )
+
+        self._shard_chunks = None
+        self._shard_unit = 1 if shard_unit is None else shard_unit
+        self._n_shard_units = None
+
+        if self.num_shards == 1:
+            return
+
+        scan_shape = tuple(self.kf.maxshape)
+
+        if shard_unit is None and self._datasets:
+            chunks = list(self._datasets.values())[0].chunks
+            if chunks is not None:
+                self._shard_chunks = chunks[: self.kf.scan_rank]
+
+        n_units = count_shard_units(scan_shape, self._shard_chunks, self._shard_unit)
+        self._n_shard_units = n_units
 
-    def _add_datasets_to_cache(self, use_direct_chunk):
+        # raises if the assignment is unknown, or is "block" without a size
+        get_shard(0, self.num_shards, self.shard_assignment, n_units)
+
+    def in_shard(self, index):
+        """True if the frame at flattened scan index is read by this shard"""
+        if self.num_shards == 1:
+            return True
+
+        unit = get_shard_units(
+            index, self.kf.maxshape, self._shard_chunks, self._shard_unit
+        )
+        shard = get_shard(
+            unit, self.num_shards, self.shard_assignment, self._n_shard_units
+        )
+        return shard == self.shard_id
+
+    def _add_datasets_to_cache(self, use_direct_chunk, use_mmap):
         if self._datasets is not None:
             for path, data in self._datasets.items():
                 self.frame_readers[path] = FrameReader(
                     data,
                     self.kf.scan_rank,
                     use_direct_chunk=use_direct_chunk,
+                    transform=self._transforms.get(path),
+                    use_mmap=use_mmap,
                 )
+                self.refresh_scheduler.add(data, self.kf.scan_rank)
 
-    def _add_interleaved_datasets_to_cache(self, use_direct_chunk):
+    def _add_interleaved_datasets_to_cache(self, use_direct_chunk, use_mmap):
         if self._interleaved_datasets is not None:
             for path, data_list in self._interleaved_datasets.items():
                 self.interleaved_frame_readers[path] = []
@@ -104,47 +201,51 @@ class DataSource:
                         data,
                         self.kf.scan_rank,
                         use_direct_chunk=use_direct_chunk,
+                        transform=self._transforms.get(path),
+                        use_mmap=use_mmap,
                     )
 
                     self.interleaved_frame_readers[path].append(fr)
+                    self.refresh_scheduler.add(
+                        data, self.kf.scan_rank, stride=len(data_list)
+                    )
 
     def __iter__(self):
         return self
 
     def __next__(self):
         current_dataset_index = next(self.kf)
-        force_refresh = False
+
+        # keys of the other shards are followed, their frames are not read
+        while not self.in_shard(current_dataset_index):
+            current_dataset_index = next(self.kf)
+
         if self.max_index < current_dataset_index:
             self.max_index = self.kf.current_max
-            force_refresh = True
+            # one batch of refreshes per advance of the key maximum
+            self.refresh_scheduler.refresh(self.max_index)
 
         output = SliceDict()
 
-        self._add_datasets_to_output(current_dataset_index, output, force_refresh)
-        self._add_interleaved_datasets_to_output(
-            current_dataset_index, output, force_refresh
-        )
+        self._add_datasets_to_output(current_dataset_index, output)
+        self._add_interleaved_datasets_to_output(current_dataset_index, output)
 
         return output
 
-    def _add_datasets_to_output(self, current_dataset_index, output, force_refresh):
+    def _add_datasets_to_output(self, current_dataset_index, output):
         if self._datasets is None:
             return
 
         for path in self._datasets.keys():
             fg = self.frame_readers[path]
-            frame, slice_metadata = fg.read_frame(
-                current_dataset_index, force_refresh=force_refresh
-            )
+            frame, slice_metadata = fg.read_frame(current_dataset_index)
             output[path] = frame
             if output.slice_metadata is None:
                 output.slice_metadata = slice_metadata
                 output.maxshape = self.kf.maxshape
                 output.index = current_dataset_index
 
-    def _add_interleaved_datasets_to_output(
-        self, current_dataset_index, output, force_refresh
-    ):
+    def _add_interleaved_datasets_to_output(self, current_dataset_index, output):
         if self._interleaved_datasets is None:
             return
 
@@ -153,7 +254,7 @@ class DataSource:
             fr_index = current_dataset_index % (n_frs)
 
             frame, slice_metadata = frs[fr_index].read_frame(
-                current_dataset_index // n_frs, force_refresh=force_refresh
+                current_dataset_index // n_frs
             )
             output[path] = frame
 
@@ -185,6 +286,68 @@ class DataSource:
         return self.kf.timed_out
 
 
+class RefreshScheduler:
+    """Decides which datasets need a refresh when the key maximum advances.
+
+    A dataset is refreshed if its cached shape does not yet contain the
+    requested index, or if it was last refreshed more than interval seconds
+    ago. All refreshes needed for one poll are done together in refresh.
+
+    Parameters
+    ----------
+
+    interval: float (optional)
+        Maximum age in seconds of the cached metadata of a dataset. The
+        default of 0 refreshes every dataset on every call to refresh.
+
+    Examples
+    --------
+
+    >>> rs = RefreshScheduler(interval=1.0)
+    >>> rs.add(f["data"], scan_rank=1)
+    >>> rs.refresh(max_index)
+
+    """
+
+    def __init__(self, interval=0):
+        self.interval = interval
+        self._entries = []
+
+    def add(self, dataset, scan_rank, stride=1):
+        """Register a dataset. stride is the number of interleaved datasets
+        the scan index is shared between (index // stride is read from this
+        dataset)."""
+        self._entries.append(_RefreshEntry(dataset, scan_rank, stride))
+
+    def refresh(self, max_index):
+        """Refresh all datasets that cannot serve max_index from their cached
+        shape, or whose metadata is older than interval. Returns the number of
+        datasets refreshed."""
+        now = monotonic()
+        stale = [e for e in self._entries if self._needs_refresh(e, max_index, now)]
+
+        for e in stale:
+            refresh_dataset(e.dataset)
+            e.last_refresh = now
+
+        return len(stale)
+
+    def _needs_refresh(self, entry, max_index, now):
+        if entry.last_refresh is None or now - entry.last_refresh >= self.interval:
+            return True
+
+        n_points = np.prod(entry.dataset.shape[: entry.scan_rank])
+        return max_index // entry.stride >= n_points
+
+
+class _RefreshEntry:
+    def __init__(self, dataset, scan_rank, stride):
+        self.dataset = dataset
+        self.scan_rank = scan_rank
+        self.stride = stride
+        self.last_refresh = None
+
+
 class SliceDict(dict):
     """Dictionary with attributes for the slice metadata and maxshape of the scan"""
 
@@ -216,6 +379,15 @@ class FrameReader:
         compressed, will use direct chunk read and compression outside of h5py
         for performance.
 
+    transform: FrameTransform (optional)
+        Crop, binning and data type reduction applied to each frame as it is
+        read. With the h5py read path only the cropped region is read.
+
+    use_mmap: bool (optional)
+        If the dataset is uncompressed and each chunk holds whole frames,
+        return frames as read-only views onto a memory map of the file,
+        falling back to h5py for any chunk that cannot be mapped.
+
     Examples
     --------
 
@@ -227,10 +399,28 @@ class FrameReader:
 
     """
 
-    def __init__(self, dataset, scan_rank, use_direct_chunk=False):
+    def __init__(
+        self,
+        dataset,
+        scan_rank,
+        use_direct_chunk=False,
+        transform=None,
+        use_mmap=False,
+    ):
         self.dataset = dataset
         self.scan_rank = scan_rank
         self.use_direct_chunk = use_direct_chunk
+        self.transform = transform
+        self.mapped = None
+
+        if use_mmap:
+            reader = MappedChunkReader(dataset)
+            # a frame must lie in one chunk to be a view
+            if (
+                reader.available
+                and reader.chunks[scan_rank:] == dataset.shape[scan_rank:]
+            ):
+                self.mapped = reader
 
         if use_direct_chunk:
             self.use_direct_chunk = False
@@ -242,7 +432,9 @@ class FrameReader:
                 if shape[-frame_rank:] == chunk[-frame_rank:] and all(
                     [i == 1 for i in chunk[:scan_rank]]
                 ):
-                    if "blosc" in sys.modules:
+                    blosc = _import_optional("blosc")
+                    if blosc is not None:
+                        self._decompress = blosc.decompress
                         self.use_direct_chunk = True
                         self.chunk = chunk
 
@@ -300,10 +492,32 @@ class FrameReader:
         for i in range(len(pos)):
             slices[i] = slice(pos[i], pos[i] + 1)
 
+        if self.mapped is not None:
+            frame = self.get_frame_mapped(pos)
+            if frame is not None:
+                slice_metadata = tuple(slices[: self.scan_rank])
+                if self.transform is None:
+                    return frame, slice_metadata
+                frame_rank = rank - self.scan_rank
+                return self.transform.apply(frame, frame_rank), slice_metadata
+
+        if self.transform is None:
+            if self.use_direct_chunk:
+                return self.get_frame_direct(ds, pos, rank, slices)
+            else:
+                return self.get_frame(ds, slices)
+
+        frame_rank = rank - self.scan_rank
+
         if self.use_direct_chunk:
-            return self.get_frame_direct(ds, pos, rank, slices)
-        else:
-            return self.get_frame(ds, slices)
+            # reduce straight from the decompressed buffer
+            frame, slice_metadata = self.get_frame_direct(ds, pos, rank, slices)
+            return self.transform.apply(frame, frame_rank), slice_metadata
+
+        # only read the cropped region
+        slices[self.scan_rank :] = self.transform.crop_slices(frame_rank)
+        frame, slice_metadata = self.get_frame(ds, slices)
+        return self.transform.apply(frame, frame_rank, cropped=True), slice_metadata
 
     def get_frame(self, ds, slices):
         frame = ds[tuple(slices)]
@@ -322,9 +536,22 @@ class FrameReader:
             refresh_dataset(ds)
             out = ds.id.read_direct_chunk(chunk_pos)
 
-        decom = blosc.decompress(out[1])
+        # filter mask is set if the (optional) blosc filter was skipped
+        decom = out[1] if out[0] & 1 else self._decompress(out[1])
         a = np.frombuffer(decom, dtype=ds.dtype, count=-1)
         return a.reshape(self.chunk), tuple(slices[: self.scan_rank])
 
+    def get_frame_mapped(self, pos):
+        # None if the chunk holding the frame cannot be mapped (yet)
+        chunks = self.mapped.chunks
+        offset = [p - p % c for p, c in zip(pos, chunks)]
+        offset += [0] * (len(chunks) - len(pos))
+
+        chunk = self.mapped.read_chunk(offset)
+        if chunk is None:
+            return None
+
+        return chunk[tuple(slice(p % c, p % c + 1) for p, c in zip(pos, chunks))]
+
     def get_pos(self, index, shape):
         return get_position(index, shape, self.scan_rank)
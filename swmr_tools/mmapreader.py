@@ -0,0 +1,275 @@
+import math
+import mmap
+import numpy as np
+import os
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# file drivers that store the dataset in one ordinary file
+_SINGLE_FILE_DRIVERS = ("sec2", "stdio")
+
+# a chunk index lookup costs about as much as iterating over 40 chunks
+_REBUILD_RATIO = 40
+
+
+class MappedChunkReader:
+    """Reads the uncompressed chunks of a dataset as NumPy views onto a
+    read-only memory map of the file, with no copy and without passing the
+    data through HDF5.
+
+    The location of each chunk comes from the HDF5 chunk index, the bytes are
+    read straight from the map, so reading a chunk already in the page cache
+    is a lookup rather than a copy. Chunk locations are cached, and the whole
+    index is read in one pass (where h5py supports chunk_iter) when many
+    chunks are missing from the cache. After refresh is called the cached
+    locations are checked for chunks that moved. Reading with consume drops
+    the location of a chunk that will not be read again. The file is mapped
+    again when a chunk lies past the end of the current map, as happens when
+    following a file that is still being written.
+
+    read_chunk returns None whenever a chunk cannot be mapped - compressed or
+    filtered chunks, chunks not yet written, virtual or external datasets,
+    files with a user block or not in a single file - and the caller reads it
+    with h5py instead. available is False if no chunk of the dataset can be
+    mapped.
+
+    The views are read-only and stay valid after the reader is closed.
+
+    Parameters
+    ----------
+
+    dataset: h5py Dataset
+        A chunked dataset.
+
+    keep: callable (optional)
+        Called with a chunk offset, returns False for chunks that will not be
+        read, which are then left out of the cached chunk locations.
+
+    Examples
+    --------
+
+    >>> reader = MappedChunkReader(f["data"])
+    >>> chunk = reader.read_chunk((0, 0, 0))
+    >>> if chunk is None:
+    >>>     chunk = f["data"][0:reader.chunks[0]]
+
+    """
+
+    def __init__(self, dataset, keep=None):
+        self.dataset = dataset
+        self.dsid = dataset.id
+        self.dtype = dataset.dtype
+        self.chunks = dataset.chunks
+        self.available = _can_map(dataset)
+        self.mapped_reads = 0
+        self.fallback_reads = 0
+        self._buffer = None
+        self._locations = _ChunkLocations(self.dsid, keep)
+
+        if self.available:
+            self.path = dataset.file.filename
+            self._count = math.prod(self.chunks)
+            self.chunk_bytes = self._count * self.dtype.itemsize
+
+    def read_chunk(self, chunk_offset, consume=False):
+        """
+        Returns the chunk at chunk_offset as a view of the file
+
+            Parameters:
+                chunk_offset (tuple): offset of the first element of the chunk in the dataset
+                consume (bool): drop the cached location, the chunk will not be read again
+
+            Returns:
+                chunk (numpy array): read-only array with the chunk shape, or None if the chunk must be read with h5py
+
+        """
+        view = self._view(chunk_offset, consume) if self.available else None
+
+        if view is None:
+            self.fallback_reads += 1
+        else:
+            self.mapped_reads += 1
+
+        return view
+
+    def _view(self, chunk_offset, consume):
+        location = self._locations.locate(chunk_offset, consume)
+
+        if location is None:
+            return None
+
+        byte_offset, size, filter_mask = location
+
+        # stored filtered or with an unexpected size
+        if filter_mask != 0 or size != self.chunk_bytes:
+            return None
+
+        end = byte_offset + size
+        if self._buffer is None or len(self._buffer) < end:
+            self._remap()
+
+            if self._buffer is None or len(self._buffer) < end:
+                return None
+
+        a = np.frombuffer(
+            self._buffer, dtype=self.dtype, count=self._count, offset=byte_offset
+        )
+        return a.reshape(self.chunks)
+
+    def _remap(self):
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size > 0:
+                m = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+                # views are taken through a memoryview, which holds the map
+                # open (numpy alone does not) until the last view is released
+                self._buffer = memoryview(m)
+
+    def refresh(self):
+        """Check the cached chunk locations again, call after refreshing the dataset"""
+        self._locations.mark_stale()
+
+    def close(self):
+        """Release the map, it is unmapped once no views of it remain"""
+        self._buffer = None
+
+
+class _ChunkLocations:
+    """Cache of the (byte offset, size, filter mask) of the written chunks of
+    a dataset, looked up in the HDF5 chunk index.
+
+    A lookup costs about as much as iterating over 40 chunks, so the whole
+    index is walked in one pass (where h5py supports chunk_iter) once the
+    lookups since the last walk reach 1/40th of the chunks it saw. Readers
+    that read each chunk once consume its location, and keep (if given)
+    leaves chunks that will not be read out of the walks, so the cache only
+    holds the chunks still to be read. After a SWMR refresh a chunk may have
+    been written again elsewhere in the file, so mark_stale makes the next
+    lookup check the cached locations again and count the chunks that moved."""
+
+    def __init__(self, dsid, keep=None):
+        self.dsid = dsid
+        self.keep = keep
+        self.relocated = 0
+        self._index = {}
+        self._misses = 0
+        self._walked = 0
+        self._stale = False
+        self._can_iter = hasattr(dsid, "chunk_iter")
+
+    def locate(self, chunk_offset, consume=False):
+        """(byte offset, size, filter mask) of a written chunk, else None"""
+        offset = tuple(int(o) for o in chunk_offset)
+
+        if self._stale:
+            self._check()
+
+        location = self._take(offset, consume)
+        if location is not None:
+            return location
+
+        if self._can_iter and self._misses * _REBUILD_RATIO >= self._walked:
+            self._read_index()
+            location = self._take(offset, consume)
+            if location is not None:
+                return location
+
+        self._misses += 1
+        location = self._lookup(offset)
+        if location is not None and not consume:
+            self._index[offset] = location
+
+        return location
+
+    def forget(self, chunk_offset):
+        """Drop a location found to be wrong, it is looked up on the next read"""
+        self._index.pop(tuple(int(o) for o in chunk_offset), None)
+
+    def mark_stale(self):
+        self._stale = True
+
+    def _take(self, offset, consume):
+        return self._index.pop(offset, None) if consume else self._index.get(offset)
+
+    def _check(self):
+        # only the chunks still cached (not yet read) are checked
+        self._stale = False
+        old = self._index
+        if not old:
+            return
+
+        if self._can_iter and len(old) * _REBUILD_RATIO >= self.dsid.get_num_chunks():
+            self._read_index()
+            new = self._index
+        else:
+            keep = self.keep
+            new = {}
+            for offset in old:
+                if keep is None or keep(offset):
+                    location = self._lookup(offset)
+                    if location is not None:
+                        new[offset] = location
+            self._index = new
+
+        moved = sum(1 for o, loc in old.items() if o in new and new[o] != loc)
+        if moved:
+            logger.debug(f"{moved} chunks relocated since the last refresh")
+            self.relocated += moved
+
+    def _lookup(self, offset):
+        try:
+            info = self.dsid.get_chunk_info_by_coord(offset)
+        except Exception:
+            # offset outside the (cached) shape of the dataset
+            return None
+
+        if info.byte_offset is None:
+            # not written yet
+            return None
+
+        return (info.byte_offset, info.size, info.filter_mask)
+
+    def _read_index(self):
+        index = {}
+        keep = self.keep
+        walked = 0
+
+        def add(info):
+            nonlocal walked
+            walked += 1
+            if keep is None or keep(info.chunk_offset):
+                index[info.chunk_offset] = (
+                    info.byte_offset,
+                    info.size,
+                    info.filter_mask,
+                )
+
+        self.dsid.chunk_iter(add)
+        # replaced whole, so threads reading chunks never see it half built
+        self._index = index
+        self._walked = walked
+        self._misses = 0
+
+
+def _can_map(dataset):
+    if not _in_one_file(dataset):
+        return False
+
+    return dataset.id.get_create_plist().get_nfilters() == 0
+
+
+def _in_one_file(dataset):
+    # the chunks are stored at their byte offsets in one ordinary file
+    if dataset.chunks is None or dataset.is_virtual:
+        return False
+
+    if dataset.dtype.hasobject or dataset.dtype.itemsize == 0:
+        return False
+
+    fh = dataset.file
+    if fh.driver not in _SINGLE_FILE_DRIVERS or fh.userblock_size != 0:
+        return False
+
+    return dataset.id.get_create_plist().get_external_count() == 0
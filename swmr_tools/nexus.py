@@ -0,0 +1,236 @@
+from .utils import _FlushTimer, create_nxdata, create_nxentry, plan_chunks
+import numpy as np
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LiveNXdata:
+    """NXentry/NXdata output that grows as results are produced, for
+    processed data written in SWMR mode.
+
+    The groups, the signal dataset and one extendable dataset per scan axis
+    are created when the object is constructed, so it must be created before
+    the file is switched to SWMR mode. Frames and axis values are then
+    buffered by append and written in batches, the datasets resized to the
+    extent of the data written so far, and flushed so that SWMR readers can
+    show the partial result.
+
+    Parameters
+    ----------
+
+    parent: h5py Group
+        File or group in which the NXentry is created (or reused if present).
+
+    frame_shape: tuple
+        Shape of a single frame of the signal, () for scalars.
+
+    dtype: numpy dtype (optional)
+        Data type of the signal. Defaults to float64.
+
+    scan_rank: int (optional)
+        Number of scan dimensions. Defaults to 1.
+
+    axes: dict (optional)
+        Names of scan axes to the scan dimension each one varies along.
+
+    entry: str (optional)
+        Name of the NXentry group. Defaults to "entry".
+
+    name: str (optional)
+        Name of the NXdata group. Defaults to "data".
+
+    signal: str (optional)
+        Name of the signal dataset. Defaults to "data".
+
+    frame_axes: list (optional)
+        Axis names for the frame dimensions, "." by default.
+
+    flush_interval: float (optional)
+        Maximum time in seconds a value is buffered, written from a
+        background thread if no more values arrive. Defaults to 1.
+
+    batch_size: int (optional)
+        Number of buffered points that triggers a write. Defaults to 1000.
+
+    chunks: tuple (optional)
+        Chunk shape of the signal, scan then frame dimensions, for instance
+        (1, row_length) for a 2D scan of scalars written a row at a time.
+        Defaults to utils.plan_chunks for a scan of unknown size.
+
+    Examples
+    --------
+
+    >>> with h5py.File("out.h5", "w", libver="latest") as fh:
+    >>>     nx = LiveNXdata(fh, (), axes={"x": 1, "y": 0}, scan_rank=2)
+    >>>     fh.swmr_mode = True
+    >>>     for d in df:
+    >>>         pos = tuple(s.start for s in d.slice_metadata)
+    >>>         nx.append(d["data"].sum(), d.slice_metadata, {"x": xs[pos[1]], "y": ys[pos[0]]})
+    >>>     nx.close()
+
+    """
+
+    def __init__(
+        self,
+        parent,
+        frame_shape,
+        dtype=np.float64,
+        scan_rank=1,
+        axes=None,
+        entry="entry",
+        name="data",
+        signal="data",
+        frame_axes=None,
+        flush_interval=1.0,
+        batch_size=1000,
+        chunks=None,
+    ):
+        self.frame_shape = tuple(frame_shape)
+        self.scan_rank = scan_rank
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.axis_dims = {} if axes is None else dict(axes)
+
+        if entry in parent:
+            self.entry = parent[entry]
+        else:
+            self.entry = create_nxentry(parent, entry)
+
+        self.nxdata = create_nxdata(self.entry, name)
+
+        scan_maxshape = [None] * scan_rank
+        if chunks is None:
+            chunks = plan_chunks(scan_maxshape, self.frame_shape, dtype)
+
+        self.data = self.nxdata.create_dataset(
+            signal,
+            shape=(0,) * scan_rank + self.frame_shape,
+            maxshape=tuple(scan_maxshape) + self.frame_shape,
+            dtype=dtype,
+            chunks=tuple(chunks),
+        )
+
+        axes_attr = ["."] * scan_rank
+        axes_attr += ["."] * len(self.frame_shape) if frame_axes is None else frame_axes
+
+        self.axes = {}
+        for ax, dim in self.axis_dims.items():
+            if dim >= scan_rank:
+                raise RuntimeError(f"Axis {ax} dimension {dim} not in scan")
+
+            self.axes[ax] = self.nxdata.create_dataset(
+                ax,
+                shape=(0,),
+                maxshape=(None,),
+                dtype=np.float64,
+                chunks=plan_chunks([None], [], np.float64, target_bytes=2**16),
+            )
+            self.nxdata.attrs[ax + "_indices"] = dim
+            if axes_attr[dim] == ".":
+                axes_attr[dim] = ax
+
+        self.nxdata.attrs["signal"] = signal
+        self.nxdata.attrs["axes"] = axes_attr
+
+        self._frames = {}
+        self._axis_values = {ax: {} for ax in self.axes}
+        self._timer = _FlushTimer(self.flush, flush_interval)
+
+    def append(self, data, slice_metadata, axis_values=None):
+        """
+        Buffer the frame and axis values for one point, writing if a batch is due
+
+            Parameters:
+                data (numpy array): frame, or scalar, at this point of the scan
+                slice_metadata (tuple): slices describing the position in the scan
+                axis_values (dict): axis names to their values at this point
+
+        """
+        pos = tuple(s.start for s in slice_metadata[: self.scan_rank])
+
+        with self._timer.lock:
+            self._frames[pos] = np.asarray(data)
+
+            if axis_values is not None:
+                for ax, value in axis_values.items():
+                    self._axis_values[ax][pos[self.axis_dims[ax]]] = value
+
+            due = self._timer.buffered()
+            if due or len(self._frames) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """Write all buffered values and flush them for SWMR readers"""
+        with self._timer.lock:
+            self._timer.written()
+            self._flush()
+
+    def _flush(self):
+        if not self._frames and not any(self._axis_values.values()):
+            return
+
+        self._write_frames()
+
+        for ax, values in self._axis_values.items():
+            if values:
+                _write_runs(self.axes[ax], values)
+                self._axis_values[ax] = {}
+
+        if getattr(self.data.file, "swmr_mode", False):
+            self.data.flush()
+            for ds in self.axes.values():
+                ds.flush()
+
+    def _write_frames(self):
+        if not self._frames:
+            return
+
+        positions = np.array(list(self._frames.keys()))
+        extent = positions.max(axis=0) + 1
+        shape = self.data.shape
+        new_shape = tuple(max(int(e), s) for e, s in zip(extent, shape))
+
+        if new_shape != shape[: self.scan_rank]:
+            self.data.resize(new_shape + self.frame_shape)
+
+        # write runs of consecutive points along the fast axis as one block
+        items = sorted(self._frames.items())
+        run = [items[0]]
+        for item in items[1:]:
+            pos, last = item[0], run[-1][0]
+            if pos[:-1] == last[:-1] and pos[-1] == last[-1] + 1:
+                run.append(item)
+                continue
+            self._write_run(run)
+            run = [item]
+
+        self._write_run(run)
+        self._frames = {}
+
+    def _write_run(self, run):
+        start = run[0][0]
+        sel = [slice(p, p + 1) for p in start[:-1]]
+        sel.append(slice(start[-1], start[-1] + len(run)))
+        block = np.stack([np.reshape(d, self.frame_shape) for _, d in run])
+        self.data[tuple(sel)] = block.reshape((1,) * (self.scan_rank - 1) + block.shape)
+
+    def close(self):
+        """Write any buffered values"""
+        self._timer.close()
+        self.flush()
+
+
+def _write_runs(dataset, values):
+    indices = sorted(values)
+    size = indices[-1] + 1
+    if size > dataset.shape[0]:
+        dataset.resize((size,))
+
+    start = 0
+    for i in range(1, len(indices) + 1):
+        if i == len(indices) or indices[i] != indices[i - 1] + 1:
+            block = [values[j] for j in indices[start:i]]
+            dataset[indices[start] : indices[i - 1] + 1] = block
+            start = i
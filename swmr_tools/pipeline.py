@@ -0,0 +1,408 @@
+from concurrent.futures import ProcessPoolExecutor
+import queue
+import threading
+import time
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+# how often threads blocked on a queue check whether the pipeline has stopped
+_POLL = 0.1
+
+
+class Pipeline:
+    """Streams the items of a DataSource or ChunkSource through a chain of
+    processing stages, each running on its own threads or processes.
+
+    The source is read on a dedicated thread and each stage takes items from
+    a bounded queue, calls its function on them and puts the results on the
+    queue of the next stage, so a slow stage holds back the stages before it
+    (backpressure) rather than items piling up in memory. A stage function
+    returning None drops the item. When the source stops, at the end of the
+    scan or on its timeout, the end is passed through every stage once the
+    items before it are processed, and is_scan_finished and has_timed_out
+    report why the source stopped.
+
+    Iterating the pipeline starts it and returns the results of the last
+    stage. Each stage records its throughput, the time its workers are busy
+    or blocked on a full queue, and the depth of its input queue, see metrics.
+    If a stage fails, the pipeline stops and iteration raises RuntimeError.
+
+    Parameters
+    ----------
+
+    source: iterable
+        A DataSource, ChunkSource or any other iterable of items.
+
+    max_queue: int (optional)
+        Default size of the queue in front of each stage and of the output
+        queue. Defaults to 16.
+
+    Examples
+    --------
+
+    >>> df = DataSource(keys, {"data": f["data"]}, finished_dataset=finished)
+    >>> pipeline = Pipeline(df)
+    >>> pipeline.add_stage(correct, workers=4)
+    >>> pipeline.add_stage(lambda d: acc.update(d["data"]), name="reduce")
+    >>> pipeline.run()
+    >>> print(pipeline.bottleneck(), pipeline.metrics())
+
+    """
+
+    def __init__(self, source, max_queue=16):
+        self.source = source
+        self.max_queue = max_queue
+        self._stages = []
+        self._threads = []
+        self._output = None
+        self._stop = threading.Event()
+        self._error = None
+        self._started = False
+        self._start_time = None
+        self._source_stats = _Stats(1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add_stage(
+        self, func, name=None, workers=1, processes=False, ordered=True, max_queue=None
+    ):
+        """
+        Add a processing stage after the last one
+
+            Parameters:
+                func (callable): called with each item, returns the item passed on, or None to drop it
+                name (str): name of the stage in the metrics, defaults to the name of func
+                workers (int): number of threads, or processes, calling func concurrently
+                processes (bool): call func in worker processes, func and the items must be picklable
+                ordered (bool): pass items on in the order they arrived rather than as they complete
+                max_queue (int): size of the input queue of the stage, defaults to the pipeline max_queue
+
+            Returns:
+                pipeline (Pipeline): this pipeline, so calls can be chained
+
+        """
+        if self._started:
+            raise RuntimeError("Stages cannot be added to a running pipeline")
+
+        if workers < 1:
+            raise RuntimeError(f"Stage needs at least one worker, not {workers}")
+
+        if name is None:
+            name = getattr(func, "__name__", "stage")
+            if name == "<lambda>":
+                name = "stage"
+
+        names = {"source"} | {s.name for s in self._stages}
+        if name in names:
+            name = f"{name}_{len(self._stages)}"
+
+        size = self.max_queue if max_queue is None else max_queue
+        self._stages.append(_Stage(func, name, workers, processes, ordered, size))
+        return self
+
+    def start(self):
+        """Start reading the source and processing items in the background"""
+        if self._started:
+            return
+
+        self._started = True
+        self._start_time = time.perf_counter()
+        self._output = queue.Queue(maxsize=self.max_queue)
+
+        for stage, after in zip(self._stages, self._stages[1:] + [None]):
+            stage.output = self._output if after is None else after.input
+
+        first = self._stages[0].input if self._stages else self._output
+        self._spawn(self._read_source, first)
+
+        for stage in self._stages:
+            if stage.processes:
+                stage.executor = ProcessPoolExecutor(max_workers=stage.workers)
+            for _ in range(stage.workers):
+                self._spawn(self._work, stage)
+
+    def __iter__(self):
+        self.start()
+
+        try:
+            while True:
+                item = self._get(self._output)
+                if item is None or item is _END:
+                    break
+                yield item[1]
+        finally:
+            self.close()
+
+        self._check_error()
+
+    def run(self, sink=None):
+        """
+        Run the pipeline until the source stops
+
+            Parameters:
+                sink (callable): called with each result of the last stage
+
+            Returns:
+                count (int): number of results of the last stage
+
+        """
+        count = 0
+        for item in self:
+            if sink is not None:
+                sink(item)
+            count += 1
+
+        return count
+
+    def close(self):
+        """Stop the pipeline, waiting for its threads and worker processes to exit"""
+        self._stop.set()
+
+        for t in self._threads:
+            t.join()
+
+        for stage in self._stages:
+            if stage.executor is not None:
+                # the workers wait for each task they submit, so once they
+                # have exited there is nothing pending to cancel
+                stage.executor.shutdown()
+                stage.executor = None
+
+    def is_scan_finished(self):
+        is_finished = getattr(self.source, "is_scan_finished", None)
+        return bool(is_finished()) if is_finished is not None else False
+
+    def has_timed_out(self):
+        timed_out = getattr(self.source, "has_timed_out", None)
+        return bool(timed_out()) if timed_out is not None else False
+
+    def metrics(self):
+        """
+        Returns the metrics of the source and of each stage
+
+            Returns:
+                metrics (dict): stage name ("source" for the source) to a dict of
+                items taken, items dropped, busy and blocked seconds, throughput
+                (items per second), utilisation (fraction of the time its workers
+                were busy), and the current and maximum depth of its input queue
+
+        """
+        now = time.perf_counter()
+        out = {"source": self._source_stats.summary(self._start_time, now)}
+        out["source"]["queue_depth"] = 0
+
+        for stage in self._stages:
+            m = stage.stats.summary(self._start_time, now)
+            m["queue_depth"] = stage.input.qsize()
+            out[stage.name] = m
+
+        return out
+
+    def bottleneck(self):
+        """
+        Returns the name of the stage limiting the throughput, the one whose
+        workers were busy for the largest fraction of the time ("source" if
+        the pipeline is waiting on the data)
+        """
+        metrics = self.metrics()
+        return max(metrics, key=lambda name: metrics[name]["utilisation"])
+
+    def _spawn(self, target, *args):
+        t = threading.Thread(target=target, args=args, daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def _check_error(self):
+        if self._error is not None:
+            name, e = self._error
+            raise RuntimeError(f"Pipeline stage {name} failed") from e
+
+    def _fail(self, name, e):
+        logger.error(f"Pipeline stage {name} failed " + str(e))
+        if self._error is None:
+            self._error = (name, e)
+        self._stop.set()
+
+    def _get(self, q):
+        # returns None if the pipeline is stopped while waiting
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=_POLL)
+            except queue.Empty:
+                pass
+        return None
+
+    def _put(self, q, item, stats):
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=_POLL)
+                break
+            except queue.Full:
+                pass
+
+        stats.add_blocked(time.perf_counter() - start)
+        return not self._stop.is_set()
+
+    def _read_source(self, first):
+        stats = self._source_stats
+        iterator = iter(self.source)
+        seq = 0
+
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            except Exception as e:
+                self._fail("source", e)
+                return
+
+            stats.add_busy(time.perf_counter() - start)
+            stats.add_item()
+            if not self._put(first, (seq, item), stats):
+                return
+            seq += 1
+
+        stats.end()
+        self._put(first, _END, stats)
+
+    def _work(self, stage):
+        while True:
+            item = self._get(stage.input)
+            if item is None:
+                return
+
+            if item is _END:
+                # put back for the other workers of the stage
+                stage.input.put(_END)
+                break
+
+            # depth when the item was waiting, including the item itself
+            stage.stats.add_depth(stage.input.qsize() + 1)
+
+            seq, value = item
+            start = time.perf_counter()
+            try:
+                if stage.executor is not None:
+                    result = stage.executor.submit(stage.func, value).result()
+                else:
+                    result = stage.func(value)
+            except Exception as e:
+                self._fail(stage.name, e)
+                return
+
+            stage.stats.add_busy(time.perf_counter() - start)
+            stage.stats.add_item(dropped=result is None)
+            if not stage.emit(seq, result, self._put):
+                return
+
+        # the last worker to finish passes the end on
+        if stage.worker_done():
+            stage.stats.end()
+            self._put(stage.output, _END, stage.stats)
+
+
+class _Stage:
+    def __init__(self, func, name, workers, processes, ordered, max_queue):
+        self.func = func
+        self.name = name
+        self.workers = workers
+        self.processes = processes
+        self.ordered = ordered
+        self.input = queue.Queue(maxsize=max_queue)
+        self.output = None
+        self.executor = None
+        self.stats = _Stats(workers)
+        self._lock = threading.Lock()
+        self._done = {}
+        self._next = 0
+        self._out = 0
+        self._finished_workers = 0
+
+    def emit(self, seq, result, put):
+        # items leave numbered 0, 1, 2... whatever was dropped, so the next
+        # stage can keep their order. The lock is held while putting, so a
+        # full output queue blocks the other workers too
+        with self._lock:
+            if not self.ordered:
+                return self._put_result(result, put)
+
+            self._done[seq] = result
+            while self._next in self._done:
+                r = self._done.pop(self._next)
+                self._next += 1
+                if not self._put_result(r, put):
+                    return False
+
+            return True
+
+    def _put_result(self, result, put):
+        if result is None:
+            return True
+
+        self._out += 1
+        return put(self.output, (self._out - 1, result), self.stats)
+
+    def worker_done(self):
+        with self._lock:
+            self._finished_workers += 1
+            return self._finished_workers == self.workers
+
+
+class _Stats:
+    def __init__(self, workers):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self.items = 0
+        self.dropped = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.queue_max = 0
+        self.end_time = None
+
+    def add_item(self, dropped=False):
+        with self._lock:
+            self.items += 1
+            self.dropped += int(dropped)
+
+    def add_busy(self, seconds):
+        with self._lock:
+            self.busy += seconds
+
+    def add_blocked(self, seconds):
+        with self._lock:
+            self.blocked += seconds
+
+    def add_depth(self, depth):
+        with self._lock:
+            self.queue_max = max(self.queue_max, depth)
+
+    def end(self):
+        self.end_time = time.perf_counter()
+
+    def summary(self, start, now):
+        with self._lock:
+            end = self.end_time if self.end_time is not None else now
+            elapsed = end - start if start is not None else 0.0
+            return {
+                "workers": self.workers,
+                "items": self.items,
+                "dropped": self.dropped,
+                "busy": self.busy,
+                "blocked": self.blocked,
+                "throughput": self.items / elapsed if elapsed > 0 else 0.0,
+                "utilisation": (
+                    self.busy / (elapsed * self.workers) if elapsed > 0 else 0.0
+                ),
+                "queue_max": self.queue_max,
+            }
@@ -0,0 +1,127 @@
+import os
+import threading
+
+from .mmapreader import _ChunkLocations, _in_one_file
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RawChunkReader:
+    """Reads the raw (still compressed) bytes of chunks straight from the
+    file with os.pread, at the byte offsets from the HDF5 chunk index.
+
+    Reads through h5py hold its global lock, so threads reading chunks
+    take turns. os.pread releases the GIL and needs no lock, so chunks can be
+    fetched, and then decompressed, by many threads at once, which is needed
+    to keep fast local disks and parallel file systems busy from one
+    process. Chunk locations come from the HDF5 chunk index and are cached
+    (see MappedChunkReader). Call refresh after refreshing the dataset: the
+    cached locations of the chunks not yet read are checked again on the
+    next read, and the chunks found to have moved are counted in relocated.
+
+    read_chunk returns None whenever a chunk cannot be read this way - chunks
+    not yet written, virtual or external datasets, files with a user block
+    or not in a single file - and the caller reads it with h5py instead.
+    available is False if no chunk of the dataset can be read.
+
+    Parameters
+    ----------
+
+    dataset: h5py Dataset
+        A chunked dataset.
+
+    keep: callable (optional)
+        Called with a chunk offset, returns False for chunks that will not be
+        read, which are then left out of the cached chunk locations.
+
+    Examples
+    --------
+
+    >>> reader = RawChunkReader(f["data"])
+    >>> raw = reader.read_chunk((0, 0, 0))
+    >>> if raw is None:
+    >>>     raw = f["data"].id.read_direct_chunk((0, 0, 0))
+    >>> filter_mask, blob = raw
+
+    """
+
+    def __init__(self, dataset, keep=None):
+        self.dataset = dataset
+        self.dsid = dataset.id
+        self.chunks = dataset.chunks
+        self.available = _in_one_file(dataset)
+        self.raw_reads = 0
+        self.fallback_reads = 0
+        self._fd = None
+        self._lock = threading.Lock()
+        self._locations = _ChunkLocations(self.dsid, keep)
+
+        if self.available:
+            self.path = dataset.file.filename
+
+    @property
+    def relocated(self):
+        return self._locations.relocated
+
+    def read_chunk(self, chunk_offset, consume=False):
+        """
+        Returns the stored bytes of the chunk at chunk_offset
+
+            Parameters:
+                chunk_offset (tuple): offset of the first element of the chunk in the dataset
+                consume (bool): drop the cached location, the chunk will not be read again
+
+            Returns:
+                raw (tuple): filter mask and bytes, as from read_direct_chunk, or None if the chunk must be read with h5py
+
+        """
+        raw = self._read(chunk_offset, consume) if self.available else None
+
+        # counted under the lock, reads run on many threads
+        with self._lock:
+            if raw is None:
+                self.fallback_reads += 1
+            else:
+                self.raw_reads += 1
+
+        return raw
+
+    def _read(self, chunk_offset, consume):
+        location = self._locations.locate(chunk_offset, consume)
+
+        if location is None:
+            return None
+
+        byte_offset, size, filter_mask = location
+        blob = os.pread(self._file(), size, byte_offset)
+
+        if len(blob) != size:
+            # past the end of the file as this process sees it
+            return None
+
+        return filter_mask, blob
+
+    def _file(self):
+        if self._fd is None:
+            with self._lock:
+                if self._fd is None:
+                    self._fd = os.open(self.path, os.O_RDONLY)
+
+        return self._fd
+
+    def forget(self, chunk_offset):
+        """Drop the cached location of a chunk whose bytes could not be decoded"""
+        self._locations.forget(chunk_offset)
+
+    def refresh(self):
+        """Check the cached chunk locations again, call after refreshing the dataset"""
+        self._locations.mark_stale()
+
+    def close(self):
+        """Close the file descriptor, it is opened again by the next read"""
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
@@ -0,0 +1,190 @@
+from .chunksource import ChunkSource
+from .chunk_utils import ChunkWriter, get_slice_structure
+from concurrent.futures import ThreadPoolExecutor
+import math
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkRemapper:
+    """Streams stacks of frames, written chunk by chunk during a fly scan,
+    into grid shaped output datasets as the chunks are written.
+
+    Each item of a ChunkSource over the input stacks is placed into the grid
+    with the slice structure of its chunk, using the previous chunk of each
+    dataset for pieces that span two chunks. The output datasets are created
+    in the output group with the scan shape followed by the frame shape, and
+    chunked one point deep with up to a chunk of points along the fast scan
+    axis, so that chunk aligned pieces are written with direct chunk writes.
+
+    Parameters
+    ----------
+
+    datasets: dict
+        A dictionary of names to stack datasets, chunked along the first
+        dimension only, to remap.
+
+    output: h5py group
+        Group (or file) in which an output dataset of the same name is created
+        for each input dataset.
+
+    scan_shape: list
+        The shape of the scan, its product the number of frames in a stack.
+
+    snake: bool (optional)
+        Set if alternate rows of the scan run in the opposite direction.
+
+    timeout: int (optional)
+        The maximum time allowed for a chunk to be written before iteration
+        is halted. Defaults to 10 seconds.
+
+    finished_dataset: dataset (optional)
+        A scalar hdf5 dataset which is non-zero when the file is complete.
+
+    read_ahead: int (optional)
+        Number of chunks to read ahead in the ChunkSource.
+
+    max_workers: int (optional)
+        Number of threads used to remap the datasets of a chunk in parallel.
+        If not set the datasets are written on the calling thread.
+
+    dataset_options: dict (optional)
+        Extra keyword arguments, such as compression, passed to create_dataset
+        for every output dataset.
+
+    Examples
+    --------
+
+    >>> with h5py.File("in.h5", "r", libver="latest", swmr=True) as f:
+    >>>     with h5py.File("out.h5", "w") as o:
+    >>>         remapper = ChunkRemapper({"data": f["data"]}, o, [10, 20])
+    >>>         remapper.run()
+
+    """
+
+    def __init__(
+        self,
+        datasets,
+        output,
+        scan_shape,
+        snake=False,
+        timeout=10,
+        finished_dataset=None,
+        read_ahead=0,
+        max_workers=None,
+        dataset_options=None,
+    ):
+        self.scan_shape = [int(s) for s in scan_shape]
+        self.snake = snake
+        self.n_points = math.prod(self.scan_shape)
+        self.max_workers = max_workers
+        self.source = ChunkSource(
+            datasets,
+            timeout=timeout,
+            finished_dataset=finished_dataset,
+            read_ahead=read_ahead,
+        )
+        self.chunk_size = self.source.chunk_size
+
+        if any(n != 1 for n in self.source.grid_shape[1:]):
+            raise RuntimeError(
+                "Datasets must be chunked along the first dimension only"
+            )
+
+        options = {} if dataset_options is None else dataset_options
+        self.outputs = {}
+        self._writers = {}
+        self._last = {}
+
+        for name, ds in datasets.items():
+            frame_shape = tuple(ds.shape[1:])
+            chunks = [1] * len(self.scan_shape)
+            chunks[-1] = min(self.chunk_size, self.scan_shape[-1])
+
+            self.outputs[name] = output.create_dataset(
+                name,
+                shape=tuple(self.scan_shape) + frame_shape,
+                dtype=ds.dtype,
+                chunks=tuple(chunks) + frame_shape,
+                **options,
+            )
+            self._writers[name] = ChunkWriter()
+            self._last[name] = None
+
+        self._index = 0
+        self._executor = None
+        if max_workers is not None and len(datasets) > 1:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._index >= self.n_points:
+            # the grid is full, do not wait for chunks past the end of the scan
+            self.close()
+            raise StopIteration
+
+        try:
+            chunk = next(self.source)
+        except StopIteration:
+            self.close()
+            raise
+
+        self.remap(chunk)
+        self._index = chunk.index + self.chunk_size
+        return chunk
+
+    def run(self):
+        """
+        Remap chunks until the source stops
+
+            Returns:
+                n_chunks (int): the number of chunks remapped
+
+        """
+        count = 0
+        for _ in self:
+            count += 1
+
+        return count
+
+    def remap(self, chunk):
+        """
+        Place every dataset of a ChunkSource item into the output grids
+
+            Parameters:
+                chunk (SliceDict): item from a ChunkSource over the datasets
+
+        """
+        ss = get_slice_structure(
+            chunk.index, self.chunk_size, self.scan_shape, self.snake
+        )
+
+        if self._executor is None:
+            for name in self.outputs:
+                self._remap_dataset(name, ss, chunk[name])
+            return
+
+        futures = [
+            self._executor.submit(self._remap_dataset, name, ss, chunk[name])
+            for name in self.outputs
+        ]
+
+        for f in futures:
+            f.result()
+
+    def _remap_dataset(self, name, ss, data):
+        # the previous chunk is needed for pieces spanning two chunks
+        self._writers[name].write(ss, data, self._last[name], self.outputs[name])
+        self._last[name] = data
+
+    def close(self):
+        """Stop the worker threads and the source"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+        self.source.close()
@@ -0,0 +1,304 @@
+from .utils import compression_options, get_position, get_position_snake
+import h5py
+import math
+import multiprocessing as mp
+import numpy as np
+import os
+import time
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SyntheticWriter:
+    """Synthetic detector writing frames, keys and a finished flag to an HDF5
+    file in SWMR mode at a target rate, as a local stand-in for a real
+    detector when testing or benchmarking readers.
+
+    Frames are written in acquisition order into datasets pre-allocated to
+    the scan shape, a whole chunk at a time, and the key of each point is set
+    (to its index plus one) after its frame is flushed. With more than one
+    writer, each writer process writes every n-th frame of a stack to its own
+    file, and the main file holds virtual "data" and "key" datasets
+    interleaving them, as written by multi-process detectors.
+
+    The frame at index i is synthetic_frame(i, frame_shape, dtype, seed), so
+    readers can check what they read.
+
+    Parameters
+    ----------
+
+    path: str
+        Path of the main file. Interleaved writers write to files named
+        after it with a _NN suffix.
+
+    scan_shape: tuple (optional)
+        Shape of the scan. Defaults to (100,).
+
+    frame_shape: tuple (optional)
+        Shape of each frame. Defaults to (64, 64).
+
+    dtype: numpy dtype (optional)
+        Data type of the frames. Defaults to uint16.
+
+    rate: float (optional)
+        Target frame rate in Hz, None to write as fast as possible. Defaults
+        to 100.
+
+    frames_per_chunk: int (optional)
+        Number of frames in a chunk, along the last scan dimension. Defaults
+        to 1.
+
+    codec: str (optional)
+        Compression preset from utils.compression_options, or None for
+        uncompressed chunks.
+
+    snake: bool (optional)
+        Reverse alternate rows of a grid scan.
+
+    n_writers: int (optional)
+        Number of interleaved writer processes (stacks only). Defaults to 1.
+
+    flush_every: int (optional)
+        Number of chunks written between flushes, to mimic late flushes.
+        Defaults to 1.
+
+    stalls: dict (optional)
+        Frame index to a time in seconds the writer stalls before writing it.
+
+    seed: int (optional)
+        Seed of the random pattern in each frame.
+
+    start_time: float (optional)
+        Wall clock time (time.time()) the scan is paced from, so frame i is
+        due at start_time + (i + 1) / rate. Defaults to the time run is called.
+
+    Examples
+    --------
+
+    >>> writer = SyntheticWriter("/tmp/scan.h5", (1000,), (256, 256), rate=500,
+    >>>                          frames_per_chunk=4, codec="blosc-lz4")
+    >>> p = writer.start()
+    >>> # follow "/tmp/scan.h5" with a DataSource or ChunkSource
+    >>> p.join()
+
+    """
+
+    def __init__(
+        self,
+        path,
+        scan_shape=(100,),
+        frame_shape=(64, 64),
+        dtype=np.uint16,
+        rate=100.0,
+        frames_per_chunk=1,
+        codec=None,
+        snake=False,
+        n_writers=1,
+        flush_every=1,
+        stalls=None,
+        seed=0,
+        start_time=None,
+    ):
+        if n_writers > 1 and len(scan_shape) > 1:
+            raise RuntimeError("Interleaved writers only support stacks")
+
+        self.path = path
+        self.scan_shape = tuple(scan_shape)
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.rate = rate
+        self.frames_per_chunk = frames_per_chunk
+        self.codec = codec
+        self.snake = snake
+        self.n_writers = n_writers
+        self.flush_every = flush_every
+        self.stalls = {} if stalls is None else stalls
+        self.seed = seed
+        self.start_time = start_time
+        self.n_points = math.prod(self.scan_shape)
+
+    def writer_paths(self):
+        """Returns the paths of the files the frames are written to"""
+        if self.n_writers == 1:
+            return [self.path]
+
+        stem, ext = os.path.splitext(self.path)
+        return [f"{stem}_{w:02d}{ext}" for w in range(self.n_writers)]
+
+    def start(self):
+        """
+        Run the writer in a separate process
+
+            Returns:
+                process (multiprocessing Process): the running writer, join to wait for it
+
+        """
+        p = mp.Process(target=self.run)
+        p.start()
+        return p
+
+    def run(self):
+        """Write the whole scan, returning when the finished flag is set"""
+        start = time.time() if self.start_time is None else self.start_time
+
+        if self.n_writers == 1:
+            with h5py.File(self.path, "w", libver="latest") as fh:
+                data, key = self._create_datasets(fh, self.scan_shape)
+                finished = _create_finished(fh)
+                fh.swmr_mode = True
+                self._write(data, key, start, list(range(self.n_points)))
+                _set_finished(finished)
+            return
+
+        with h5py.File(self.path, "w", libver="latest") as fh:
+            self._create_virtual(fh)
+            finished = _create_finished(fh)
+            fh.swmr_mode = True
+
+            writers = []
+            for w, path in enumerate(self.writer_paths()):
+                p = mp.Process(target=self._run_interleaved, args=(w, path, start))
+                p.start()
+                writers.append(p)
+
+            for p in writers:
+                p.join()
+
+            _set_finished(finished)
+
+    def _run_interleaved(self, w, path, start):
+        indices = list(range(w, self.n_points, self.n_writers))
+
+        with h5py.File(path, "w", libver="latest") as fh:
+            data, key = self._create_datasets(fh, (len(indices),))
+            fh.swmr_mode = True
+            self._write(data, key, start, indices)
+
+    def _create_datasets(self, fh, scan_shape):
+        chunks = [1] * len(scan_shape)
+        chunks[-1] = min(self.frames_per_chunk, scan_shape[-1])
+        options = {} if self.codec is None else compression_options(self.codec)
+
+        data = fh.create_dataset(
+            "data",
+            shape=scan_shape + self.frame_shape,
+            dtype=self.dtype,
+            chunks=tuple(chunks) + self.frame_shape,
+            **options,
+        )
+        key = fh.create_dataset(
+            "key", shape=scan_shape, dtype=np.int32, chunks=tuple(chunks)
+        )
+        return data, key
+
+    def _create_virtual(self, fh):
+        n = self.n_writers
+        shape = (self.n_points,)
+        data_layout = h5py.VirtualLayout(
+            shape=shape + self.frame_shape, dtype=self.dtype
+        )
+        key_layout = h5py.VirtualLayout(shape=shape, dtype=np.int32)
+
+        for w, path in enumerate(self.writer_paths()):
+            nw = len(range(w, self.n_points, n))
+            name = os.path.basename(path)
+            data_layout[w::n] = h5py.VirtualSource(
+                name, "data", shape=(nw,) + self.frame_shape
+            )
+            key_layout[w::n] = h5py.VirtualSource(name, "key", shape=(nw,))
+
+        fh.create_virtual_dataset("data", data_layout, fillvalue=0)
+        fh.create_virtual_dataset("key", key_layout, fillvalue=0)
+
+    def _write(self, data, key, start, indices):
+        # frames of a chunk are buffered until the chunk is complete
+        local_shape = data.shape[: data.ndim - len(self.frame_shape)]
+        lead = (1,) * (len(local_shape) - 1)
+        n = self.frames_per_chunk
+        pattern = _pattern(self.frame_shape, self.seed)
+        buffers = {}
+        pending = []
+
+        for local, index in enumerate(indices):
+            if index in self.stalls:
+                _flush(data, key, pending)
+                time.sleep(self.stalls[index])
+
+            if self.rate is not None:
+                delay = start + (index + 1) / self.rate - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+            if self.snake and len(local_shape) > 1:
+                pos = get_position_snake(local, local_shape, len(local_shape))
+            else:
+                pos = get_position(local, local_shape, len(local_shape))
+
+            c = pos[-1] // n
+            size = min(n, local_shape[-1] - c * n)
+            chunk_key = tuple(pos[:-1]) + (c,)
+
+            if chunk_key not in buffers:
+                frames = np.empty((size,) + self.frame_shape, dtype=self.dtype)
+                buffers[chunk_key] = [frames, np.empty((size,), dtype=np.int32), 0]
+
+            buf = buffers[chunk_key]
+            offset = pos[-1] - c * n
+            buf[0][offset] = pattern + index
+            buf[1][offset] = index + 1
+            buf[2] += 1
+
+            if buf[2] < size:
+                continue
+
+            del buffers[chunk_key]
+            sel = tuple(slice(p, p + 1) for p in pos[:-1])
+            sel += (slice(c * n, c * n + size),)
+            data[sel] = buf[0].reshape(lead + buf[0].shape)
+            pending.append((sel, buf[1].reshape(lead + buf[1].shape)))
+
+            if len(pending) >= self.flush_every:
+                _flush(data, key, pending)
+
+        _flush(data, key, pending)
+
+
+def synthetic_frame(index, frame_shape, dtype=np.uint16, seed=0):
+    """
+    Returns the frame a SyntheticWriter writes at index
+
+        Parameters:
+            index (int): Flattened index of scan point
+            frame_shape (tuple): Shape of the frame
+            dtype (numpy dtype): Data type of the frame
+            seed (int): Seed of the random pattern
+
+        Returns:
+            frame (numpy array): a fixed noise pattern plus the index
+
+    """
+    return (_pattern(frame_shape, seed) + index).astype(dtype)
+
+
+def _pattern(frame_shape, seed):
+    return np.random.default_rng(seed).integers(0, 16, size=frame_shape)
+
+
+def _flush(data, key, pending):
+    # keys are only set once the frames they point to are visible
+    data.flush()
+    for sel, values in pending:
+        key[sel] = values
+    key.flush()
+    pending.clear()
+
+
+def _create_finished(fh):
+    return fh.create_dataset("finished", data=np.zeros((1,)), maxshape=(1,))
+
+
+def _set_finished(finished):
+    finished[0] = 1
+    finished.flush()
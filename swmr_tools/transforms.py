@@ -0,0 +1,153 @@
+import numpy as np
+
+
+class FrameTransform:
+    """Reduction applied to data frames as they are read: crop, then bin,
+    then convert the data type.
+
+    The transform acts on the frame dimensions, the trailing frame_rank
+    dimensions of the data it is given, so it can be applied equally to a
+    single frame from a DataSource or a stack of frames from a ChunkSource.
+
+    Parameters
+    ----------
+
+    bin: int or tuple (optional)
+        Bin size for each frame dimension, or a single int used for all of
+        them. Trailing pixels that do not fill a whole bin are dropped.
+
+    crop: tuple (optional)
+        Tuple of slices, one per frame dimension, selecting the region of the
+        frame to keep. Applied before binning.
+
+    dtype: numpy dtype (optional)
+        Data type of the output. Conversion to an integer type clips values to
+        the range of that type rather than wrapping.
+
+    reduce: str (optional)
+        How pixels in a bin are combined, "sum" (default) or "mean".
+
+    Examples
+    --------
+
+    >>> t = FrameTransform(bin=4, dtype=np.uint16)
+    >>> df = DataSource(keys, {"data": f["data"]}, transforms={"data": t})
+
+    """
+
+    reductions = ("sum", "mean")
+
+    def __init__(self, bin=None, crop=None, dtype=None, reduce="sum"):
+        if reduce not in FrameTransform.reductions:
+            raise RuntimeError(f"{reduce} not in {FrameTransform.reductions}")
+
+        self.bin = bin
+        self.crop = crop
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        self.reduce = reduce
+
+    @property
+    def frame_rank(self):
+        """Number of frame dimensions given by the crop or bin, None if either fits any"""
+        if self.crop is not None:
+            return len(self.crop)
+
+        if self.bin is not None and not np.isscalar(self.bin):
+            return len(self.bin)
+
+        return None
+
+    def crop_slices(self, frame_rank):
+        """Returns the crop as a tuple of frame_rank slices"""
+        if self.crop is None:
+            return (slice(None),) * frame_rank
+
+        if len(self.crop) != frame_rank:
+            raise RuntimeError(
+                f"Crop {self.crop} does not match frame rank {frame_rank}"
+            )
+
+        return tuple(self.crop)
+
+    def bin_sizes(self, frame_rank):
+        """Returns the bin size for each of the frame_rank dimensions"""
+        if self.bin is None:
+            return (1,) * frame_rank
+
+        if np.isscalar(self.bin):
+            return (int(self.bin),) * frame_rank
+
+        if len(self.bin) != frame_rank:
+            raise RuntimeError(f"Bin {self.bin} does not match frame rank {frame_rank}")
+
+        return tuple(self.bin)
+
+    def output_shape(self, frame_shape):
+        """Returns the shape of a frame of shape frame_shape after the transform"""
+        rank = len(frame_shape)
+        crop = self.crop_slices(rank)
+        bins = self.bin_sizes(rank)
+        cropped = [len(range(*c.indices(s))) for c, s in zip(crop, frame_shape)]
+        return tuple(s // b for s, b in zip(cropped, bins))
+
+    def apply(self, data, frame_rank, cropped=False):
+        """
+        Apply the transform to the trailing frame_rank dimensions of data
+
+            Parameters:
+                data (numpy array): Frame, or stack of frames, to transform
+                frame_rank (int): Number of trailing dimensions forming the frame
+                cropped (boolean): Set if the crop has already been applied when reading
+
+            Returns:
+                data (numpy array): The transformed data, a view of the input if only cropping
+
+        """
+        lead = data.ndim - frame_rank
+
+        if not cropped and self.crop is not None:
+            data = data[(slice(None),) * lead + self.crop_slices(frame_rank)]
+
+        if self.bin is not None:
+            data = self._bin(data, lead, self.bin_sizes(frame_rank))
+
+        if self.dtype is not None and data.dtype != self.dtype:
+            data = self._convert(data)
+
+        return data
+
+    def _bin(self, data, lead, bins):
+        frame_shape = data.shape[lead:]
+        trim = tuple(slice(0, (s // b) * b) for s, b in zip(frame_shape, bins))
+        data = data[(slice(None),) * lead + trim]
+
+        # split each frame axis into (n_bins, bin) and reduce over the bin axes
+        split = list(data.shape[:lead])
+        for s, b in zip(frame_shape, bins):
+            split += [s // b, b]
+
+        axes = tuple(range(lead + 1, lead + 2 * len(bins), 2))
+        data = data.reshape(split)
+
+        if self.reduce == "mean":
+            return data.mean(axis=axes)
+
+        acc = None
+        if np.issubdtype(data.dtype, np.integer):
+            # widen so sums of large bins do not overflow
+            acc = (
+                np.uint64 if np.issubdtype(data.dtype, np.unsignedinteger) else np.int64
+            )
+
+        return data.sum(axis=axes, dtype=acc)
+
+    def _convert(self, data):
+        if np.issubdtype(self.dtype, np.integer):
+            lo, hi = np.iinfo(self.dtype).min, np.iinfo(self.dtype).max
+            if np.issubdtype(data.dtype, np.integer):
+                # keep the bounds representable in the source type
+                lo = max(lo, np.iinfo(data.dtype).min)
+                hi = min(hi, np.iinfo(data.dtype).max)
+            data = np.clip(data, lo, hi)
+
+        return data.astype(self.dtype, copy=False)
@@ -1,6 +1,11 @@
 import numpy as np
-import h5py
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import importlib
 import logging
+import math
+import os
+import random
+import threading
 import time
 
 logger = logging.getLogger(__name__)
@@ -127,7 +132,359 @@ def get_row_slice(index, shape, scan_rank):
     return tuple(slices[:scan_rank])
 
 
-def create_dataset(data, scan_maxshape, fh, path, **kwargs):
+def get_positions(indices, shape, scan_rank):
+    """
+    Returns the positions in the scan associated with an array of indices
+
+        Parameters:
+            indices (array): Flattened indices of scan points
+            shape (array): Shape of dataset of interest
+            scan_rank (int): Rank of scan (must be <= len(shape))
+
+        Returns:
+            positions (numpy array): integer array of shape (len(indices), scan_rank)
+    Examples
+    --------
+
+    >>> utils.get_positions(np.arange(3), [3,4,5], 2)
+    array([[0, 0], [0, 1], [0, 2]])
+
+    """
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+    scan_shape = tuple(shape[:scan_rank])
+
+    return np.stack(np.unravel_index(indices, scan_shape), axis=-1)
+
+
+def get_positions_snake_row(indices, shape, scan_rank):
+    """
+    Returns the positions in a snake scan associated with an array of indices
+
+        Parameters:
+            indices (array): Flattened indices of scan points
+            shape (array): Shape of scan
+            scan_rank (int): Rank of scan (must be <= len(shape))
+
+        Returns:
+            position_info (tuple): integer array of shape (len(indices), scan_rank), boolean array showing if each fast row is reversed
+    Examples
+    --------
+
+    >>> utils.get_positions_snake_row(np.array([4, 5]), [3,4], 2)
+    (array([[1, 3], [1, 2]]), array([ True,  True]))
+
+    """
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+    scan_shape = np.asarray(shape[:scan_rank], dtype=np.int64)
+    positions = get_positions(indices, shape, scan_rank)
+
+    # dimension i is reversed on every odd line along it, where the line
+    # number is the index divided by the number of points in dimensions >= i
+    line_size = np.cumprod(scan_shape[::-1])[::-1][1:]
+    flip = (indices[:, None] // line_size) % 2 == 1
+    positions[:, 1:] = np.where(
+        flip, scan_shape[1:] - positions[:, 1:] - 1, positions[:, 1:]
+    )
+
+    if scan_rank > 1:
+        snake_row = flip[:, -1]
+    else:
+        snake_row = np.zeros(indices.shape, dtype=bool)
+
+    return positions, snake_row
+
+
+def get_positions_snake(indices, shape, scan_rank):
+    """
+    Returns the positions in a snake scan associated with an array of indices
+
+        Parameters:
+            indices (array): Flattened indices of scan points
+            shape (array): Shape of dataset of interest
+            scan_rank (int): Rank of scan (must be <= len(shape))
+
+        Returns:
+            positions (numpy array): integer array of shape (len(indices), scan_rank)
+    Examples
+    --------
+
+    >>> utils.get_positions_snake(np.array([4, 5]), [3,4], 2)
+    array([[1, 3], [1, 2]])
+
+    """
+    return get_positions_snake_row(indices, shape, scan_rank)[0]
+
+
+def get_row_positions(indices, shape, scan_rank):
+    """
+    Returns the positions of the rows containing an array of indices, the
+    vectorised form of get_row_slice
+
+        Parameters:
+            indices (array): Flattened indices of scan points
+            shape (array): Shape of dataset of interest
+            scan_rank (int): Rank of scan (must be <= len(shape))
+
+        Returns:
+            row_positions (numpy array): integer array of shape (len(indices), scan_rank - 1), the position of each row in the slow scan dimensions
+    Examples
+    --------
+
+    >>> utils.get_row_positions(np.array([3, 7]), [3,4,5], 2)
+    array([[0], [1]])
+
+    """
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+    row_shape = tuple(shape[: scan_rank - 1])
+    rows = indices // shape[scan_rank - 1]
+
+    if not row_shape:
+        return np.zeros((indices.shape[0], 0), dtype=np.int64)
+
+    return np.stack(np.unravel_index(rows, row_shape), axis=-1)
+
+
+def get_grid_indices(indices, scan_shape, snake=False):
+    """
+    Returns the flattened (raster) grid index that each stack index is placed at
+
+        Parameters:
+            indices (array): Flattened indices of scan points, in acquisition order
+            scan_shape (array): Shape of the scan
+            snake (boolean): Whether alternate rows are reversed
+
+        Returns:
+            grid_indices (numpy array): index into the flattened grid for each point
+    Examples
+    --------
+
+    >>> grid = np.empty([3, 4] + frame_shape)
+    >>> flat = grid.reshape((-1,) + frame_shape)
+    >>> flat[utils.get_grid_indices(np.arange(12), [3, 4], True)] = stack
+
+    """
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+
+    if not snake:
+        return indices
+
+    positions = get_positions_snake(indices, scan_shape, len(scan_shape))
+    return np.ravel_multi_index(tuple(positions.T), tuple(scan_shape))
+
+
+SHARD_ASSIGNMENTS = ("round_robin", "block")
+
+
+def get_shard_units(indices, scan_shape, scan_chunks=None, unit=1):
+    """
+    Returns the unit, the group of scan points assigned to a shard together,
+    of each index
+
+        Parameters:
+            indices (int or array): Flattened indices of scan points
+            scan_shape (array): Shape of the scan, the first dimension may be None (unlimited)
+            scan_chunks (array): Chunk shape along the scan dimensions, to group points by chunk
+            unit (int): Number of consecutive points (or chunks, if scan_chunks is set) in a unit
+
+        Returns:
+            units (int or numpy array): unit of each index
+    Examples
+    --------
+
+    >>> utils.get_shard_units(np.arange(6), [2, 3], [1, 2])
+    array([0, 0, 1, 2, 2, 3])
+
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+
+    if scan_chunks is None:
+        return indices // unit
+
+    # row-major chunk number, without needing the size of the first dimension
+    rest = indices
+    positions = []
+    for s in reversed(scan_shape[1:]):
+        rest, p = np.divmod(rest, s)
+        positions.append(p)
+    positions.append(rest)
+    positions.reverse()
+
+    chunk = positions[0] // scan_chunks[0]
+    for p, s, c in zip(positions[1:], scan_shape[1:], scan_chunks[1:]):
+        chunk = chunk * -(-s // c) + p // c
+
+    return chunk // unit
+
+
+def count_shard_units(scan_shape, scan_chunks=None, unit=1):
+    """
+    Returns the number of units in a scan, or None if its size is unlimited
+
+        Parameters:
+            scan_shape (array): Shape of the scan
+            scan_chunks (array): Chunk shape along the scan dimensions, as for get_shard_units
+            unit (int): Number of consecutive points (or chunks) in a unit
+
+        Returns:
+            n_units (int): number of units, None if any dimension is None
+
+    """
+    if any(s is None for s in scan_shape):
+        return None
+
+    if scan_chunks is None:
+        n = math.prod(scan_shape)
+    else:
+        n = math.prod(-(-s // c) for s, c in zip(scan_shape, scan_chunks))
+
+    return -(-n // unit)
+
+
+def get_shard(units, num_shards, assignment="round_robin", n_units=None):
+    """
+    Returns the shard that each unit of a scan is assigned to
+
+        Parameters:
+            units (int or array): Units, from get_shard_units
+            num_shards (int): Number of shards the scan is split into
+            assignment (str): "round_robin" deals the units out in turn, "block" gives each shard a contiguous range
+            n_units (int): Number of units in the scan, needed for "block"
+
+        Returns:
+            shard (int or numpy array): shard id, from 0 to num_shards - 1
+
+    """
+    if assignment == "round_robin":
+        return units % num_shards
+
+    if assignment == "block":
+        if n_units is None:
+            raise RuntimeError("Block sharding needs a scan of known size")
+        return units // -(-n_units // num_shards)
+
+    raise RuntimeError(f"{assignment} not in {SHARD_ASSIGNMENTS}")
+
+
+COMPRESSION_PRESETS = ("blosc-lz4", "bitshuffle", "deflate")
+
+# most bytes of a planned chunk spent along scan dimensions of unknown length
+_UNLIMITED_BYTES = 2**16
+
+
+def plan_chunks(scan_maxshape, frame_shape, dtype, target_bytes=2**21, access="auto"):
+    """
+    Returns a chunk shape of roughly target_bytes for a dataset of frames written during a scan
+
+        Parameters:
+            scan_maxshape (array): Maximum shape of the scan, None for unlimited dimensions
+            frame_shape (array): Shape of a single frame
+            dtype (numpy dtype): Data type of the dataset
+            target_bytes (int): Target size of a chunk in bytes, defaults to 2 MB
+            access (str): "frame" for one frame per chunk (tiled if larger than target_bytes), "row"
+                to group points along the scan rows, or "auto" to use "frame" for frames of at
+                least a quarter of target_bytes and "row" otherwise. Unlimited scan dimensions
+                get at most 64 kB of a "row" chunk between them
+
+        Returns:
+            chunks (tuple): chunk shape covering the scan and frame dimensions
+
+    Examples
+    --------
+
+    >>> utils.plan_chunks([100, 200], [], np.float64)
+    (100, 200)
+
+    """
+    if access not in ("auto", "frame", "row"):
+        raise RuntimeError(f"{access} not in ('auto', 'frame', 'row')")
+
+    itemsize = np.dtype(dtype).itemsize
+    frame = [max(int(f), 1) for f in frame_shape]
+
+    # split the slowest frame dimensions until a tile is under the target
+    while math.prod(frame) * itemsize > target_bytes and any(f > 1 for f in frame):
+        j = next(i for i, f in enumerate(frame) if f > 1)
+        frame[j] = int(math.ceil(frame[j] / 2))
+
+    frame_bytes = math.prod(frame) * itemsize
+    tiled = list(frame) != [int(f) for f in frame_shape]
+
+    if access == "auto":
+        access = "frame" if tiled or frame_bytes * 4 >= target_bytes else "row"
+
+    scan = [1] * len(scan_maxshape)
+
+    if access == "row":
+        remaining = max(target_bytes // frame_bytes, 1)
+        # fill the fastest scan dimension first, only moving to a slower one when it is whole
+        for i in reversed(range(len(scan_maxshape))):
+            size = scan_maxshape[i]
+            if size is None:
+                # the scan may stop after a few points, so only a modest share of
+                # the target is spent, spread over the unlimited dimensions left
+                unit = frame_bytes * math.prod(scan)
+                points = min(remaining, max(_UNLIMITED_BYTES // unit, 1))
+                unlimited = [j for j in range(i + 1) if scan_maxshape[j] is None]
+                for k, j in enumerate(reversed(unlimited)):
+                    scan[j] = max(int(round(points ** (1 / (len(unlimited) - k)))), 1)
+                    points //= scan[j]
+                break
+
+            scan[i] = max(min(remaining, int(size)), 1)
+            remaining //= scan[i]
+
+            if scan[i] < size or remaining <= 1:
+                break
+
+    return tuple(scan + frame)
+
+
+def compression_options(preset, level=None):
+    """
+    Returns create_dataset keyword arguments for a compression preset that the readers can direct chunk read
+
+        Parameters:
+            preset (str): "blosc-lz4", "bitshuffle" (blosc lz4 with bit shuffle) or "deflate"
+            level (int): compression level, defaults to 5 for blosc and 4 for deflate
+
+        Returns:
+            kwargs (dict): compression arguments for h5py create_dataset
+
+    """
+    if preset not in COMPRESSION_PRESETS:
+        raise RuntimeError(f"{preset} not in {COMPRESSION_PRESETS}")
+
+    if preset == "deflate":
+        return {
+            "compression": "gzip",
+            "compression_opts": 4 if level is None else level,
+        }
+
+    import h5py
+
+    if not h5py.h5z.filter_avail(32001):
+        try:
+            # registers the blosc filter with HDF5
+            import hdf5plugin  # noqa: F401
+        except ImportError:
+            raise RuntimeError("Blosc filter not available, install hdf5plugin")
+
+    # blosc cd_values: version, version, typesize, chunksize, level, shuffle, lz4
+    shuffle = 2 if preset == "bitshuffle" else 1
+    clevel = 5 if level is None else level
+    return {"compression": 32001, "compression_opts": (0, 0, 0, 0, clevel, shuffle, 1)}
+
+
+def create_dataset(
+    data,
+    scan_maxshape,
+    fh,
+    path,
+    chunk_bytes=None,
+    access="auto",
+    preset=None,
+    **kwargs,
+):
     """
     Convenience method to create a hdf5 dataset corresponding to data being the first dataset in a scan with shape scan_maxshape
 
@@ -136,6 +493,9 @@ def create_dataset(data, scan_maxshape, fh, path, **kwargs):
             scan_maxshape (array): Shape of the scan, for example [1000] for a stack or [100,100] for a grid
             fh (h5py File or Group): File or Group to create dataset in
             path (str): path to save the dataset under
+            chunk_bytes (int): if set (and chunks is not), plan chunks of about this many bytes with plan_chunks
+            access (str): expected access pattern passed to plan_chunks
+            preset (str): compression preset from compression_options
             kwargs: forwared to the h5py create dataset method allowing chunking and compression to be specified
 
         Returns:
@@ -147,9 +507,16 @@ def create_dataset(data, scan_maxshape, fh, path, **kwargs):
     shape = [1] * len(scan_maxshape) + list(data.shape)
     r = data.reshape(shape)
 
+    if preset is not None:
+        kwargs = {**compression_options(preset), **kwargs}
+
     # if chunks not set use data shape
     if "chunks" not in kwargs:
-        if data.size < 10:
+        if chunk_bytes is not None:
+            kwargs["chunks"] = plan_chunks(
+                scan_maxshape, data.shape, data.dtype, chunk_bytes, access
+            )
+        elif data.size < 10:
             c = [1 if i is None else i for i in maxshape]
             kwargs["chunks"] = tuple(c)
         else:
@@ -177,6 +544,310 @@ def append_data(data, slice_metadata, dataset):
     dataset[fullslice] = data
 
 
+class DataAppender:
+    """Appends frames to a dataset created with create_dataset, batching the
+    writes and growing the dataset in large steps.
+
+    Frames at consecutive positions along the last scan dimension are
+    buffered in memory and written as one contiguous block when the buffer
+    holds block_size points, when a frame is not the next point along the
+    row, or when a frame has been buffered for flush_interval seconds (checked
+    on a background thread, so results reach SWMR readers even while the
+    scan stalls).
+    The dataset is resized geometrically, in whole chunks, rather than on
+    every frame, so readers may see a dataset larger than the data written
+    until close trims it to the exact size.
+
+    Parameters
+    ----------
+
+    dataset: h5py Dataset
+        Resizable dataset to append to, for example from create_dataset.
+
+    block_size: int (optional)
+        Number of points buffered before a write. Defaults to the chunk size
+        along the last scan dimension, or 1024 points if that is smaller.
+
+    flush_interval: float (optional)
+        Maximum time in seconds a frame is held in the buffer. Defaults to 1.
+
+    growth: float (optional)
+        Factor the dataset grows by when it is full. Defaults to 2.
+
+    Examples
+    --------
+
+    >>> with DataAppender(utils.create_dataset(first, maxshape, fh, "sum")) as a:
+    >>>     for d in df:
+    >>>         a.append(d["data"].sum(), d.slice_metadata)
+
+    """
+
+    def __init__(self, dataset, block_size=None, flush_interval=1.0, growth=2.0):
+        self.dataset = dataset
+        self.block_size = block_size
+        self.flush_interval = flush_interval
+        self.growth = growth
+        self.extent = None
+        self._buffer = None
+        self._start = None
+        self._count = 0
+        self._timer = _FlushTimer(self.flush, flush_interval)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def append(self, data, slice_metadata):
+        """
+        Add the frame at a scan position, writing the buffer if needed
+
+            Parameters:
+                data (numpy array): frame corresponding to the n-th point in the scan
+                slice_metadata (tuple): slices describing the position in the scan
+
+        """
+        pos = tuple(s.start for s in slice_metadata)
+
+        with self._timer.lock:
+            if self._buffer is None:
+                self._allocate(np.asarray(data), len(pos))
+
+            if self._count > 0 and (
+                pos[:-1] != self._start[:-1]
+                or pos[-1] != self._start[-1] + self._count
+                or self._count == len(self._buffer)
+            ):
+                self.flush()
+
+            if self._count == 0:
+                self._start = pos
+
+            self._buffer[self._count] = data
+            self._count += 1
+
+            if self._count == len(self._buffer) or self._timer.buffered():
+                self.flush()
+
+    def _allocate(self, data, scan_rank):
+        self.scan_rank = scan_rank
+        self.extent = list(self.dataset.shape[:scan_rank])
+
+        block = self.block_size
+        if block is None:
+            chunks = self.dataset.chunks
+            block = max(chunks[scan_rank - 1] if chunks else 1, 1024)
+
+        self._buffer = np.empty((block,) + data.shape, dtype=self.dataset.dtype)
+
+    def flush(self):
+        """Write any buffered frames to the dataset"""
+        with self._timer.lock:
+            self._timer.written()
+            self._flush()
+
+    def _flush(self):
+        if self._count == 0:
+            return
+
+        start = self._start
+        stop = list(start)
+        stop[-1] += self._count
+        self._ensure_size(stop)
+
+        sel = [slice(p, p + 1) for p in start[:-1]]
+        sel.append(slice(start[-1], stop[-1]))
+        block = self._buffer[: self._count]
+        block = block.reshape((1,) * (self.scan_rank - 1) + block.shape)
+
+        self.dataset[tuple(sel)] = block
+        self._count = 0
+
+        for i, (s, e) in enumerate(zip(stop, self.extent)):
+            self.extent[i] = max(e, s + 1 if i < self.scan_rank - 1 else s)
+
+        if getattr(self.dataset.file, "swmr_mode", False):
+            self.dataset.flush()
+
+    def _ensure_size(self, stop):
+        current = list(self.dataset.shape)
+        needed = [s + 1 for s in stop[:-1]] + [stop[-1]]
+
+        if all(n <= c for n, c in zip(needed, current)):
+            return
+
+        maxshape = self.dataset.maxshape
+        chunks = self.dataset.chunks or [1] * len(current)
+
+        for i, n in enumerate(needed):
+            if n <= current[i]:
+                continue
+
+            size = max(n, int(math.ceil(current[i] * self.growth)))
+            size = int(math.ceil(size / chunks[i])) * chunks[i]
+
+            if maxshape[i] is not None:
+                size = min(size, maxshape[i])
+
+            current[i] = size
+
+        self.dataset.resize(current)
+
+    def close(self):
+        """Write any buffered frames and trim the dataset to the data written"""
+        self._timer.close()
+        self.flush()
+
+        if self.extent is None:
+            return
+
+        shape = tuple(self.extent) + self.dataset.shape[self.scan_rank :]
+        if shape != self.dataset.shape:
+            self.dataset.resize(shape)
+
+            if getattr(self.dataset.file, "swmr_mode", False):
+                self.dataset.flush()
+
+
+class _FlushTimer:
+    """Calls flush from a background thread once data has been buffered for
+    interval seconds, so a time limit on buffering holds while no new data
+    arrives. The thread only runs while something is buffered. The owner
+    holds lock while changing its buffer, and reports buffered and written
+    data with buffered and written."""
+
+    def __init__(self, flush, interval):
+        self.lock = threading.RLock()
+        self._flush = flush
+        self._interval = interval
+        self._due = None
+        self._thread = None
+        self._closed = False
+        self._wake = threading.Event()
+
+    def buffered(self):
+        """Note data was buffered, True if the interval has already passed"""
+        now = time.monotonic()
+        if self._due is None:
+            self._due = now + self._interval
+
+        if now >= self._due:
+            return True
+
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+        return False
+
+    def written(self):
+        """Note everything buffered was written"""
+        self._due = None
+
+    def close(self):
+        with self.lock:
+            self._closed = True
+            thread = self._thread
+
+        self._wake.set()
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        idle = False
+        while True:
+            with self.lock:
+                if self._closed or (idle and self._due is None):
+                    # nothing buffered for an interval, restarted by buffered
+                    self._thread = None
+                    return
+
+                idle = self._due is None
+                wait = self._interval if idle else self._due - time.monotonic()
+                if wait <= 0:
+                    try:
+                        self._flush()
+                    except Exception as e:
+                        # the file may have been closed under us
+                        logger.error("Background flush failed " + str(e))
+                        self._due = None
+                    continue
+
+            self._wake.wait(wait)
+
+
+def merge_shards(
+    shard_datasets,
+    output,
+    scan_rank,
+    assignment="round_robin",
+    scan_chunks=None,
+    unit=1,
+):
+    """
+    Copy the scan points each shard processed from its results into one dataset
+
+        Parameters:
+            shard_datasets (list): result datasets of each shard, in shard_id order
+            output (h5py Dataset): dataset to merge into, with the shape of the scan (maxshape for "block")
+            scan_rank (int): Rank of the scan
+            assignment (str): shard assignment the results were read with
+            scan_chunks (array): chunk shape the points were grouped by, as for get_shard_units
+            unit (int): shard unit the results were read with
+
+        Returns:
+            count (int): number of scan points copied
+    Examples
+    --------
+
+    >>> # results of DataSource(..., shard_id=i, num_shards=2) for a [10, 20] scan
+    >>> utils.merge_shards([fa["sum"], fb["sum"]], out, 2, scan_chunks=data.chunks[:2])
+
+    """
+    scan_shape = tuple(output.shape[:scan_rank])
+    n_units = count_shard_units(output.maxshape[:scan_rank], scan_chunks, unit)
+
+    indices = np.arange(math.prod(scan_shape))
+    units = get_shard_units(indices, scan_shape, scan_chunks, unit)
+    owners = get_shard(units, len(shard_datasets), assignment, n_units)
+    owners = owners.reshape(scan_shape)
+
+    # copied a chunk of the output at a time
+    chunks = output.chunks[:scan_rank] if output.chunks else (1,) * scan_rank
+    grid = tuple(-(-s // c) for s, c in zip(scan_shape, chunks))
+    count = 0
+
+    for coords in np.ndindex(grid):
+        region = tuple(
+            slice(g * c, min(g * c + c, s))
+            for g, c, s in zip(coords, chunks, scan_shape)
+        )
+
+        for shard in np.unique(owners[region]):
+            src = shard_datasets[shard]
+
+            # a shard may not have written as far as the end of the scan
+            sel = tuple(
+                slice(r.start, min(r.stop, s)) for r, s in zip(region, src.shape)
+            )
+            if any(r.stop <= r.start for r in sel):
+                continue
+
+            mask = owners[sel] == shard
+            if mask.all():
+                output[sel] = src[sel]
+            else:
+                for pos in np.argwhere(mask):
+                    p = tuple(int(r.start + i) for r, i in zip(sel, pos))
+                    output[p] = src[p]
+
+            count += int(mask.sum())
+
+    return count
+
+
 def copy_nexus_axes(nxd_in, nxd_out, scan_rank, frame_axes=None):
     """
     Copy the axes and associated attributes from the input NXdata to the output NXdata
@@ -249,6 +920,8 @@ def check_file_readable(path, datasets, timeout=10, retrys=5):
             datasets (array): List of paths to datasets in the file
 
     """
+    import h5py
+
     start = time.time()
     dif = time.time() - start
 
@@ -268,6 +941,147 @@ def check_file_readable(path, datasets, timeout=10, retrys=5):
     return False
 
 
+def check_files_readable(
+    files,
+    timeout=10,
+    max_workers=None,
+    keep_open=False,
+    follow_links=True,
+    backoff=0.05,
+    max_backoff=1.0,
+):
+    """
+    Check the datasets of many files can be read, retrying each file concurrently with exponential backoff
+
+        Parameters:
+            files (dict): paths of hdf5 files to lists of paths to datasets in each file
+            timeout (float): maximum time in seconds to wait for all the files
+            max_workers (int): number of files checked at once, defaults to the ThreadPoolExecutor default
+            keep_open (boolean): keep the files that could be read open (swmr mode) and return the handles
+            follow_links (boolean): also check the files that external links to the datasets point to
+            backoff (float): first retry delay in seconds, doubled (with jitter) after each failure
+            max_backoff (float): largest retry delay in seconds
+
+        Returns:
+            results (dict): path to a dict of "readable" (boolean), "elapsed" (seconds until readable or
+            given up), "attempts" (int), "links" (paths of external link targets), "error" (str or None)
+            and "handle" (open h5py File if keep_open, otherwise None)
+
+    Examples
+    --------
+
+    >>> results = utils.check_files_readable({"master.h5": ["/entry/data/data"]})
+    >>> all(r["readable"] for r in results.values())
+    True
+
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    results = {}
+
+    def check(path, datasets):
+        return _check_readable(
+            path,
+            datasets,
+            start,
+            deadline,
+            keep_open,
+            follow_links,
+            backoff,
+            max_backoff,
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(check, p, list(d)): p for p, d in files.items()}
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+            for f in done:
+                path = pending.pop(f)
+                result = f.result()
+                results[path] = result
+
+                # link targets are checked as files in their own right
+                targets = {}
+                for link_path, link_dataset in result["links"].items():
+                    targets.setdefault(link_path, []).append(link_dataset)
+
+                result["links"] = sorted(targets)
+                for link_path, link_datasets in targets.items():
+                    if link_path in results or link_path in pending.values():
+                        continue
+                    pending[executor.submit(check, link_path, link_datasets)] = (
+                        link_path
+                    )
+
+    for path, result in results.items():
+        if not result["readable"]:
+            logger.error("Could not read file " + path)
+
+    return results
+
+
+def _check_readable(
+    path, datasets, start, deadline, keep_open, follow_links, backoff, max_backoff
+):
+    import h5py
+
+    result = {
+        "readable": False,
+        "elapsed": 0.0,
+        "attempts": 0,
+        "links": {},
+        "error": None,
+        "handle": None,
+    }
+    delay = backoff
+
+    while True:
+        result["attempts"] += 1
+        fh = None
+        try:
+            fh = h5py.File(path, "r", libver="latest", swmr=True)
+            links = {}
+            for d in datasets:
+                link = fh.get(d, getlink=True) if follow_links else None
+                if isinstance(link, h5py.ExternalLink):
+                    target = link.filename
+                    if not os.path.isabs(target):
+                        target = os.path.join(os.path.dirname(path), target)
+                    links[target] = link.path
+                    continue
+                fh[d]
+
+            result["readable"] = True
+            result["links"] = links
+            result["error"] = None
+        except Exception as e:
+            logger.debug("Reading failed, retrying " + str(e))
+            result["error"] = str(e)
+            if fh is not None:
+                fh.close()
+                fh = None
+
+        now = time.monotonic()
+        if result["readable"] or now >= deadline:
+            break
+
+        # jitter stops files that failed together from retrying in lock step
+        time.sleep(min(delay * random.uniform(0.5, 1.5), deadline - now))
+        delay = min(delay * 2, max_backoff)
+
+    result["elapsed"] = time.monotonic() - start
+
+    if fh is not None:
+        if keep_open:
+            result["handle"] = fh
+        else:
+            fh.close()
+
+    return result
+
+
 def convert_stack_to_grid(slices, scan_shape, snake=False):
     index = slices[0].start
 
@@ -285,6 +1099,14 @@ def _get_slices_from_position(pos, slices):
     return slices_out
 
 
+def _import_optional(name):
+    # optional dependencies (codecs) are only imported when first needed
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
 def refresh_dataset(dataset):
     """
     Check if a dataset has the refresh method and then call it. Used
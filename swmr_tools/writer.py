@@ -0,0 +1,207 @@
+from .utils import append_data
+import queue
+import threading
+import time
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+_FLUSH = object()
+_STOP = object()
+
+
+class OutputWriter:
+    """Writes processed results to HDF5 on a background thread, so the
+    compute loop does not stall on writes or SWMR flushes.
+
+    Items of (data, slice_metadata, dataset) are passed through a bounded
+    queue and written with append_data on a dedicated thread. The datasets
+    written to are flushed, making the data visible to SWMR readers, once
+    flush_interval seconds have passed or flush_bytes have been written since
+    the last flush, so readers see a steady flush rate however the results
+    arrive. The time taken by each flush, and the time from an item being put
+    to it being flushed, are recorded in stats.
+
+    The data is not copied, so an array must not be modified after it is put.
+
+    Parameters
+    ----------
+
+    max_queue: int (optional)
+        Maximum number of items waiting to be written. put blocks when the
+        queue is full. Defaults to 64.
+
+    flush_interval: float (optional)
+        Maximum time in seconds between flushes. Defaults to 1.
+
+    flush_bytes: int (optional)
+        Number of bytes written that triggers a flush. Defaults to 64 MB.
+
+    Examples
+    --------
+
+    >>> with OutputWriter(flush_interval=0.5) as writer:
+    >>>     for d in df:
+    >>>         result = process(d["data"])
+    >>>         writer.put(result, d.slice_metadata, output)
+    >>> print(writer.stats())
+
+    """
+
+    def __init__(self, max_queue=64, flush_interval=1.0, flush_bytes=64 * 2**20):
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._error = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "items": 0,
+            "bytes": 0,
+            "flushes": 0,
+            "flush_time_total": 0.0,
+            "flush_time_max": 0.0,
+            "latency_max": 0.0,
+            "queue_max": 0,
+        }
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def put(self, data, slice_metadata, dataset, timeout=None):
+        """
+        Queue data to be written at slice_metadata in dataset
+
+            Parameters:
+                data (numpy array): data for the point in the scan
+                slice_metadata (tuple): slices describing the position in the scan
+                dataset (h5py Dataset): dataset to write to, as from create_dataset
+                timeout (float): maximum time to wait for space in the queue
+
+        """
+        self._check_error()
+        self._queue.put(
+            (data, slice_metadata, dataset, time.monotonic()), timeout=timeout
+        )
+
+        with self._lock:
+            self._stats["queue_max"] = max(
+                self._stats["queue_max"], self._queue.qsize()
+            )
+
+    def flush(self):
+        """Wait for all queued items to be written and flushed"""
+        if not self._thread.is_alive():
+            self._check_error()
+            return
+
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        done.wait()
+        self._check_error()
+
+    def close(self):
+        """Write and flush all queued items and stop the writer thread"""
+        if self._thread.is_alive():
+            self._queue.put((_STOP, None))
+            self._thread.join()
+
+        self._check_error()
+
+    def stats(self):
+        """
+        Returns the writer statistics
+
+            Returns:
+                stats (dict): items and bytes written, number of flushes, total and
+                maximum flush time, mean flush time, maximum time from put to flush
+                (latency_max) and the most items seen waiting in the queue
+
+        """
+        with self._lock:
+            out = dict(self._stats)
+
+        n = out["flushes"]
+        out["flush_time_mean"] = out["flush_time_total"] / n if n else 0.0
+        return out
+
+    def _check_error(self):
+        if self._error is not None:
+            raise RuntimeError("Output writer failed") from self._error
+
+    def _run(self):
+        dirty = set()
+        pending_bytes = 0
+        oldest = None
+        last_flush = time.monotonic()
+
+        while True:
+            wait = max(last_flush + self.flush_interval - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=wait if dirty else None)
+            except queue.Empty:
+                item = None
+
+            if item is not None and item[0] is _STOP:
+                self._flush(dirty, oldest)
+                return
+
+            if item is not None and item[0] is _FLUSH:
+                self._flush(dirty, oldest)
+                dirty, pending_bytes, oldest = set(), 0, None
+                last_flush = time.monotonic()
+                item[1].set()
+                continue
+
+            if item is not None and self._error is None:
+                data, slice_metadata, dataset, queued = item
+                try:
+                    append_data(data, slice_metadata, dataset)
+                except Exception as e:
+                    logger.error("Writing output failed " + str(e))
+                    self._error = e
+
+                dirty.add(dataset)
+                nbytes = getattr(data, "nbytes", 0)
+                pending_bytes += nbytes
+                oldest = queued if oldest is None else oldest
+
+                with self._lock:
+                    self._stats["items"] += 1
+                    self._stats["bytes"] += nbytes
+
+            now = time.monotonic()
+            if dirty and (
+                pending_bytes >= self.flush_bytes
+                or now - last_flush >= self.flush_interval
+            ):
+                self._flush(dirty, oldest)
+                dirty, pending_bytes, oldest = set(), 0, None
+                last_flush = time.monotonic()
+
+    def _flush(self, datasets, oldest):
+        if not datasets or self._error is not None:
+            return
+
+        start = time.monotonic()
+        try:
+            for ds in datasets:
+                if hasattr(ds, "flush"):
+                    ds.flush()
+        except Exception as e:
+            logger.error("Flushing output failed " + str(e))
+            self._error = e
+
+        end = time.monotonic()
+        with self._lock:
+            self._stats["flushes"] += 1
+            self._stats["flush_time_total"] += end - start
+            self._stats["flush_time_max"] = max(
+                self._stats["flush_time_max"], end - start
+            )
+            self._stats["latency_max"] = max(self._stats["latency_max"], end - oldest)
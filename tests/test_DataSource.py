@@ -1,5 +1,6 @@
 import numpy as np
 from swmr_tools import DataSource
+from swmr_tools.datasource import RefreshScheduler
 import utils
 
 
@@ -88,3 +89,60 @@ def test_iterates_complete_interleaved_datasets():
         assert dset.slice_metadata == (slice(val, val + 1, None),)
         assert d == val
         val = val + 1
+
+
+def test_refresh_scheduler():
+    covered = utils.make_mock([10])
+    short = utils.make_mock([5])
+
+    rs = RefreshScheduler(interval=0)
+    rs.add(covered, 1)
+    rs.add(short, 1)
+
+    # zero interval refreshes everything on each poll
+    assert rs.refresh(9) == 2
+    assert rs.refresh(9) == 2
+
+    covered = utils.make_mock([10])
+    short = utils.make_mock([5])
+
+    rs = RefreshScheduler(interval=100)
+    rs.add(covered, 1)
+    rs.add(short, 1)
+
+    # first poll always refreshes
+    assert rs.refresh(4) == 2
+    # inside both cached shapes
+    assert rs.refresh(4) == 0
+    # past the extent of the short dataset only
+    assert rs.refresh(7) == 1
+    assert short.refresh.call_count == 2
+    assert covered.refresh.call_count == 1
+
+
+def test_refresh_scheduler_interleaved():
+    mds = utils.make_mock([5])
+
+    rs = RefreshScheduler(interval=100)
+    rs.add(mds, 1, stride=2)
+
+    assert rs.refresh(0) == 1
+    assert rs.refresh(9) == 0
+    assert rs.refresh(10) == 1
+
+
+def test_refresh_interval_datasource():
+    mds = utils.make_mock([10])
+    mdsc = utils.make_mock([10])
+    mds.dataset[...] = 1
+    mdsc.dataset[...] = np.arange(10)
+
+    df = DataSource([mds], {"data": mdsc}, timeout=0.1, refresh_interval=100)
+
+    val = 0
+    for dset in df:
+        assert dset["data"] == val
+        val += 1
+
+    assert val == 10
+    assert mdsc.refresh.call_count == 1
@@ -0,0 +1,83 @@
+import h5py
+import numpy as np
+from swmr_tools import ChunkSource, DataSource, FrameAccumulator
+from swmr_tools.accumulators import accumulate
+
+
+def test_single_frames():
+    rng = np.random.default_rng(0)
+    frames = rng.integers(0, 1000, size=(25, 4, 5)).astype(np.uint32)
+
+    acc = FrameAccumulator()
+    for f in frames:
+        acc.update(f)
+
+    s = acc.snapshot()
+    assert s["count"] == 25
+    assert np.all(s["sum"] == frames.sum(axis=0))
+    assert np.allclose(s["mean"], frames.mean(axis=0))
+    assert np.allclose(s["variance"], frames.var(axis=0))
+    assert np.all(s["max"] == frames.max(axis=0))
+    assert np.all(s["min"] == frames.min(axis=0))
+    assert s["max"].dtype == np.uint32
+
+
+def test_batches_and_snapshot():
+    rng = np.random.default_rng(1)
+    frames = rng.normal(size=(30, 3, 3))
+
+    acc = FrameAccumulator(frame_rank=2, dtype=np.float64)
+    acc.update(frames[:10])
+
+    s = acc.snapshot(ddof=1)
+    assert s["count"] == 10
+    assert np.allclose(s["variance"], frames[:10].var(axis=0, ddof=1))
+
+    # mix a single frame (with leading singleton scan dims) and batches
+    acc.update(frames[10].reshape(1, 1, 3, 3))
+    acc.update(frames[11:])
+
+    s2 = acc.snapshot()
+    assert s2["count"] == 30
+    assert np.allclose(s2["mean"], frames.mean(axis=0))
+    assert np.allclose(s2["variance"], frames.var(axis=0))
+    # earlier snapshot is unaffected
+    assert s["count"] == 10
+
+    acc.reset()
+    assert acc.snapshot() == {"count": 0}
+
+
+def test_integer_accumulation():
+    frames = np.full((4, 2, 2), 200, dtype=np.uint8)
+
+    acc = FrameAccumulator(frame_rank=2, dtype=np.int64, variance=False)
+    acc.update(frames)
+
+    s = acc.snapshot()
+    assert s["sum"].dtype == np.int64
+    assert np.all(s["sum"] == 800)
+    assert "variance" not in s
+
+
+def test_accumulate_sources(tmp_path):
+    f = str(tmp_path / "f.h5")
+    data = np.arange(40 * 6, dtype=np.float32).reshape(40, 2, 3)
+
+    with h5py.File(f, "w") as fh:
+        fh.create_dataset("data", data=data, chunks=(10, 2, 3))
+        fh.create_dataset("key", data=np.ones(40))
+
+    with h5py.File(f, "r") as fh:
+        cs = ChunkSource({"data": fh["data"]}, timeout=0.1)
+        chunk_acc = accumulate(cs, "data", frame_rank=2)
+
+    with h5py.File(f, "r") as fh:
+        df = DataSource([fh["key"]], {"data": fh["data"]}, timeout=0.1)
+        frame_acc = accumulate(df, "data", frame_rank=2)
+
+    for acc in (chunk_acc, frame_acc):
+        s = acc.snapshot()
+        assert s["count"] == 40
+        assert np.allclose(s["mean"], data.mean(axis=0))
+        assert np.allclose(s["variance"], data.var(axis=0))
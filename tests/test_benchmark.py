@@ -0,0 +1,62 @@
+import copy
+import json
+import pytest
+from swmr_tools import benchmark
+
+
+def test_run_benchmarks(tmp_path):
+    names = ["keyfollower_1key", "datasource_direct", "chunksource", "live_chunksource"]
+    results = benchmark.run_benchmarks(str(tmp_path), names)
+
+    assert results["meta"]["size"] == "quick"
+    assert sorted(results["results"]) == sorted(names)
+
+    for metrics in results["results"].values():
+        assert metrics["items"] > 0
+        assert metrics["throughput"] > 0
+
+    # results are JSON serialisable
+    json.dumps(results)
+
+
+def test_compare():
+    baseline = {
+        "meta": {"size": "quick"},
+        "results": {
+            "a": {"items": 10, "throughput": 100.0, "latency_mean": 0.1},
+            "b": {"items": 10, "throughput": 100.0},
+        },
+    }
+
+    current = copy.deepcopy(baseline)
+    assert benchmark.compare(current, baseline) == []
+
+    current["results"]["a"]["throughput"] = 50.0
+    current["results"]["a"]["latency_mean"] = 0.11
+    current["results"]["b"]["items"] = 5
+    regressions = benchmark.compare(current, baseline, tolerance=0.25)
+
+    assert [(r["benchmark"], r["metric"]) for r in regressions] == [("a", "throughput")]
+
+    current["results"]["a"]["latency_mean"] = 0.2
+    assert len(benchmark.compare(current, baseline, tolerance=0.25)) == 2
+
+    current["meta"]["size"] = "full"
+    with pytest.raises(RuntimeError):
+        benchmark.compare(current, baseline)
+
+
+def test_main_baseline(tmp_path):
+    out = str(tmp_path / "results.json")
+    assert benchmark.main(["--no-live", "-o", out, "slice_structure"]) == 0
+
+    with open(out) as f:
+        results = json.load(f)
+
+    # an impossibly fast baseline is a regression
+    results["results"]["slice_structure"]["throughput"] *= 1000
+    base = str(tmp_path / "baseline.json")
+    with open(base, "w") as f:
+        json.dump(results, f)
+
+    assert benchmark.main(["--no-live", "-o", out, "-b", base, "slice_structure"]) == 1
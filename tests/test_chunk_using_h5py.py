@@ -5,6 +5,7 @@ import math
 from swmr_tools import ChunkSource, chunk_utils, utils
 import time
 import multiprocessing as mp
+import pytest
 
 
 def test_chunk_source_static(tmp_path):
@@ -35,6 +36,277 @@ def test_chunk_source_static(tmp_path):
     assert counter == 3
 
 
+def test_chunk_source_deflate(tmp_path):
+    f = str(tmp_path / "chunk.h5")
+
+    d = np.arange(25 * 4 * 5).reshape((25, 4, 5))
+
+    with h5py.File(f, "w") as fh:
+        fh.create_dataset("data", data=d, chunks=(10, 4, 5), compression="gzip")
+        fh.create_dataset("raw", data=d, chunks=(10, 4, 5))
+
+    with h5py.File(f, "r") as fh:
+        cs = ChunkSource({"data": fh["data"], "raw": fh["raw"]}, timeout=0.5)
+
+        counter = 0
+        for c in cs:
+            assert np.all(c["data"] == d[c.index : c.index + 10])
+            assert np.all(c["raw"] == c["data"])
+            counter += 1
+
+    assert counter == 3
+
+
+def test_chunk_source_tiles(tmp_path):
+    f = str(tmp_path / "chunk.h5")
+
+    d = np.arange(15 * 6 * 8).reshape((15, 6, 8))
+    grid = np.arange(4 * 6 * 3).reshape((4, 6, 3))
+
+    with h5py.File(f, "w") as fh:
+        fh.create_dataset(
+            "tiled",
+            data=d,
+            chunks=(10, 4, 4),
+            **hdf5plugin.Blosc(cname="lz4", shuffle=hdf5plugin.Blosc.SHUFFLE),
+        )
+        fh.create_dataset("grid", data=grid, chunks=(2, 3, 3))
+
+    with h5py.File(f, "r") as fh:
+        for name, data, n_chunks in (("tiled", d, 8), ("grid", grid, 4)):
+            out = np.zeros_like(data)
+            cs = ChunkSource({name: fh[name]}, timeout=0.1)
+
+            counter = 0
+            for c in cs:
+                assert len(c.slice_metadata) == 3
+                assert c.index == c.slice_metadata[0].start
+                out[c.slice_metadata] = c[name]
+                counter += 1
+
+            assert counter == n_chunks
+            assert np.all(out == data)
+
+
+def test_chunk_source_storage_order(tmp_path):
+    f = str(tmp_path / "chunk.h5")
+
+    d = np.arange(4 * 4 * 4).reshape((4, 4, 4))
+    chunks = (2, 2, 2)
+
+    with h5py.File(f, "w") as fh:
+        ds = fh.create_dataset("data", shape=d.shape, dtype=d.dtype, chunks=chunks)
+        # write the tiles of each row in reverse so file order differs from scan order
+        for i in range(0, 4, 2):
+            for j, k in reversed([(j, k) for j in (0, 2) for k in (0, 2)]):
+                tile = np.ascontiguousarray(d[i : i + 2, j : j + 2, k : k + 2])
+                ds.id.write_direct_chunk((i, j, k), tile.tobytes())
+
+    with h5py.File(f, "r") as fh:
+        scan = [c.slice_metadata for c in ChunkSource({"d": fh["data"]}, timeout=0.1)]
+        storage = ChunkSource({"d": fh["data"]}, timeout=0.1, order="storage")
+
+        counter = 0
+        for c in storage:
+            assert np.all(c["d"] == d[c.slice_metadata])
+            counter += 1
+
+        assert counter == 8
+        assert [s[1:] for s in scan[:4]] == [
+            (slice(j, j + 2), slice(k, k + 2)) for j in (0, 2) for k in (0, 2)
+        ]
+        assert storage._row_orders[0] == [3, 2, 1, 0]
+
+
+def test_chunk_source_batch(tmp_path):
+    f = str(tmp_path / "chunk.h5")
+    create_test_file(f)
+
+    with h5py.File(f, "r") as fh:
+        cs = ChunkSource({"data": fh["/data"]}, timeout=0.1)
+
+        assert cs.available_chunks() == 3
+
+        batch = cs.next_batch(max_chunks=2)
+        assert [c.index for c in batch] == [0, 10]
+        assert cs.available_chunks(refresh=False) == 1
+
+        batch = cs.next_batch()
+        assert [c.index for c in batch] == [20]
+        assert batch[0]["data"].shape == (5, 4, 5)
+
+        assert cs.next_batch() == []
+
+
+def test_mock_scan_batch(tmp_path):
+    f = str(tmp_path / "scan.h5")
+
+    p = mp.Process(target=mock_scan, args=(f,))
+    p.start()
+
+    utils.check_file_readable(f, "/data", timeout=2, retrys=10)
+
+    # start late so the first batch catches up on several chunks
+    time.sleep(1)
+
+    with h5py.File(f, "r", libver="latest", swmr=True) as fh:
+        cs = ChunkSource({"data": fh["/data"]})
+
+        counter = 0
+        n_batches = 0
+        while True:
+            batch = cs.next_batch()
+            if not batch:
+                break
+
+            n_batches += 1
+            for c in batch:
+                assert c.index == counter * 10
+                assert c["data"][0, 0, 0] == counter
+                counter += 1
+
+    assert counter == 25
+    assert n_batches < 25
+
+    p.join()
+
+
+def test_chunk_source_random_access(tmp_path):
+    f = str(tmp_path / "chunk.h5")
+    create_test_file(f)
+
+    with h5py.File(f, "r") as fh:
+        ds = fh["/data"]
+        expected = ds[...]
+
+        cs = ChunkSource({"data": ds}, timeout=0.1, read_ahead=1)
+
+        c = cs[1]
+        assert c.index == 10
+        assert np.all(c["data"] == expected[10:20])
+        assert cs[-1].index == 20
+        assert cs.current_index == 0
+
+        with pytest.raises(IndexError):
+            cs[3]
+
+        cs.seek(2)
+        assert [c.index for c in cs] == [20]
+
+        cs.seek(0)
+        assert [c.index for c in cs] == [0, 10, 20]
+
+        cs = ChunkSource({"data": ds}, timeout=0.1, start=1)
+        assert [c.index for c in cs] == [10, 20]
+
+    with h5py.File(f, "a") as fh:
+        fh.create_dataset("partial", shape=(30, 2), dtype="i4", chunks=(10, 2))
+        fh["partial"][20:30] = 1
+
+    with h5py.File(f, "r") as fh:
+        cs = ChunkSource({"partial": fh["partial"]}, timeout=0.1)
+
+        assert np.all(cs[2]["partial"] == 1)
+
+        with pytest.raises(IndexError):
+            cs[0]
+
+        # nothing before the seek position is needed
+        cs.seek(2)
+        assert [c.index for c in cs] == [20]
+
+
+def test_chunk_source_growing_unlimited(tmp_path):
+    f = str(tmp_path / "growing.h5")
+
+    with h5py.File(f, "w", libver="latest") as fw:
+        ds = fw.create_dataset(
+            "data", shape=(0, 2), maxshape=(None, 2), chunks=(10, 2), dtype="i4"
+        )
+        finished = fw.create_dataset("finished", data=[0])
+        fw.swmr_mode = True
+
+        def write(stop):
+            start = ds.shape[0]
+            ds.resize((stop, 2))
+            ds[start:stop] = np.arange(start + 1, stop + 1)[:, None]
+            ds.flush()
+
+        with h5py.File(f, "r", libver="latest", swmr=True) as fr:
+            cs = ChunkSource(
+                {"data": fr["data"]}, timeout=0.2, finished_dataset=fr["finished"]
+            )
+
+            # the chunk is only partly written
+            write(5)
+            assert cs.available_chunks() == 0
+            with pytest.raises(StopIteration):
+                next(cs)
+            assert cs.has_timed_out()
+
+            write(13)
+            chunk = next(cs)
+            assert chunk["data"][:, 0].tolist() == list(range(1, 11))
+            assert chunk.slice_metadata[0] == slice(0, 10)
+            assert cs.available_chunks() == 0
+
+            # the last chunk is returned trimmed once the scan finishes
+            finished[0] = 1
+            finished.flush()
+            chunk = next(cs)
+            assert chunk["data"][:, 0].tolist() == [11, 12, 13]
+            assert chunk.slice_metadata[0] == slice(10, 13)
+
+            with pytest.raises(StopIteration):
+                next(cs)
+            assert cs.is_scan_finished()
+
+
+def test_chunk_source_read_ahead(tmp_path):
+    f = str(tmp_path / "chunk.h5")
+    create_test_file(f)
+
+    with h5py.File(f, "r") as fh:
+        ds = fh["/data"]
+        expected = ds[...]
+
+        dd = {"data": ds, "data2": ds}
+
+        cs = ChunkSource(dd, timeout=0.5, read_ahead=2, max_workers=4)
+
+        counter = 0
+        for c in cs:
+            assert c.index == counter * 10
+            assert np.all(c["data"] == expected[c.index : c.index + 10])
+            assert np.all(c["data2"] == c["data"])
+            counter += 1
+
+        assert counter == 3
+        assert cs._executor is None
+
+
+def test_mock_scan_read_ahead(tmp_path):
+    f = str(tmp_path / "scan.h5")
+
+    p = mp.Process(target=mock_scan, args=(f,))
+    p.start()
+
+    utils.check_file_readable(f, "/data", timeout=2, retrys=10)
+
+    with h5py.File(f, "r", libver="latest", swmr=True) as fh:
+        cs = ChunkSource({"data": fh["/data"]}, read_ahead=3)
+
+        counter = 0
+        for c in cs:
+            assert c.index == counter * 10
+            assert c["data"][0, 0, 0] == counter
+            counter += 1
+
+    assert counter == 25
+
+    p.join()
+
+
 def test_mock_scan(tmp_path):
     f = str(tmp_path / "scan.h5")
 
@@ -200,3 +472,74 @@ def run_snake_write(f, shape, chunk_size):
 
     with h5py.File(f, "r") as fh:
         assert np.all(expected == fh[dsname][...])
+
+
+@pytest.mark.parametrize(
+    "compression",
+    [
+        {},
+        hdf5plugin.Blosc(cname="lz4", shuffle=hdf5plugin.Blosc.BITSHUFFLE),
+        {"compression": "gzip"},
+    ],
+)
+@pytest.mark.parametrize("snake", [False, True])
+def test_chunk_writer_direct(tmp_path, compression, snake):
+    f = str(tmp_path / "output.h5")
+    shape = [6, 28]
+    frame = (3, 4)
+    chunk_size = 7
+    npoints = math.prod(shape)
+
+    stack = np.arange(npoints * 12, dtype=np.int32).reshape((npoints,) + frame)
+    writer = chunk_utils.ChunkWriter()
+    last_data = None
+
+    with h5py.File(f, "w") as ofh:
+        output = ofh.create_dataset(
+            "output",
+            shape=shape + list(frame),
+            dtype=np.int32,
+            chunks=(1, chunk_size) + frame,
+            **compression,
+        )
+
+        for i in range(0, npoints, chunk_size):
+            data = stack[i : i + chunk_size]
+            ss = chunk_utils.get_slice_structure(i, chunk_size, shape, snake)
+            writer.write(ss, data, last_data, output)
+            last_data = data
+
+    assert writer.direct_writes == npoints // chunk_size
+
+    expected = np.zeros(shape + list(frame), dtype=np.int32)
+    for i in range(npoints):
+        if snake:
+            position = utils.get_position_snake(i, shape, len(shape))
+        else:
+            position = utils.get_position(i, shape, len(shape))
+        expected[tuple(position)] = stack[i]
+
+    with h5py.File(f, "r") as fh:
+        assert np.all(expected == fh["output"][...])
+
+
+def test_chunk_writer_matches_write_data(tmp_path):
+    shape = [35, 28]
+    chunk_size = 50
+    npoints = math.prod(shape)
+    stack = np.arange(npoints, dtype=np.float64)
+
+    expected = np.zeros(shape)
+    output = np.zeros(shape)
+    writer = chunk_utils.ChunkWriter()
+    last_data = None
+
+    for i in range(0, npoints, chunk_size):
+        data = stack[i : i + chunk_size]
+        ss = chunk_utils.get_slice_structure(i, chunk_size, shape, True)
+        chunk_utils.write_data(ss, data, last_data, expected)
+        writer.write(ss, data, last_data, output)
+        last_data = data
+
+    assert writer.direct_writes == 0
+    assert np.all(expected == output)
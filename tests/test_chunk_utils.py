@@ -153,3 +153,56 @@ def test_write():
     chunk_utils.write_data(ss, vectors, vectors, vector_out)
 
     assert np.all(vector_out[1, 22, :] == vectors[3, :])
+
+
+def _as_tuple(cc):
+    def sl(s):
+        return None if s is None else (s.start, s.stop, s.step)
+
+    def inout(io):
+        return None if io is None else (sl(io.input), sl(io.output))
+
+    inter = cc.intermediate
+    return (
+        cc.type,
+        tuple(int(p) for p in cc.position),
+        inout(cc.current),
+        inout(cc.last),
+        None if inter is None else (sl(inter.slice), inter.size),
+    )
+
+
+@pytest.mark.parametrize("shape, chunk_size", shapes)
+def test_compiled_plan_matches(shape, chunk_size):
+    npoints = math.prod(shape)
+
+    for snake in (False, True):
+        plan = chunk_utils.compile_slice_plan(chunk_size, shape, snake)
+        assert len(plan) == -(-npoints // chunk_size)
+
+        for k, i in enumerate(range(0, npoints, chunk_size)):
+            direct = chunk_utils._compute_slice_structure(i, chunk_size, shape, snake)
+            compiled = plan.get(k)
+            assert [_as_tuple(c) for c in compiled] == [_as_tuple(c) for c in direct]
+
+        # cached per geometry
+        assert chunk_utils.compile_slice_plan(chunk_size, list(shape), snake) is plan
+
+
+def test_slice_plan_lazy():
+    # only the blocks of chunks looked up are compiled
+    shape = [2000, 2000]
+    plan = chunk_utils.compile_slice_plan(4, shape, True)
+    assert len(plan) == 10**6
+    assert plan._blocks == {}
+
+    k = 10**6 - 1
+    ss = chunk_utils.get_slice_structure(4 * k, 4, shape, True)
+    direct = chunk_utils._compute_slice_structure(4 * k, 4, shape, True)
+    assert [_as_tuple(c) for c in ss] == [_as_tuple(c) for c in direct]
+    assert list(plan._blocks) == [k // chunk_utils._PLAN_BLOCK]
+
+    # without a compiled plan structures are computed directly
+    chunk_utils.get_slice_structure(0, 4, [3000, 2000], True)
+    key = chunk_utils._plan_key(4, [3000, 2000], True)
+    assert key not in chunk_utils._plans
@@ -0,0 +1,84 @@
+import json
+import pytest
+from swmr_tools import cli
+from swmr_tools.simulator import SyntheticWriter
+
+
+@pytest.fixture
+def scan(tmp_path):
+    path = str(tmp_path / "scan.h5")
+    SyntheticWriter(path, (4, 5), (8, 8), rate=None, frames_per_chunk=5).run()
+    return path
+
+
+def test_follow(scan, capsys):
+    args = ["follow", scan, "--keys", "key", "--finished", "finished"]
+    assert cli.main(args + ["--interval", "0"]) == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("frontier 1/20")
+    assert lines[-2].startswith("frontier 20/20")
+    assert lines[-1].startswith("finished after 20 points")
+
+
+def test_tail(scan, capsys):
+    args = ["tail", scan, "--keys", "key", "--data", "data", "--finished", "finished"]
+    assert cli.main(args + ["--stats", "--every", "5"]) == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 4
+    # frame i of a SyntheticWriter is a pattern from 0 to 15 plus i
+    assert lines[1].startswith("5 (1, 0) data min 5 max 20")
+
+    assert cli.main(args) == 0
+    out = capsys.readouterr().out
+    assert out.startswith("0 (0, 0) data\n[[")
+    assert "19 (3, 4) data" in out
+
+
+def test_check(scan, tmp_path, capsys):
+    assert cli.main(["check", scan, "--datasets", "data"]) == 0
+    assert "ready" in capsys.readouterr().out
+
+    missing = str(tmp_path / "missing.h5")
+    args = ["check", scan, missing, "--datasets", "data", "--timeout", "0.2"]
+    assert cli.main(args) == 1
+
+    out = capsys.readouterr().out
+    assert f"{scan}: ready" in out
+    assert f"{missing}: NOT READY" in out
+
+
+def test_bench(scan, capsys):
+    args = ["bench", scan, "--data", "data", "--finished", "finished"]
+
+    # the h5py and direct modes follow the keys
+    assert cli.main(args) == 2
+    capsys.readouterr()
+
+    assert cli.main(args + ["--keys", "key", "--json"]) == 0
+    results = json.loads(capsys.readouterr().out)
+
+    assert sorted(results) == ["chunk", "direct", "h5py"]
+    assert results["h5py"]["items"] == 20
+    assert results["chunk"]["items"] == 4
+    for mode in ["h5py", "chunk"]:
+        assert results[mode]["frames"] == 20
+        assert results[mode]["frames_per_second"] > 0
+
+    # uncompressed, five frames per chunk, FrameReader would fall back to h5py
+    assert "unavailable" in results["direct"]
+    assert cli.main(args + ["--keys", "key", "--modes", "direct"]) == 0
+    assert capsys.readouterr().out.startswith("direct: unavailable")
+
+
+def test_bench_direct(tmp_path, capsys):
+    path = str(tmp_path / "scan.h5")
+    SyntheticWriter(path, (4, 5), (8, 8), rate=None, codec="blosc-lz4").run()
+    args = ["bench", path, "--data", "data", "--keys", "key", "--modes", "direct"]
+
+    assert cli.main(args + ["--finished", "finished", "--json"]) == 0
+    results = json.loads(capsys.readouterr().out)
+
+    assert results["direct"]["items"] == 20
+    assert results["direct"]["frames"] == 20
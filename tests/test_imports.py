@@ -0,0 +1,34 @@
+import pytest
+import subprocess
+import sys
+import swmr_tools
+
+
+def _loaded_modules(statement):
+    code = f"import sys; {statement}; print(' '.join(sorted(sys.modules)))"
+    out = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    )
+    return set(out.stdout.split())
+
+
+def test_package_import_is_lazy():
+    loaded = _loaded_modules("import swmr_tools")
+    assert not {"numpy", "h5py", "blosc", "swmr_tools.datasource"} & loaded
+
+
+def test_keyfollower_import():
+    loaded = _loaded_modules("from swmr_tools import KeyFollower")
+    assert "swmr_tools.keyfollower" in loaded
+    assert not {"h5py", "blosc", "swmr_tools.chunksource"} & loaded
+
+
+def test_all_names_resolve():
+    for name in swmr_tools.__all__:
+        assert getattr(swmr_tools, name) is not None
+        assert name in dir(swmr_tools)
+
+    assert isinstance(swmr_tools.__version__, str)
+
+    with pytest.raises(AttributeError):
+        swmr_tools.NotAName
@@ -0,0 +1,141 @@
+import gc
+import h5py
+import hdf5plugin  # noqa: F401 registers the blosc filter
+import numpy as np
+from swmr_tools import ChunkSource, DataSource, MappedChunkReader
+from swmr_tools.datasource import FrameReader
+from swmr_tools.simulator import SyntheticWriter
+
+
+def test_mapped_chunk_reader(tmp_path):
+    f = str(tmp_path / "chunks.h5")
+    data = np.arange(6 * 3 * 5, dtype=">f4").reshape(6, 3, 5)
+
+    with h5py.File(f, "w", libver="latest") as fh:
+        fh.create_dataset("data", data=data, chunks=(2, 3, 5))
+        fh.create_dataset("gzip", data=data, chunks=(2, 3, 5), compression="gzip")
+        fh.create_dataset("contiguous", data=data)
+        empty = fh.create_dataset(
+            "empty", shape=(6, 3, 5), dtype="f4", chunks=(2, 3, 5)
+        )
+        empty[2:4] = 1
+
+    with h5py.File(f, "r", libver="latest", swmr=True) as fh:
+        reader = MappedChunkReader(fh["data"])
+        assert reader.available
+
+        chunk = reader.read_chunk((2, 0, 0))
+        assert chunk.dtype == data.dtype
+        assert not chunk.flags.writeable
+        assert np.all(chunk == data[2:4])
+
+        # the view outlives the reader and its map
+        reader.close()
+        del reader
+        gc.collect()
+        assert np.all(chunk == data[2:4])
+        reader = MappedChunkReader(fh["data"])
+        reader.read_chunk((2, 0, 0))
+        assert np.all(reader.read_chunk((4, 0, 0)) == data[4:6])
+        assert reader.mapped_reads == 2
+
+        assert not MappedChunkReader(fh["gzip"]).available
+        assert not MappedChunkReader(fh["contiguous"]).available
+
+        # unwritten chunks and chunks outside the shape fall back
+        reader = MappedChunkReader(fh["empty"])
+        assert reader.read_chunk((0, 0, 0)) is None
+        assert np.all(reader.read_chunk((2, 0, 0)) == 1)
+        assert reader.read_chunk((8, 0, 0)) is None
+        assert reader.fallback_reads == 2
+
+
+def test_mapped_chunk_reader_growing_file(tmp_path):
+    f = str(tmp_path / "live.h5")
+
+    with h5py.File(f, "w", libver="latest") as fw:
+        ds = fw.create_dataset(
+            "data",
+            shape=(0, 16, 16),
+            maxshape=(None, 16, 16),
+            dtype="f4",
+            chunks=(1, 16, 16),
+        )
+        fw.swmr_mode = True
+
+        with h5py.File(f, "r", libver="latest", swmr=True) as fr:
+            reader = MappedChunkReader(fr["data"])
+
+            for i in range(20):
+                ds.resize((i + 1, 16, 16))
+                ds[i] = i
+                ds.flush()
+                fr["data"].refresh()
+
+                # each new chunk is past the end of the previous map
+                assert np.all(reader.read_chunk((i, 0, 0)) == i)
+
+            assert reader.mapped_reads == 20
+
+
+def test_frame_reader_mmap(tmp_path):
+    f = str(tmp_path / "frames.h5")
+    data = np.arange(4 * 6 * 8, dtype=np.uint16).reshape(4, 6, 8)
+
+    with h5py.File(f, "w") as fh:
+        grid = data[..., None].repeat(2, -1)
+        fh.create_dataset("split", data=grid, chunks=(1, 1, 4, 2))
+        fh.create_dataset("grid", data=grid, chunks=(2, 3, 8, 2))
+
+    with h5py.File(f, "r") as fh:
+        # chunks split a frame, so frames are read with h5py
+        assert FrameReader(fh["split"], 2, use_mmap=True).mapped is None
+
+        fr = FrameReader(fh["grid"], 2, use_mmap=True)
+        assert fr.mapped is not None
+
+        for index in range(24):
+            frame, slices = fr.read_frame(index)
+            pos = np.unravel_index(index, (4, 6))
+            assert frame.shape == (1, 1, 8, 2)
+            assert np.all(frame[0, 0, :, 0] == data[pos])
+            assert slices == (slice(pos[0], pos[0] + 1), slice(pos[1], pos[1] + 1))
+
+
+def test_sources_mmap(tmp_path):
+    f = str(tmp_path / "scan.h5")
+    SyntheticWriter(f, (3, 10), (8, 8), rate=None, frames_per_chunk=4).run()
+
+    with h5py.File(f, "r", libver="latest", swmr=True) as fh:
+        # one handle to the data shared by every source, HDF5 2.0 can mix up
+        # chunk offsets when a dataset is refreshed with another handle open
+        data = fh["data"]
+        args = ([fh["key"]], {"data": data})
+        kwargs = {"finished_dataset": fh["finished"]}
+
+        expected = [d["data"] for d in DataSource(*args, **kwargs)]
+        df = DataSource(*args, use_mmap=True, **kwargs)
+        frames = [d["data"] for d in df]
+
+        assert len(frames) == 30
+        assert all(np.array_equal(a, b) for a, b in zip(frames, expected))
+        assert df.frame_readers["data"].mapped.mapped_reads == 30
+
+        expected = [c["data"] for c in ChunkSource({"data": data}, **kwargs)]
+        cs = ChunkSource({"data": data}, read_ahead=2, use_mmap=True, **kwargs)
+        chunks = [c["data"] for c in cs]
+
+        # the last chunk of each row is trimmed to the two frames written
+        assert [c.shape[1] for c in chunks] == [4, 4, 2] * 3
+        assert all(np.array_equal(a, b) for a, b in zip(chunks, expected))
+        assert cs._plans[0].mapped.mapped_reads == 9
+
+
+def test_chunksource_mmap_compressed(tmp_path):
+    f = str(tmp_path / "scan.h5")
+    SyntheticWriter(f, (8,), (8, 8), rate=None, codec="blosc-lz4").run()
+
+    with h5py.File(f, "r", libver="latest", swmr=True) as fh:
+        cs = ChunkSource({"data": fh["data"]}, timeout=0.1, use_mmap=True)
+        assert cs._plans[0].mapped is None
+        assert len(list(cs)) == 8
@@ -0,0 +1,111 @@
+import h5py
+import os
+import time
+import numpy as np
+from swmr_tools import LiveNXdata, utils
+
+
+def test_live_nxdata(tmp_path):
+    f = str(tmp_path / "live.h5")
+    scan_shape = [4, 5]
+    xs = np.linspace(0, 1, 5)
+    ys = np.linspace(10, 20, 4)
+
+    with h5py.File(f, "w", libver="latest") as fh:
+        nx = LiveNXdata(
+            fh,
+            (2,),
+            scan_rank=2,
+            axes={"x": 1, "y": 0},
+            frame_axes=["energy"],
+            flush_interval=60,
+            batch_size=5,
+        )
+        fh.swmr_mode = True
+
+        for i in range(12):
+            pos = utils.get_position_snake(i, scan_shape, 2)
+            slices = tuple(slice(p, p + 1) for p in pos)
+            nx.append(np.array([i, -i]), slices, {"x": xs[pos[1]], "y": ys[pos[0]]})
+
+            if i == 9:
+                # two batches of five written, grown to the extent written
+                assert nx.data.shape == (2, 5, 2)
+                assert nx.axes["y"].shape == (2,)
+
+        nx.close()
+        assert nx.data.shape == (3, 5, 2)
+
+    with h5py.File(f, "r") as fh:
+        nxdata = fh["entry/data"]
+        assert fh.attrs["default"] == "entry"
+        assert nxdata.attrs["NX_class"] == "NXdata"
+        assert nxdata.attrs["signal"] == "data"
+        assert list(nxdata.attrs["axes"]) == ["y", "x", "energy"]
+        assert nxdata.attrs["x_indices"] == 1
+        assert np.allclose(nxdata["x"][...], xs)
+        assert np.allclose(nxdata["y"][...], ys[:3])
+
+        for i in range(12):
+            pos = utils.get_position_snake(i, scan_shape, 2)
+            assert np.all(nxdata["data"][tuple(pos)] == [i, -i])
+
+
+def test_live_nxdata_scalar_interval(tmp_path):
+    f = str(tmp_path / "live.h5")
+
+    with h5py.File(f, "w", libver="latest") as fh:
+        nx = LiveNXdata(fh, (), axes={"t": 0}, flush_interval=0)
+
+        for i in range(3):
+            nx.append(i * 2.0, (slice(i, i + 1),), {"t": i * 0.1})
+            assert nx.data.shape == (i + 1,)
+
+        nx.close()
+
+    with h5py.File(f, "r") as fh:
+        assert np.all(fh["entry/data/data"][...] == [0, 2, 4])
+        assert np.allclose(fh["entry/data/t"][...], [0, 0.1, 0.2])
+
+
+def test_live_nxdata_map_size(tmp_path):
+    # a small map of scalars stays a small file
+    for chunks in (None, (1, 100)):
+        f = str(tmp_path / "map.h5")
+
+        with h5py.File(f, "w", libver="latest") as fh:
+            nx = LiveNXdata(fh, (), scan_rank=2, flush_interval=60, chunks=chunks)
+            if chunks is not None:
+                assert nx.data.chunks == chunks
+
+            for i in range(100 * 100):
+                pos = divmod(i, 100)
+                nx.append(float(i), tuple(slice(p, p + 1) for p in pos))
+
+            nx.close()
+
+        assert os.path.getsize(f) < 2**19
+
+        with h5py.File(f, "r") as fh:
+            assert np.all(fh["entry/data/data"][...].ravel() == np.arange(10000))
+
+
+def test_live_nxdata_stalled(tmp_path):
+    f = str(tmp_path / "live.h5")
+
+    with h5py.File(f, "w", libver="latest") as fh:
+        nx = LiveNXdata(fh, (), axes={"t": 0}, flush_interval=0.1)
+        fh.swmr_mode = True
+
+        with h5py.File(f, "r", libver="latest", swmr=True) as fr:
+            nx.append(2.0, (slice(0, 1),), {"t": 0.5})
+            assert fr["entry/data/data"].shape == (0,)
+
+            # no more points arrive, the buffer is written anyway
+            time.sleep(0.5)
+            fr["entry/data/data"].refresh()
+            fr["entry/data/t"].refresh()
+            assert fr["entry/data/data"][...].tolist() == [2.0]
+            assert fr["entry/data/t"][...].tolist() == [0.5]
+
+        nx.close()
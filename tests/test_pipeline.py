@@ -0,0 +1,137 @@
+import h5py
+import hdf5plugin  # noqa: F401 registers the blosc filter
+import numpy as np
+import pytest
+import time
+from swmr_tools import ChunkSource, DataSource, Pipeline
+from swmr_tools.simulator import SyntheticWriter, synthetic_frame
+
+
+def _double(x):
+    return 2 * x
+
+
+def _slow_odd_first(x):
+    # odd items take longer, so unordered results arrive out of order
+    time.sleep(0.02 if x % 2 else 0.001)
+    return x
+
+
+def test_pipeline_ordered():
+    pipeline = Pipeline(range(50), max_queue=4)
+    pipeline.add_stage(_slow_odd_first, workers=4)
+    pipeline.add_stage(lambda x: x if x % 5 else None, name="filter")
+    pipeline.add_stage(_double, workers=3)
+
+    assert list(pipeline) == [2 * x for x in range(50) if x % 5]
+
+    metrics = pipeline.metrics()
+    assert list(metrics) == ["source", "_slow_odd_first", "filter", "_double"]
+    assert metrics["source"]["items"] == 50
+    assert metrics["filter"]["items"] == 50
+    assert metrics["filter"]["dropped"] == 10
+    assert metrics["_double"]["items"] == 40
+    assert metrics["_double"]["workers"] == 3
+
+    for m in metrics.values():
+        assert m["queue_max"] <= 4
+        assert m["throughput"] > 0
+
+
+def test_pipeline_unordered():
+    pipeline = Pipeline(range(40))
+    pipeline.add_stage(_slow_odd_first, workers=4, ordered=False)
+    out = list(pipeline)
+
+    assert sorted(out) == list(range(40))
+    assert out != list(range(40))
+
+
+def test_pipeline_processes():
+    pipeline = Pipeline(np.arange(20))
+    pipeline.add_stage(_double, workers=2, processes=True)
+
+    assert pipeline.run() == 20
+    assert list(Pipeline(range(3)).add_stage(_double, processes=True)) == [0, 2, 4]
+
+
+def test_pipeline_backpressure_and_bottleneck():
+    pipeline = Pipeline(range(30), max_queue=2)
+    pipeline.add_stage(lambda x: x, name="fast")
+    pipeline.add_stage(lambda x: time.sleep(0.01), name="slow")
+    assert pipeline.run() == 0
+
+    metrics = pipeline.metrics()
+    assert pipeline.bottleneck() == "slow"
+    # the stages before the slow one wait on its full queue
+    assert metrics["fast"]["blocked"] > 0.1
+    assert metrics["slow"]["queue_max"] == 2
+    assert metrics["slow"]["dropped"] == 30
+
+
+def test_pipeline_error():
+    def fail(x):
+        if x == 5:
+            raise ValueError("bad item")
+        return x
+
+    pipeline = Pipeline(range(100))
+    pipeline.add_stage(fail, workers=2)
+
+    with pytest.raises(RuntimeError, match="stage fail failed"):
+        pipeline.run()
+
+    with pytest.raises(RuntimeError):
+        pipeline.add_stage(_double)
+
+
+def test_pipeline_stop_early():
+    pipeline = Pipeline(iter(range(1000)), max_queue=2)
+    pipeline.add_stage(_double, workers=2)
+
+    for x in pipeline:
+        if x == 10:
+            break
+
+    # closing the iterator stops every thread
+    assert not any(t.is_alive() for t in pipeline._threads)
+
+
+def test_pipeline_live_datasource(tmp_path):
+    f = str(tmp_path / "scan.h5")
+    writer = SyntheticWriter(f, (30,), (8, 8), rate=200, frames_per_chunk=2)
+    writer.run()
+
+    with h5py.File(f, "r", libver="latest", swmr=True) as fh:
+        df = DataSource(
+            [fh["key"]], {"data": fh["data"]}, finished_dataset=fh["finished"]
+        )
+        pipeline = Pipeline(df)
+        pipeline.add_stage(lambda d: (d.index, d["data"].sum()), workers=2)
+        sums = list(pipeline)
+
+        assert pipeline.is_scan_finished()
+        assert not pipeline.has_timed_out()
+
+    expected = [(i, synthetic_frame(i, (8, 8)).sum()) for i in range(30)]
+    assert sums == expected
+
+
+def test_pipeline_chunksource_timeout(tmp_path):
+    f = str(tmp_path / "scan.h5")
+    writer = SyntheticWriter(
+        f, (12,), (8, 8), rate=None, frames_per_chunk=4, codec="blosc-lz4"
+    )
+    writer.run()
+
+    with h5py.File(f, "r", libver="latest", swmr=True) as fh:
+        # without the finished flag, the source stops on its timeout
+        cs = ChunkSource({"data": fh["data"]}, timeout=0.2)
+        pipeline = Pipeline(cs)
+        total = []
+        pipeline.add_stage(lambda chunk: total.append(chunk["data"].shape[0]))
+        pipeline.run()
+
+        assert sum(total) == 12
+        assert pipeline.has_timed_out()
+        assert not pipeline.is_scan_finished()
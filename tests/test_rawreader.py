@@ -0,0 +1,194 @@
+import gc
+import h5py
+import hdf5plugin  # noqa: F401 registers the blosc filter
+import numpy as np
+from swmr_tools import ChunkSource, RawChunkReader
+from swmr_tools.simulator import SyntheticWriter, synthetic_frame
+import weakref
+
+
+def test_raw_chunk_reader(tmp_path):
+    f = str(tmp_path / "chunks.h5")
+    data = np.arange(6 * 3 * 5, dtype=np.int32).reshape(6, 3, 5)
+
+    with h5py.File(f, "w", libver="latest") as fh:
+        fh.create_dataset("gzip", data=data, chunks=(2, 3, 5), compression="gzip")
+        fh.create_dataset("contiguous", data=data)
+        empty = fh.create_dataset(
+            "empty", shape=(6, 3, 5), dtype="i4", chunks=(2, 3, 5)
+        )
+        empty[2:4] = 1
+
+    with h5py.File(f, "r", libver="latest", swmr=True) as fh:
+        reader = RawChunkReader(fh["gzip"])
+        assert reader.available
+
+        for offset in [(0, 0, 0), (2, 0, 0), (4, 0, 0)]:
+            assert reader.read_chunk(offset) == fh["gzip"].id.read_direct_chunk(offset)
+        assert reader.raw_reads == 3
+
+        reader.close()
+        # opened again on the next read
+        assert reader.read_chunk((2, 0, 0)) is not None
+
+        assert not RawChunkReader(fh["contiguous"]).available
+
+        # unwritten chunks and chunks outside the shape fall back
+        reader = RawChunkReader(fh["empty"])
+        assert reader.read_chunk((0, 0, 0)) is None
+        assert reader.read_chunk((2, 0, 0)) is not None
+        assert reader.read_chunk((8, 0, 0)) is None
+        assert reader.fallback_reads == 2
+
+
+def test_raw_chunk_reader_relocated(tmp_path):
+    f = str(tmp_path / "live.h5")
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 2**30, size=(1, 64, 64), dtype=np.int32)
+
+    with h5py.File(f, "w", libver="latest") as fw:
+        ds = fw.create_dataset(
+            "data",
+            shape=(4, 64, 64),
+            dtype="i4",
+            chunks=(1, 64, 64),
+            compression="gzip",
+        )
+        ds[...] = 0
+        fw.swmr_mode = True
+
+        with h5py.File(f, "r", libver="latest", swmr=True) as fr:
+            reader = RawChunkReader(fr["data"])
+            first = reader.read_chunk((1, 0, 0))
+
+            # rewritten chunks compress to more bytes and are stored elsewhere
+            ds[1] = noise[0]
+            ds[2] = noise[0]
+            ds.flush()
+            fr["data"].refresh()
+            reader.refresh()
+
+            mask, blob = reader.read_chunk((1, 0, 0))
+            assert blob != first[1]
+            assert blob == fr["data"].id.read_direct_chunk((1, 0, 0))[1]
+            assert reader.relocated == 2
+
+
+def test_chunksource_pread(tmp_path):
+    f = str(tmp_path / "scan.h5")
+    SyntheticWriter(
+        f, (3, 10), (8, 8), rate=None, frames_per_chunk=4, codec="blosc-lz4"
+    ).run()
+
+    with h5py.File(f, "r", libver="latest", swmr=True) as fh:
+        data = fh["data"]
+        kwargs = {"finished_dataset": fh["finished"]}
+
+        expected = [c["data"] for c in ChunkSource({"data": data}, **kwargs)]
+        cs = ChunkSource(
+            {"data": data}, read_ahead=3, max_workers=4, use_pread=True, **kwargs
+        )
+        chunks = [c["data"] for c in cs]
+
+        assert [c.shape[1] for c in chunks] == [4, 4, 2] * 3
+        assert all(np.array_equal(a, b) for a, b in zip(chunks, expected))
+        assert np.all(chunks[4][0, 1] == synthetic_frame(15, (8, 8)))
+        assert cs._plans[0].raw.raw_reads == 9
+
+
+def test_chunksource_pread_fallback(tmp_path):
+    f = str(tmp_path / "scan.h5")
+    SyntheticWriter(f, (8,), (8, 8), rate=None, codec="blosc-lz4").run()
+
+    with h5py.File(f, "r", libver="latest", swmr=True) as fh:
+        cs = ChunkSource({"data": fh["data"]}, timeout=0.1, use_pread=True)
+        plan = cs._plans[0]
+        assert np.all(cs[3]["data"] == synthetic_frame(3, (8, 8)))
+
+        # a stale location, the bytes read do not decode
+        location = plan.raw._locations._index[(5, 0, 0)]
+        plan.raw._locations._index[(5, 0, 0)] = (location[0] + 7,) + location[1:]
+
+        assert np.all(cs[5]["data"] == synthetic_frame(5, (8, 8)))
+        assert (5, 0, 0) not in plan.raw._locations._index
+        assert np.all(cs[5]["data"] == synthetic_frame(5, (8, 8)))
+
+
+def test_raw_chunk_reader_consume(tmp_path):
+    f = str(tmp_path / "chunks.h5")
+
+    with h5py.File(f, "w", libver="latest") as fh:
+        data = np.arange(100 * 4, dtype=np.int32).reshape(100, 4)
+        fh.create_dataset("data", data=data, chunks=(1, 4), compression="gzip")
+
+    with h5py.File(f, "r", libver="latest", swmr=True) as fh:
+        reader = RawChunkReader(fh["data"])
+        locations = reader._locations
+        walks = []
+        read_index = locations._read_index
+        locations._read_index = lambda: walks.append(1) or read_index()
+
+        # the first read walks the whole index, consumed chunks are dropped
+        for i in range(98):
+            assert reader.read_chunk((i, 0), consume=True) is not None
+        assert len(walks) == 1
+        assert sorted(locations._index) == [(98, 0), (99, 0)]
+
+        # after a refresh only the two chunks left are looked up again
+        reader.refresh()
+        assert reader.read_chunk((99, 0), consume=True) is not None
+        assert len(walks) == 1
+        assert list(locations._index) == [(98, 0)]
+
+
+def test_chunksource_pread_live(tmp_path):
+    f = str(tmp_path / "live.h5")
+
+    with h5py.File(f, "w", libver="latest") as fw:
+        ds = fw.create_dataset(
+            "data",
+            shape=(0, 4),
+            maxshape=(None, 4),
+            dtype="i4",
+            chunks=(2, 4),
+            compression="gzip",
+        )
+        fw.swmr_mode = True
+
+        with h5py.File(f, "r", libver="latest", swmr=True) as fr:
+            cs = ChunkSource({"data": fr["data"]}, timeout=0.1, use_pread=True)
+            plan = cs._plans[0]
+
+            for n in range(10):
+                ds.resize((2 * n + 2, 4))
+                ds[2 * n : 2 * n + 2] = n
+                ds.flush()
+
+                chunk = next(cs)
+                assert np.all(chunk["data"] == n)
+                # nothing kept for the chunks already read
+                assert plan.raw._locations._index == {}
+
+            assert plan.raw.raw_reads == 10
+
+
+def test_chunksource_pread_released(tmp_path):
+    f = str(tmp_path / "scan.h5")
+    SyntheticWriter(f, (4,), (8, 8), rate=None, codec="blosc-lz4").run()
+
+    with h5py.File(f, "r", libver="latest", swmr=True) as fh:
+        gc.disable()
+        try:
+            cs = ChunkSource(
+                {"data": fh["data"]}, timeout=0.1, use_pread=True, use_mmap=True
+            )
+            assert np.all(cs[1]["data"] == synthetic_frame(1, (8, 8)))
+            source = weakref.ref(cs)
+            dataset = weakref.ref(cs._plans[0].dataset)
+
+            # freed without the garbage collector, closing the dataset
+            del cs
+            assert source() is None
+            assert dataset() is None
+        finally:
+            gc.enable()
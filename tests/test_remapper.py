@@ -0,0 +1,61 @@
+import h5py
+import hdf5plugin
+import math
+import numpy as np
+import pytest
+from swmr_tools import ChunkRemapper, utils
+
+
+def _create_stacks(path, n_points, chunk_size, **kwargs):
+    with h5py.File(path, "w") as fh:
+        for i, name in enumerate(["data", "sum"]):
+            values = np.arange(n_points * 6, dtype=np.int32).reshape(n_points, 2, 3)
+            fh.create_dataset(
+                name, data=values + i * 1000, chunks=(chunk_size, 2, 3), **kwargs
+            )
+
+
+def _expected(stack, scan_shape, snake):
+    out = np.zeros(tuple(scan_shape) + stack.shape[1:], dtype=stack.dtype)
+    for i in range(math.prod(scan_shape)):
+        if snake:
+            position = utils.get_position_snake(i, scan_shape, len(scan_shape))
+        else:
+            position = utils.get_position(i, scan_shape, len(scan_shape))
+        out[tuple(position)] = stack[i]
+    return out
+
+
+@pytest.mark.parametrize("chunk_size", [4, 5, 11])
+@pytest.mark.parametrize("snake", [False, True])
+@pytest.mark.parametrize("max_workers", [None, 2])
+def test_remapper(tmp_path, chunk_size, snake, max_workers):
+    scan_shape = [3, 4, 10]
+    n_points = math.prod(scan_shape)
+    ipath = str(tmp_path / "in.h5")
+    opath = str(tmp_path / "out.h5")
+    _create_stacks(ipath, n_points, chunk_size, **hdf5plugin.Blosc())
+
+    with h5py.File(ipath, "r") as fh, h5py.File(opath, "w") as ofh:
+        datasets = {"data": fh["data"], "sum": fh["sum"]}
+        remapper = ChunkRemapper(
+            datasets, ofh, scan_shape, snake=snake, timeout=0.1, max_workers=max_workers
+        )
+        assert remapper.run() == math.ceil(n_points / chunk_size)
+
+        assert ofh["data"].chunks == (1, 1, min(chunk_size, 10), 2, 3)
+
+        for name, ds in datasets.items():
+            expected = _expected(ds[...], scan_shape, snake)
+            assert np.all(ofh[name][...] == expected)
+
+
+def test_remapper_tiled(tmp_path):
+    path = str(tmp_path / "in.h5")
+
+    with h5py.File(path, "w") as fh:
+        fh.create_dataset("data", shape=(10, 4, 4), chunks=(2, 2, 4), dtype=np.int8)
+
+    with h5py.File(path, "r") as fh, h5py.File(tmp_path / "out.h5", "w") as ofh:
+        with pytest.raises(RuntimeError):
+            ChunkRemapper({"data": fh["data"]}, ofh, [2, 5])
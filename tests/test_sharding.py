@@ -0,0 +1,179 @@
+import h5py
+import hdf5plugin  # noqa: F401 registers the blosc filter
+import numpy as np
+import pytest
+from swmr_tools import ChunkSource, DataSource, utils
+from swmr_tools.simulator import SyntheticWriter, synthetic_frame
+
+
+def test_shard_units_and_assignment():
+    # a [2, 5] scan chunked [1, 2], chunk number of each point
+    units = utils.get_shard_units(np.arange(10), (2, 5), (1, 2))
+    assert list(units) == [0, 0, 1, 1, 2, 3, 3, 4, 4, 5]
+    assert utils.count_shard_units((2, 5), (1, 2)) == 6
+    assert utils.count_shard_units((None, 5), (1, 2)) is None
+
+    # unbounded first dimension
+    assert utils.get_shard_units(17, (None, 5), (1, 2)) == 3 * 3 + 1
+    assert (
+        list(utils.get_shard_units(np.arange(6), (None,), unit=4)) == [0] * 4 + [1] * 2
+    )
+
+    assert list(utils.get_shard(np.arange(6), 4)) == [0, 1, 2, 3, 0, 1]
+    assert list(utils.get_shard(np.arange(6), 4, "block", 6)) == [0, 0, 1, 1, 2, 2]
+
+    with pytest.raises(RuntimeError):
+        utils.get_shard(0, 2, "block")
+
+    with pytest.raises(RuntimeError):
+        utils.get_shard(0, 2, "random")
+
+
+def _write_scan(path, scan_shape, frames_per_chunk, codec=None):
+    SyntheticWriter(
+        path,
+        scan_shape,
+        (4, 4),
+        rate=None,
+        frames_per_chunk=frames_per_chunk,
+        codec=codec,
+    ).run()
+
+
+@pytest.mark.parametrize("assignment", ["round_robin", "block"])
+def test_datasource_shards(tmp_path, assignment):
+    f = str(tmp_path / "scan.h5")
+    _write_scan(f, (4, 5), 2)
+
+    seen = {}
+    with h5py.File(f, "r", libver="latest", swmr=True) as fh:
+        for shard_id in range(3):
+            df = DataSource(
+                [fh["key"]],
+                {"data": fh["data"]},
+                timeout=0.2,
+                finished_dataset=fh["finished"],
+                shard_id=shard_id,
+                num_shards=3,
+                shard_assignment=assignment,
+            )
+            for d in df:
+                assert d.index not in seen
+                seen[d.index] = shard_id
+                assert np.all(d["data"][0] == synthetic_frame(d.index, (4, 4)))
+
+            assert df.is_scan_finished()
+
+    assert sorted(seen) == list(range(20))
+
+    # the frames of a chunk go to the same shard
+    for row in range(4):
+        for c in range(0, 5, 2):
+            owners = {seen[row * 5 + i] for i in range(c, min(c + 2, 5))}
+            assert len(owners) == 1
+
+    if assignment == "block":
+        assert [seen[i] for i in range(0, 20, 5)] == [0, 0, 1, 2]
+
+
+def test_datasource_shard_unit(tmp_path):
+    f = str(tmp_path / "scan.h5")
+    _write_scan(f, (12,), 1)
+
+    with h5py.File(f, "r", libver="latest", swmr=True) as fh:
+        df = DataSource(
+            [fh["key"]],
+            {"data": fh["data"]},
+            finished_dataset=fh["finished"],
+            shard_id=1,
+            num_shards=2,
+            shard_unit=3,
+        )
+        assert [d.index for d in df] == [3, 4, 5, 9, 10, 11]
+
+        with pytest.raises(RuntimeError):
+            DataSource([fh["key"]], {"data": fh["data"]}, shard_id=2, num_shards=2)
+
+
+@pytest.mark.parametrize("assignment", ["round_robin", "block"])
+def test_chunksource_shards(tmp_path, assignment):
+    f = str(tmp_path / "scan.h5")
+    _write_scan(f, (22,), 2, codec="blosc-lz4")
+
+    starts = []
+    with h5py.File(f, "r", libver="latest", swmr=True) as fh:
+        for shard_id in range(3):
+            cs = ChunkSource(
+                {"data": fh["data"]},
+                timeout=0.2,
+                read_ahead=2,
+                shard_id=shard_id,
+                num_shards=3,
+                shard_assignment=assignment,
+            )
+            assert cs.available_chunks() == (4 if shard_id < 2 else 3)
+
+            shard = [c.index for c in cs]
+            if assignment == "round_robin":
+                assert shard == list(range(2 * shard_id, 22, 6))
+            starts.extend(shard)
+
+    assert sorted(starts) == list(range(0, 22, 2))
+
+
+def test_chunksource_empty_shards(tmp_path):
+    f = str(tmp_path / "scan.h5")
+    _write_scan(f, (6,), 2)
+
+    with h5py.File(f, "r", libver="latest", swmr=True) as fh:
+        for assignment in utils.SHARD_ASSIGNMENTS:
+            # more shards than chunks
+            starts = []
+            for shard_id in range(4):
+                cs = ChunkSource(
+                    {"data": fh["data"]},
+                    finished_dataset=fh["finished"],
+                    shard_id=shard_id,
+                    num_shards=4,
+                    shard_assignment=assignment,
+                )
+                shard = [c.index for c in cs]
+                assert len(shard) <= 1
+                assert cs.is_scan_finished()
+                starts.extend(shard)
+
+            assert sorted(starts) == [0, 2, 4]
+
+
+def test_merge_shards(tmp_path):
+    f = str(tmp_path / "scan.h5")
+    _write_scan(f, (4, 5), 2)
+
+    out = h5py.File(str(tmp_path / "out.h5"), "w")
+
+    with out, h5py.File(f, "r", libver="latest", swmr=True) as fh:
+        results = []
+        for shard_id in range(2):
+            df = DataSource(
+                [fh["key"]],
+                {"data": fh["data"]},
+                finished_dataset=fh["finished"],
+                shard_id=shard_id,
+                num_shards=2,
+                shard_assignment="block",
+            )
+            result = None
+            for d in df:
+                s = np.array([d["data"].sum()])
+                if result is None:
+                    result = df.create_dataset(s, out, f"shard{shard_id}")
+                df.append_data(s, d.slice_metadata, result)
+            results.append(result)
+
+        merged = out.create_dataset("sum", shape=(4, 5, 1), dtype=results[0].dtype)
+        chunks = fh["data"].chunks[:2]
+        n = utils.merge_shards(results, merged, 2, "block", chunks)
+
+        assert n == 20
+        expected = [synthetic_frame(i, (4, 4)).sum() for i in range(20)]
+        assert np.all(merged[...].reshape(-1) == expected)
@@ -0,0 +1,76 @@
+import h5py
+import hdf5plugin  # noqa: F401
+import numpy as np
+import time
+from swmr_tools import DataSource, SyntheticWriter, utils
+from swmr_tools.simulator import synthetic_frame
+
+
+def test_synthetic_writer_follow(tmp_path):
+    f = str(tmp_path / "scan.h5")
+    scan_shape = (3, 5)
+    writer = SyntheticWriter(
+        f,
+        scan_shape,
+        (8, 6),
+        rate=50,
+        frames_per_chunk=2,
+        codec="blosc-lz4",
+        snake=True,
+        flush_every=2,
+    )
+    p = writer.start()
+
+    assert utils.check_file_readable(f, ["/data", "/key", "/finished"], timeout=5)
+
+    with h5py.File(f, "r", libver="latest", swmr=True) as fh:
+        assert fh["data"].chunks == (1, 2, 8, 6)
+        df = DataSource(
+            [fh["key"]],
+            {"data": fh["data"]},
+            timeout=2,
+            finished_dataset=fh["finished"],
+        )
+
+        count = 0
+        for d in df:
+            frame = d["data"][(0,) * len(scan_shape)]
+            index = int(frame[0, 0]) - int(synthetic_frame(0, (8, 6))[0, 0])
+            pos = utils.get_position_snake(index, scan_shape, 2)
+            assert tuple(s.start for s in d.slice_metadata) == tuple(pos)
+            assert np.all(frame == synthetic_frame(index, (8, 6)))
+            count += 1
+
+    p.join()
+    assert count == 15
+
+
+def test_synthetic_writer_interleaved(tmp_path):
+    f = str(tmp_path / "scan.h5")
+    writer = SyntheticWriter(f, (11,), (4,), rate=None, n_writers=3, codec="deflate")
+    writer.run()
+
+    assert len(writer.writer_paths()) == 3
+
+    with h5py.File(f, "r") as fh:
+        assert fh["finished"][0] == 1
+        assert fh["data"].is_virtual
+        assert np.all(fh["key"][...] == np.arange(1, 12))
+        for i in range(11):
+            assert np.all(fh["data"][i] == synthetic_frame(i, (4,)))
+
+    with h5py.File(writer.writer_paths()[1], "r") as fh:
+        assert fh["data"].shape == (4, 4)
+        assert np.all(fh["data"][0] == synthetic_frame(1, (4,)))
+
+
+def test_synthetic_writer_stall(tmp_path):
+    f = str(tmp_path / "scan.h5")
+    writer = SyntheticWriter(f, (4,), (2, 2), rate=None, stalls={2: 0.3})
+
+    start = time.monotonic()
+    writer.run()
+    assert time.monotonic() - start >= 0.3
+
+    with h5py.File(f, "r") as fh:
+        assert np.all(fh["key"][...] == [1, 2, 3, 4])
@@ -1,6 +1,7 @@
 from swmr_tools import utils
 import numpy as np
 import h5py
+import time
 
 
 def test_row_slice():
@@ -279,3 +280,212 @@ def test_convert_stack_to_grid():
     print(new_location)
 
     assert new_location == expected
+
+
+def test_get_positions_vectorised():
+    for shape in ([7], [3, 4], [3, 4, 5], [2, 3, 4, 5]):
+        rank = len(shape)
+        indices = np.arange(np.prod(shape))
+
+        positions = utils.get_positions(indices, shape, rank)
+        snake, snake_row = utils.get_positions_snake_row(indices, shape, rank)
+        rows = utils.get_row_positions(indices, shape, rank)
+
+        for i in indices:
+            assert tuple(positions[i]) == tuple(utils.get_position(i, shape, rank))
+            pos, row = utils.get_position_snake_row(i, shape, rank)
+            assert tuple(snake[i]) == tuple(pos)
+            assert snake_row[i] == row
+            row_slice = utils.get_row_slice(i, shape, rank)
+            assert tuple(rows[i]) == tuple(s.start for s in row_slice[:-1])
+
+        assert np.all(utils.get_positions_snake(indices, shape, rank) == snake)
+
+
+def test_get_grid_indices():
+    scan_shape = [3, 4, 5]
+    stack = np.arange(60) * 10
+
+    for snake in (False, True):
+        grid = np.zeros(scan_shape, dtype=stack.dtype)
+        grid.reshape(-1)[
+            utils.get_grid_indices(np.arange(60), scan_shape, snake)
+        ] = stack
+
+        for i in range(60):
+            if snake:
+                pos = utils.get_position_snake(i, scan_shape, 3)
+            else:
+                pos = utils.get_position(i, scan_shape, 3)
+            assert grid[tuple(pos)] == stack[i]
+
+
+def test_data_appender_stack(tmp_path):
+    f = str(tmp_path / "scan.h5")
+    n = 5000
+
+    with h5py.File(f, "w") as fh:
+        ds = utils.create_dataset(np.zeros(1), (None,), fh, "scalar")
+        shapes = set()
+
+        with utils.DataAppender(ds, block_size=100, flush_interval=60) as appender:
+            for i in range(n):
+                appender.append(np.array([i]), (slice(i, i + 1),))
+                shapes.add(ds.shape)
+
+        # geometric growth, not one resize per point
+        assert len(shapes) < 20
+        assert ds.shape == (n, 1)
+
+    with h5py.File(f, "r") as fh:
+        assert np.all(fh["scalar"][:, 0] == np.arange(n))
+
+
+def test_data_appender_grid(tmp_path):
+    f = str(tmp_path / "scan.h5")
+    scan_shape = (5, 7)
+    frame = np.ones((2, 3))
+
+    with h5py.File(f, "w") as fh:
+        ds = utils.create_dataset(frame * 0, scan_shape, fh, "data")
+        appender = utils.DataAppender(ds, block_size=4, flush_interval=60)
+
+        for i in range(24):
+            pos = utils.get_position_snake(i, scan_shape, 2)
+            appender.append(frame * i, tuple(slice(p, p + 1) for p in pos))
+
+        appender.close()
+
+        assert ds.shape == (4, 7, 2, 3)
+
+    with h5py.File(f, "r") as fh:
+        ds = fh["data"]
+        for i in range(24):
+            pos = utils.get_position_snake(i, scan_shape, 2)
+            assert np.all(ds[tuple(pos)] == i)
+
+
+def test_data_appender_interval(tmp_path):
+    f = str(tmp_path / "scan.h5")
+
+    with h5py.File(f, "w") as fh:
+        ds = utils.create_dataset(np.zeros(1), (100,), fh, "scalar")
+        appender = utils.DataAppender(ds, flush_interval=0)
+
+        appender.append(np.array([5]), (slice(3, 4),))
+
+        # written without waiting for a full block
+        assert ds[3, 0] == 5
+        appender.close()
+        assert ds.shape == (4, 1)
+
+
+def test_data_appender_stalled(tmp_path):
+    f = str(tmp_path / "scan.h5")
+
+    with h5py.File(f, "w", libver="latest") as fh:
+        ds = utils.create_dataset(np.zeros(1), (None,), fh, "scalar")
+        fh.swmr_mode = True
+        appender = utils.DataAppender(ds, flush_interval=0.1)
+
+        with h5py.File(f, "r", libver="latest", swmr=True) as fr:
+            appender.append(np.array([5]), (slice(0, 1),))
+            appender.append(np.array([6]), (slice(1, 2),))
+            assert fr["scalar"].shape[0] < 2
+
+            # no more frames arrive, the buffer is written anyway
+            time.sleep(0.5)
+            fr["scalar"].refresh()
+            assert fr["scalar"][:2, 0].tolist() == [5, 6]
+            assert appender._timer._thread is None
+
+        appender.close()
+        assert ds.shape == (2, 1)
+
+
+def test_plan_chunks():
+    # small frames are grouped along the scan rows
+    assert utils.plan_chunks([100, 200], [], np.float64) == (100, 200)
+    assert utils.plan_chunks([None, 50], [10], np.float32, 2**20) == (32, 50, 10)
+
+    # dimensions of unknown length get a modest share, spread between them
+    assert utils.plan_chunks([None], [1], np.float64, 2**20) == (2**13, 1)
+    assert utils.plan_chunks([None, None], [], np.float64) == (90, 91)
+    assert utils.plan_chunks([None], [], np.float64, 2**10) == (2**7,)
+    assert utils.plan_chunks([30, 50], [10], np.float32, access="frame") == (1, 1, 10)
+
+    # large frames get a chunk each, tiled if over the target
+    assert utils.plan_chunks([None, 50], [512, 512], np.uint16) == (1, 1, 512, 512)
+    assert utils.plan_chunks([None], [4096, 4096], np.uint16) == (1, 256, 4096)
+
+    c = utils.plan_chunks([None, 50], [64, 64], np.float32, 2**20, access="row")
+    assert c == (1, 50, 64, 64)
+
+
+def test_create_dataset_presets(tmp_path):
+    from swmr_tools import ChunkSource
+
+    f = str(tmp_path / "scan.h5")
+    frame = np.arange(64, dtype=np.int32).reshape(8, 8)
+
+    with h5py.File(f, "w") as fh:
+        for preset in utils.COMPRESSION_PRESETS:
+            ds = utils.create_dataset(
+                frame, (20,), fh, preset, chunk_bytes=1024, access="row", preset=preset
+            )
+            assert ds.chunks == (4, 8, 8)
+
+            for i in range(1, 20):
+                utils.append_data(frame + i, (slice(i, i + 1),), ds)
+
+    with h5py.File(f, "r") as fh:
+        for preset in utils.COMPRESSION_PRESETS:
+            assert fh[preset].compression is not None
+            chunks = list(ChunkSource({"data": fh[preset]}, timeout=0.1))
+            data = np.concatenate([c["data"] for c in chunks])
+            assert np.all(data == frame + np.arange(20).reshape(20, 1, 1))
+
+
+def test_check_files_readable(tmp_path):
+    import threading
+
+    master = str(tmp_path / "master.h5")
+    other = str(tmp_path / "other.h5")
+    detector = str(tmp_path / "detector.h5")
+
+    for path in (master, other):
+        with h5py.File(path, "w", libver="latest") as fh:
+            fh.create_dataset("dataset", data=np.ones(3))
+
+    with h5py.File(master, "a", libver="latest") as fh:
+        fh["linked"] = h5py.ExternalLink("detector.h5", "/data")
+
+    def write_detector():
+        time.sleep(0.3)
+        with h5py.File(detector, "w", libver="latest") as fh:
+            fh.create_dataset("data", data=np.ones(3))
+
+    writer = threading.Thread(target=write_detector)
+    writer.start()
+
+    files = {
+        master: ["/dataset", "/linked"],
+        other: ["/dataset"],
+        str(tmp_path / "missing.h5"): ["/dataset"],
+    }
+    results = utils.check_files_readable(files, timeout=2, keep_open=True)
+    writer.join()
+
+    assert results[master]["readable"]
+    assert results[master]["links"] == [detector]
+    assert results[other]["readable"]
+    assert results[other]["attempts"] == 1
+    assert results[detector]["readable"]
+    assert results[detector]["attempts"] > 1
+    assert not results[str(tmp_path / "missing.h5")]["readable"]
+    assert results[str(tmp_path / "missing.h5")]["handle"] is None
+    assert results[str(tmp_path / "missing.h5")]["elapsed"] >= 2
+
+    for r in results.values():
+        if r["handle"] is not None:
+            r["handle"].close()
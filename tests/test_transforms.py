@@ -0,0 +1,174 @@
+import h5py
+import hdf5plugin
+import numpy as np
+import pytest
+from swmr_tools import ChunkSource, DataSource, FrameTransform
+
+
+def test_bin_and_dtype():
+    frame = np.arange(64, dtype=np.uint32).reshape(8, 8)
+
+    t = FrameTransform(bin=4, dtype=np.uint16)
+    out = t.apply(frame, 2)
+
+    expected = frame.reshape(2, 4, 2, 4).sum(axis=(1, 3))
+
+    assert out.dtype == np.uint16
+    assert out.shape == (2, 2)
+    assert t.output_shape(frame.shape) == (2, 2)
+    assert np.all(out == expected)
+
+
+def test_crop_bin_stack():
+    stack = np.arange(3 * 6 * 7).reshape(3, 6, 7)
+
+    t = FrameTransform(bin=(2, 3), crop=(slice(1, 5), slice(0, 7)), reduce="mean")
+    out = t.apply(stack, 2)
+
+    # 7 columns do not fill three bins of 3, so the last is dropped
+    expected = stack[:, 1:5, 0:6].reshape(3, 2, 2, 2, 3).mean(axis=(2, 4))
+
+    assert out.shape == (3, 2, 2)
+    assert t.output_shape((6, 7)) == (2, 2)
+    assert np.allclose(out, expected)
+
+
+def test_dtype_clips():
+    frame = np.array([[-5, 70000]], dtype=np.int64)
+    out = FrameTransform(dtype=np.uint16).apply(frame, 2)
+    assert np.all(out == [[0, 65535]])
+
+
+def test_datasource_transform(tmp_path):
+    f = str(tmp_path / "f.h5")
+    shape = (2, 3, 4, 6)
+    data = np.arange(np.prod(shape), dtype=np.uint32).reshape(shape)
+
+    with h5py.File(f, "w") as fh:
+        fh.create_dataset(
+            "data",
+            data=data,
+            chunks=(1, 1, 4, 6),
+            **hdf5plugin.Blosc(cname="lz4", shuffle=hdf5plugin.Blosc.SHUFFLE),
+        )
+        fh.create_dataset("key", data=np.ones(shape[:2]))
+
+    t = FrameTransform(bin=2, crop=(slice(0, 4), slice(2, 6)), dtype=np.float32)
+
+    for direct in (False, True):
+        with h5py.File(f, "r") as fh:
+            df = DataSource(
+                [fh["key"]],
+                {"data": fh["data"]},
+                timeout=0.1,
+                use_direct_chunk=direct,
+                transforms={"data": t},
+            )
+
+            count = 0
+            for dset in df:
+                pos = np.unravel_index(count, shape[:2])
+                frame = data[pos][0:4, 2:6].reshape(2, 2, 2, 2).sum(axis=(1, 3))
+                assert dset["data"].shape == (1, 1, 2, 2)
+                assert dset["data"].dtype == np.float32
+                assert np.all(dset["data"][0, 0] == frame)
+                count += 1
+
+            assert count == 6
+
+
+def test_chunksource_transform(tmp_path):
+    f = str(tmp_path / "f.h5")
+    shape = (20, 4, 4)
+    data = np.arange(np.prod(shape), dtype=np.uint32).reshape(shape)
+
+    with h5py.File(f, "w") as fh:
+        fh.create_dataset(
+            "data",
+            data=data,
+            chunks=(10, 4, 4),
+            **hdf5plugin.Blosc(cname="lz4", shuffle=hdf5plugin.Blosc.SHUFFLE),
+        )
+
+    with h5py.File(f, "r") as fh:
+        t = FrameTransform(bin=2, dtype=np.uint16)
+        cs = ChunkSource({"data": fh["data"]}, timeout=0.1, transforms={"data": t})
+
+        for i, c in enumerate(cs):
+            expected = data[i * 10 : (i + 1) * 10].reshape(10, 2, 2, 2, 2)
+            assert c["data"].dtype == np.uint16
+            assert np.all(c["data"] == expected.sum(axis=(2, 4)))
+
+
+def test_chunk_source_transform_tiles(tmp_path):
+    f = str(tmp_path / "f.h5")
+
+    with h5py.File(f, "w") as fh:
+        fh.create_dataset("data", shape=(4, 6, 8), dtype="u2", chunks=(2, 4, 4))
+
+    with h5py.File(f, "r") as fh:
+        t = FrameTransform(crop=(slice(0, 3), slice(2, 6)))
+
+        # crop and bin would run on each tile in tile coordinates
+        with pytest.raises(RuntimeError):
+            ChunkSource({"data": fh["data"]}, timeout=0.1, transforms={"data": t})
+
+
+def test_chunk_source_transform_grid(tmp_path):
+    f = str(tmp_path / "f.h5")
+    shape = (4, 6, 8, 8)
+    data = np.arange(np.prod(shape), dtype=np.uint32).reshape(shape)
+
+    with h5py.File(f, "w") as fh:
+        fh.create_dataset("data", data=data, chunks=(2, 3, 8, 8))
+
+    with h5py.File(f, "r") as fh:
+        t = FrameTransform(bin=2)
+        cs = ChunkSource(
+            {"data": fh["data"]}, timeout=0.1, transforms={"data": t}, scan_rank=2
+        )
+        output = np.zeros((4, 6, 4, 4), dtype=np.uint64)
+
+        for c in cs:
+            assert c["data"].shape == (2, 3, 4, 4)
+            assert c.maxshape == [4, 6, 4, 4]
+            output[c.slice_metadata] = c["data"]
+
+        expected = data.reshape(4, 6, 4, 2, 4, 2).sum(axis=(3, 5))
+        assert np.array_equal(output, expected)
+
+        # the frame rank of a crop is enough
+        t = FrameTransform(crop=(slice(0, 4), slice(2, 8)))
+        cs = ChunkSource({"data": fh["data"]}, timeout=0.1, transforms={"data": t})
+        c = cs[3]
+        assert c.slice_metadata[2:] == (slice(0, 4), slice(0, 6))
+        assert np.array_equal(c["data"], data[2:4, 3:6, 0:4, 2:8])
+
+        with pytest.raises(RuntimeError):
+            ChunkSource(
+                {"data": fh["data"]}, timeout=0.1, transforms={"data": t}, scan_rank=1
+            )
+
+
+def test_chunk_source_transform_metadata(tmp_path):
+    f = str(tmp_path / "f.h5")
+    data = np.arange(4 * 8 * 8, dtype=np.uint16).reshape(4, 8, 8)
+
+    with h5py.File(f, "w") as fh:
+        fh.create_dataset("data", data=data, chunks=(2, 8, 8))
+
+    with h5py.File(f, "r") as fh:
+        t = FrameTransform(bin=4)
+        cs = ChunkSource({"data": fh["data"]}, timeout=0.1, transforms={"data": t})
+        chunks = list(cs)
+
+        assert [c.slice_metadata for c in chunks] == [
+            (slice(0, 2), slice(0, 2), slice(0, 2)),
+            (slice(2, 4), slice(0, 2), slice(0, 2)),
+        ]
+        assert chunks[0].maxshape == [4, 2, 2]
+
+        output = np.zeros(chunks[0].maxshape, dtype=np.uint64)
+        for c in chunks:
+            output[c.slice_metadata] = c["data"]
+        assert np.array_equal(output, data.reshape(4, 2, 4, 2, 4).sum(axis=(2, 4)))
@@ -0,0 +1,61 @@
+import h5py
+import numpy as np
+import pytest
+from swmr_tools import OutputWriter, utils
+
+
+def test_output_writer(tmp_path):
+    f = str(tmp_path / "out.h5")
+    frame = np.ones((4, 5))
+
+    with h5py.File(f, "w", libver="latest") as fh:
+        ds = utils.create_dataset(frame, (None,), fh, "data")
+        fh.swmr_mode = True
+
+        with OutputWriter(
+            max_queue=4, flush_interval=60, flush_bytes=frame.nbytes * 10
+        ) as writer:
+            for i in range(50):
+                writer.put(frame * i, (slice(i, i + 1),), ds)
+
+            writer.flush()
+            assert ds.shape == (50, 4, 5)
+
+        stats = writer.stats()
+        assert stats["items"] == 50
+        assert stats["bytes"] == 50 * frame.nbytes
+        # flushed by the byte budget, not per item
+        assert 5 <= stats["flushes"] <= 6
+        assert stats["queue_max"] <= 4
+        assert stats["latency_max"] >= stats["flush_time_max"]
+
+    with h5py.File(f, "r") as fh:
+        assert np.all(fh["data"][...] == np.arange(50).reshape(50, 1, 1))
+
+
+def test_output_writer_interval(tmp_path):
+    f = str(tmp_path / "out.h5")
+
+    with h5py.File(f, "w") as fh:
+        ds = utils.create_dataset(np.zeros(1), (None,), fh, "data")
+        writer = OutputWriter(flush_interval=0)
+        for i in range(10):
+            writer.put(np.array([i]), (slice(i, i + 1),), ds)
+        writer.close()
+
+        assert writer.stats()["flushes"] >= 1
+        assert np.all(ds[:, 0] == np.arange(10))
+
+
+def test_output_writer_error(tmp_path):
+    f = str(tmp_path / "out.h5")
+
+    with h5py.File(f, "w") as fh:
+        ds = utils.create_dataset(np.zeros(1), (2,), fh, "data")
+        writer = OutputWriter()
+
+        # past the maximum shape of the dataset
+        writer.put(np.array([1]), (slice(5, 6),), ds)
+
+        with pytest.raises(RuntimeError):
+            writer.close()